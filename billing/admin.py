@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Resource, Mission
+from .models import Resource, Mission, SlrRun
 
 class ResourceAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'matricule', 'grade', 'grade_des', 'rate_ibm', 'rate_des')
@@ -11,6 +11,13 @@ class MissionAdmin(admin.ModelAdmin):
     list_filter = ('code_type',)
     search_fields = ('otp_l2', 'belgian_name', 'libelle_de_projet')
 
+class SlrRunAdmin(admin.ModelAdmin):
+    list_display = ('period', 'heures_filename', 'owner', 'status', 'created_at', 'finished_at')
+    list_filter = ('status', 'period')
+    search_fields = ('run_id', 'heures_filename', 'heures_sha256', 'mafe_sha256')
+    date_hierarchy = 'created_at'
+
 # Register your models here.
 admin.site.register(Resource, ResourceAdmin)
 admin.site.register(Mission, MissionAdmin)
+admin.site.register(SlrRun, SlrRunAdmin)
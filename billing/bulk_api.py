@@ -0,0 +1,185 @@
+from django.db import transaction
+from django.forms import model_to_dict, modelform_factory
+
+from . import reference_data
+from .forms import MissionForm, ResourceForm
+from .models import Mission, Resource
+from .slr_engine import normalize_name
+
+# Batched create/update/delete of missions and resources for the JSON bulk
+# endpoint. Every operation is validated with the regular ModelForm rules, but
+# lookups and uniqueness checks are done once per batch rather than once per
+# item, and the writes go through bulk_create/bulk_update/delete in a single
+# transaction. Deletes are applied first, then updates, then creates, so a
+# batch can free a unique key and reuse it.
+
+MAX_OPERATIONS = 5000
+LOOKUP_CHUNK_SIZE = 900
+OPS = ('create', 'update', 'delete')
+
+
+class BulkMissionForm(MissionForm):
+    def validate_unique(self):
+        # Checked for the whole batch in _check_unique
+        pass
+
+
+class BulkResourceForm(ResourceForm):
+    def validate_unique(self):
+        pass
+
+
+MODELS = {
+    # name: (model, form, natural key)
+    'mission': (Mission, BulkMissionForm, 'otp_l2'),
+    # Pictures cannot travel in JSON; everything else follows ResourceForm
+    'resource': (Resource, modelform_factory(Resource, form=BulkResourceForm, exclude=['picture']), 'matricule'),
+}
+
+
+class BulkError(ValueError):
+    """The payload itself is malformed (as opposed to one invalid item)."""
+
+
+def _error(message, code, field='__all__'):
+    """Error dict in the ``form.errors.get_json_data()`` shape."""
+    return {field: [{'message': message, 'code': code}]}
+
+
+def _parse(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get('operations'), list):
+        raise BulkError('Expected a JSON object with an "operations" list')
+    operations = payload['operations']
+    if len(operations) > MAX_OPERATIONS:
+        raise BulkError(f'At most {MAX_OPERATIONS} operations per request')
+    return operations, bool(payload.get('atomic', True))
+
+
+def _fetch_existing(model, key_field, operations):
+    """Instances targeted by update/delete operations, by pk and by natural key, in chunked queries."""
+    pks = [op['pk'] for op in operations if op.get('pk') is not None]
+    keys = [op['key'] for op in operations if op.get('pk') is None and op.get('key') is not None]
+    by_pk, by_key = {}, {}
+    for field, values in (('pk', pks), (key_field, keys)):
+        for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            for obj in model.objects.filter(**{f'{field}__in': values[start:start + LOOKUP_CHUNK_SIZE]}):
+                by_pk[obj.pk] = obj
+                by_key[getattr(obj, key_field)] = obj
+    return by_pk, by_key
+
+
+def _check_unique(model, key_field, items, freed_pks):
+    """Flag items whose natural key collides with another item or with a row outside the batch."""
+    wanted = {}
+    for item in items:
+        wanted.setdefault(item['instance'].__dict__[key_field], []).append(item)
+    taken = {}
+    values = list(wanted)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        taken.update(model.objects.filter(**{f'{key_field}__in': chunk}).values_list(key_field, 'pk'))
+    label = model._meta.get_field(key_field).verbose_name
+    for value, claimants in wanted.items():
+        owner = taken.get(value)
+        for i, item in enumerate(claimants):
+            duplicate = i > 0
+            conflict = owner is not None and owner not in freed_pks and owner != item['instance'].pk
+            if duplicate or conflict:
+                item['result'].update(status='invalid', errors=_error(f'{model.__name__} with this {label} already exists.', 'unique', key_field))
+
+
+def run_operations(payload):
+    """Validate and apply a batch; returns ``(applied, results)`` with one result per operation.
+
+    With ``"atomic": true`` (the default) nothing is written unless every
+    operation is valid; otherwise valid operations are applied and invalid
+    ones reported.
+    """
+    operations, atomic = _parse(payload)
+    results = [{'index': i} for i in range(len(operations))]
+    grouped = {name: {op: [] for op in OPS} for name in MODELS}
+
+    for i, op in enumerate(operations):
+        result = results[i]
+        if not isinstance(op, dict) or op.get('op') not in OPS or op.get('model') not in MODELS:
+            result.update(status='invalid', errors=_error(f'"op" must be one of {", ".join(OPS)} and "model" one of {", ".join(MODELS)}', 'invalid'))
+            continue
+        if op['op'] != 'create' and op.get('pk') is None and op.get('key') is None:
+            result.update(status='invalid', errors=_error('"pk" or "key" is required', 'required'))
+            continue
+        if op['op'] != 'delete' and not isinstance(op.get('data'), dict):
+            result.update(status='invalid', errors=_error('"data" must be an object', 'invalid'))
+            continue
+        result.update(op=op['op'], model=op['model'])
+        grouped[op['model']][op['op']].append({'op': op, 'result': result})
+
+    plans = {}
+    for name, (model, form_class, key_field) in MODELS.items():
+        ops = grouped[name]
+        by_pk, by_key = _fetch_existing(model, key_field, [item['op'] for item in ops['update'] + ops['delete']])
+        targeted = set()
+        for item in ops['update'] + ops['delete']:
+            op = item['op']
+            instance = by_pk.get(op['pk']) if op.get('pk') is not None else by_key.get(op['key'])
+            if instance is None:
+                item['result'].update(status='not_found')
+            elif instance.pk in targeted:
+                item['result'].update(status='invalid', errors=_error('Object is targeted by more than one operation', 'duplicate'))
+            else:
+                targeted.add(instance.pk)
+                item['instance'] = instance
+
+        deletes = [item for item in ops['delete'] if 'instance' in item]
+        saves = []
+        for item in ops['update'] + ops['create']:
+            if item['op']['op'] == 'update':
+                if 'instance' not in item:
+                    continue
+                # Partial update: unspecified fields keep their current value
+                data = dict(model_to_dict(item['instance'], fields=form_class._meta.fields, exclude=form_class._meta.exclude), **item['op']['data'])
+                form = form_class(data, instance=item['instance'])
+            else:
+                form = form_class(item['op']['data'])
+            if not form.is_valid():
+                item['result'].update(status='invalid', errors=form.errors.get_json_data())
+                continue
+            item['instance'] = form.instance
+            item['fields'] = [f for f in form.cleaned_data if f in item['op']['data']] if item['op']['op'] == 'update' else None
+            saves.append(item)
+        _check_unique(model, key_field, saves, freed_pks={item['instance'].pk for item in deletes})
+        plans[name] = (model, deletes, [item for item in saves if item['result'].get('status') != 'invalid'])
+
+    invalid = any(result.get('status') in ('invalid', 'not_found') for result in results)
+    if atomic and invalid:
+        for result in results:
+            result.setdefault('status', 'skipped')
+        return False, results
+
+    with transaction.atomic():
+        for name, (model, deletes, saves) in plans.items():
+            if deletes:
+                model.objects.filter(pk__in=[item['instance'].pk for item in deletes]).delete()
+                for item in deletes:
+                    item['result'].update(status='deleted', pk=item['instance'].pk)
+
+            updates = [item for item in saves if item['op']['op'] == 'update']
+            creates = [item for item in saves if item['op']['op'] == 'create']
+            if model is Resource:
+                # bulk_create/bulk_update bypass Resource.save()
+                for item in saves:
+                    item['instance'].normalized_name = normalize_name(item['instance'].full_name)
+            if updates:
+                fields = sorted({f for item in updates for f in item['fields']})
+                if model is Resource and 'full_name' in fields:
+                    fields.append('normalized_name')
+                if fields:
+                    model.objects.bulk_update([item['instance'] for item in updates], fields, batch_size=500)
+                for item in updates:
+                    item['result'].update(status='updated', pk=item['instance'].pk)
+            if creates:
+                model.objects.bulk_create([item['instance'] for item in creates], batch_size=500)
+                for item in creates:
+                    item['result'].update(status='created', pk=item['instance'].pk)
+        # Bulk writes send no post_save signals
+        transaction.on_commit(reference_data.invalidate)
+    return True, results
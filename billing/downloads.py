@@ -0,0 +1,85 @@
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+# File downloads streamed from disk, with ETag/Last-Modified validators and
+# single byte-range support so interrupted downloads can resume.
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _iter_file(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(CHUNK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return etag is not None and if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _requested_range(request, size, etag, last_modified):
+    """``(start, end)`` of the requested byte range, ``False`` if unsatisfiable, None to send it all.
+
+    Only single ranges are honoured; anything else gets the full file.
+    """
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    if match is None or not _if_range_matches(request, etag, last_modified):
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_file(request, path, filename, content_type=XLSX_CONTENT_TYPE, etag=None):
+    """Stream ``path`` as an attachment named ``filename``, answering conditional and Range requests."""
+    stat = path.stat()
+    size = stat.st_size
+    etag = quote_etag(etag) if etag else None
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = _requested_range(request, size, etag, last_modified)
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+        elif byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_iter_file(path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Disposition'] = content_disposition_header(True, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response['ETag'] = etag
+    return response
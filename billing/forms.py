@@ -1,6 +1,14 @@
 from django import forms
+from django.core.validators import FileExtensionValidator
 from .models import Resource, Mission
 
+# The SLR readers use openpyxl, which reads Office Open XML workbooks only
+WORKBOOK_EXTENSIONS = ['xlsx', 'xlsm']
+workbook_validator = FileExtensionValidator(
+    WORKBOOK_EXTENSIONS,
+    message='“.%(extension)s” files are not supported: save the workbook as .xlsx in Excel and upload it again.',
+)
+
 class ResourceForm(forms.ModelForm):
     class Meta:
         model = Resource
@@ -14,9 +22,11 @@ class MissionForm(forms.ModelForm):
 class SLRFileUploadForm(forms.Form):
     mafe_report_file = forms.FileField(
         label='DTT IMT France MAFE Report (xlsx)',
-        help_text='e.g., DTT IMT France MAFE Report - Mai 2024.xlsx'
+        help_text='e.g., DTT IMT France MAFE Report - Mai 2024.xlsx',
+        validators=[workbook_validator],
     )
     heures_ibm_file = forms.FileField(
         label='Heures IBM (xlsx)',
-        help_text='e.g., Heures IBM Mai 25.xlsx'
+        help_text='e.g., Heures IBM Mai 25.xlsx',
+        validators=[workbook_validator],
     ) 
\ No newline at end of file
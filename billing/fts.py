@@ -0,0 +1,17 @@
+from django.db import models
+
+# Field and lookup used by the unmanaged search index models (see search.py).
+
+
+class FTSMatchField(models.TextField):
+    """The hidden column of an SQLite FTS5 table that carries its name, for MATCH queries."""
+
+
+@FTSMatchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
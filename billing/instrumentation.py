@@ -0,0 +1,96 @@
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-stage metrics of an SLR run: wall time, rows produced and memory.
+#
+# ``rss_peak_mb`` is the process high-water mark when the stage ends and
+# ``rss_growth_mb`` how much the stage raised it, so the stage that sets the
+# peak stands out. The high-water mark is shared by every thread of the
+# process: with several runs in the web workers at once, only the batch_slr
+# workers (one run per process) give exact figures.
+#
+# With ``trace_memory`` the Python allocations of each stage are traced as
+# well (``traced_peak_mb``). tracemalloc slows allocations down noticeably
+# and is process-wide, so it is meant for diagnosing one run, not left on.
+
+MB = 1024 * 1024
+# ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+RU_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def peak_rss():
+    """High-water mark of the process resident memory in bytes, None where unknown."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RU_MAXRSS_UNIT
+
+
+def _mb(value):
+    return None if value is None else round(value / MB, 1)
+
+
+class StageRecorder:
+    """Metrics of each stage of a run, in the order the stages ran.
+
+    ``metrics`` maps a stage name to a dict of ``seconds``, ``rows`` (set by
+    the caller) and the memory figures; it is JSON-serialisable as is.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.metrics = {}
+        self.trace_memory = trace_memory
+        self._current = None
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, stage):
+        """End the current stage, if any, and start ``stage``; returns its metrics dict."""
+        self.stop()
+        metrics = self.metrics[stage] = {}
+        traced = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        self._current = (metrics, time.perf_counter(), peak_rss(), traced)
+        return metrics
+
+    def stop(self):
+        if self._current is None:
+            return
+        metrics, started, rss_before, traced_before = self._current
+        self._current = None
+        metrics['seconds'] = round(time.perf_counter() - started, 3)
+        rss = peak_rss()
+        if rss is not None:
+            metrics['rss_peak_mb'] = _mb(rss)
+            metrics['rss_growth_mb'] = _mb(rss - rss_before)
+        if traced_before is not None and tracemalloc.is_tracing():
+            metrics['traced_peak_mb'] = _mb(tracemalloc.get_traced_memory()[1] - traced_before)
+
+    @contextmanager
+    def stage(self, name):
+        """Record the enclosed block as stage ``name``; yields the metrics dict to set ``rows`` on."""
+        metrics = self.start(name)
+        try:
+            yield metrics
+        finally:
+            self.stop()
+
+
+@contextmanager
+def untimed(name):
+    """Stand-in for ``StageRecorder.stage`` when nothing is recorded."""
+    yield {}
+
+
+def total_seconds(metrics, exclude=()):
+    """Sum of the stage durations in ``metrics``, None if there are none."""
+    seconds = [m.get('seconds') or 0 for name, m in metrics.items() if name not in exclude]
+    return round(sum(seconds), 1) if seconds else None
@@ -0,0 +1,78 @@
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from billing import reference_data, slr_jobs
+from billing.slr_batch import expand_paths, init_worker, pair_files, run_month
+
+
+class Command(BaseCommand):
+    help = 'Runs the SLR calculation for several months at once, pairing Heures IBM and MAFE files by the period in their filenames.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Directories, glob patterns or files holding the Heures IBM and MAFE workbooks.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (default: number of CPUs).')
+        parser.add_argument('--dry-run', action='store_true', help='Only show how the files are paired.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be a positive integer')
+
+        pairs, problems = pair_files(expand_paths(options['paths']))
+        for message in problems:
+            self.stdout.write(self.style.WARNING(f"Skipped {message}"))
+        if not pairs:
+            raise CommandError('No Heures IBM / MAFE pair found.')
+        for (mois, annee), (heures_path, mafe_path) in pairs.items():
+            self.stdout.write(f"{mois} {annee}: {heures_path.name} + {mafe_path.name}")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Dry run, nothing computed. {len(pairs)} month(s) paired."))
+            return
+
+        # Every month is computed against the same reference data
+        reference = reference_data.load_snapshot()
+        self.stdout.write(f"Using reference data snapshot v{reference.version}")
+
+        jobs = []
+        for heures_path, mafe_path in pairs.values():
+            run_id = str(uuid.uuid4())
+            run_dir = slr_jobs.get_run_dir(run_id)
+            run_dir.mkdir(parents=True, exist_ok=True)
+            # Same layout as an upload through facturation_slr
+            heures_copy = run_dir / f'heures_ibm{heures_path.suffix.lower()}'
+            mafe_copy = run_dir / f'mafe_report{mafe_path.suffix.lower()}'
+            shutil.copyfile(heures_path, heures_copy)
+            shutil.copyfile(mafe_path, mafe_copy)
+            slr_jobs.queue_run(run_id, heures_path.name)
+            jobs.append((run_id, heures_copy, mafe_copy, heures_path.name, reference.version))
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        started = time.perf_counter()
+        failed = 0
+        workers = min(options['workers'], len(jobs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(os.environ['DJANGO_SETTINGS_MODULE'],)) as pool:
+            futures = {pool.submit(run_month, *job): job[3] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    run_id, status, seconds = future.result()
+                except Exception as e:
+                    # The worker process itself died; execute_run records its own errors
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"{futures[future]}: worker failed: {e}"))
+                    continue
+                if status == slr_jobs.STATUS_DONE:
+                    self.stdout.write(self.style.SUCCESS(f"{futures[future]}: done in {seconds:.1f}s, run {run_id}"))
+                else:
+                    failed += 1
+                    error = (slr_jobs.read_status(run_id) or {}).get('error')
+                    self.stdout.write(self.style.ERROR(f"{futures[future]}: {status} after {seconds:.1f}s, run {run_id}: {error}"))
+
+        summary = f"{len(jobs) - failed}/{len(jobs)} month(s) computed in {time.perf_counter() - started:.1f}s with {workers} worker(s)."
+        if failed:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,246 @@
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from billing import instrumentation, reference_data, slr_jobs
+from billing.models import Mission, Resource
+from billing.slr_engine import normalize_name
+from billing.slr_workload import Workload
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+BENCHMARK_USERNAME = 'benchmark'
+POLL_INTERVAL = 0.05
+# Timings of the requests around the run, in the order they are made
+REQUEST_TIMINGS = ['upload', 'run', 'results_page', 'edit_page', 'grid_page', 'download']
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def _max(values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def summarize(runs):
+    """Median seconds and peak memory of each stage and request over the repeats of one size."""
+    done = [run for run in runs if run['status'] == slr_jobs.STATUS_DONE]
+    stages = {}
+    for run in done:
+        for stage, metrics in run['stages'].items():
+            stages.setdefault(stage, []).append(metrics)
+    return {
+        'stages': {
+            stage: {
+                'seconds': _median([m.get('seconds') for m in metrics]),
+                'rows': metrics[-1].get('rows'),
+                'rss_peak_mb': _max([m.get('rss_peak_mb') for m in metrics]),
+                'traced_peak_mb': _max([m.get('traced_peak_mb') for m in metrics]),
+            }
+            for stage, metrics in stages.items()
+        },
+        'requests': {name: _median([run['seconds'].get(name) for run in done]) for name in REQUEST_TIMINGS},
+        'pipeline_seconds': _median([instrumentation.total_seconds(run['stages'], exclude=slr_jobs.ON_DEMAND_STAGES) for run in done]),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the SLR pipeline on generated workloads: each stage and the requests around a run '
+        '(upload, results page, edit page, report download), with memory, saved as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES, help='Hour rows of each workload (default: 10000 100000 1000000).')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per size; medians are reported.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--trace-memory', action='store_true', help='Also trace Python allocations per stage (slower).')
+        parser.add_argument('--timeout', type=int, default=3600, help='Seconds to wait for one run.')
+        parser.add_argument('--output', help='JSON file to write (default: benchmark_data/results/slr-<date>-<commit>.json).')
+        parser.add_argument('--compare', help='Earlier JSON result to compare the medians with.')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'SLR_BENCHMARK', False):
+            # The workloads replace every Mission and Resource
+            raise CommandError('Run with --settings=slr_project.settings_benchmark, never against the real database.')
+        if options['repeat'] < 1 or any(size < 1 for size in options['sizes']):
+            raise CommandError('--sizes and --repeat must be positive integers')
+        baseline = self.load_baseline(options['compare']) if options['compare'] else None
+
+        call_command('migrate', interactive=False, verbosity=0)
+        user, _ = get_user_model().objects.get_or_create(username=BENCHMARK_USERNAME)
+        client = Client()
+        client.force_login(user)
+
+        workdir = Path(settings.BENCHMARK_DIR) / 'workloads'
+        commit = git_commit()
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'seed': options['seed'],
+            'trace_memory': options['trace_memory'],
+            'sizes': [],
+        }
+        failed = 0
+        for size in options['sizes']:
+            self.stdout.write(f"{size} rows: generating workload...")
+            result = self.prepare(Workload(size, seed=options['seed']), workdir)
+            runs = []
+            with override_settings(SLR_TRACE_MEMORY=options['trace_memory']):
+                for i in range(options['repeat']):
+                    run = self.run_once(client, workdir, result['files'], options['timeout'])
+                    runs.append(run)
+                    if run['status'] == slr_jobs.STATUS_DONE:
+                        self.stdout.write(f"  run {i + 1}: {run['seconds']['run']:.2f}s, peak RSS {run['rss_peak_mb']} MB")
+                    else:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f"  run {i + 1}: {run['status']}: {run.get('error')}"))
+            result['runs'] = runs
+            result['summary'] = summarize(runs)
+            report['sizes'].append(result)
+            self.print_summary(result, baseline)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        output = Path(options['output'] or Path(settings.BENCHMARK_DIR) / 'results' / f"slr-{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+        if failed:
+            raise CommandError(f"{failed} run(s) failed")
+
+    def prepare(self, workload, workdir):
+        """Write the workbooks and replace the reference data with the workload's."""
+        workdir.mkdir(parents=True, exist_ok=True)
+        heures_path, mafe_path = workdir / workload.filename, workdir / 'DTT IMT France MAFE Report.xlsx'
+        started = time.perf_counter()
+        workload.write_heures(heures_path)
+        workload.write_mafe(mafe_path)
+        generate_seconds = time.perf_counter() - started
+
+        missions, resources = workload.missions(), workload.resources()
+        with transaction.atomic():
+            Mission.objects.all().delete()
+            Resource.objects.all().delete()
+            Mission.objects.bulk_create([Mission(**fields) for fields in missions], batch_size=500)
+            # bulk_create bypasses Resource.save(), which sets normalized_name
+            Resource.objects.bulk_create(
+                [Resource(**fields, normalized_name=normalize_name(fields['full_name'])) for fields in resources],
+                batch_size=500,
+            )
+            transaction.on_commit(reference_data.invalidate)
+        reference_data.load_snapshot()
+
+        return {
+            'rows': workload.rows,
+            'generate_seconds': round(generate_seconds, 3),
+            'files': {'heures': heures_path.name, 'mafe': mafe_path.name},
+            'file_bytes': {'heures': heures_path.stat().st_size, 'mafe': mafe_path.stat().st_size},
+            'missions': len(missions),
+            'resources': len(resources),
+        }
+
+    def run_once(self, client, workdir, files, timeout):
+        """Upload both workbooks as a user would, wait for the run, then open its pages and report."""
+        # Parsing is measured cold, not from the parse cache
+        shutil.rmtree(settings.SLR_PARSE_CACHE_DIR, ignore_errors=True)
+        seconds = {}
+        started = time.perf_counter()
+        with open(workdir / files['heures'], 'rb') as heures, open(workdir / files['mafe'], 'rb') as mafe:
+            response = client.post(
+                reverse('facturation_slr'),
+                {'heures_ibm_file': heures, 'mafe_report_file': mafe},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+        seconds['upload'] = time.perf_counter() - started
+        if response.status_code != 202:
+            return {'status': 'rejected', 'error': f'upload answered {response.status_code}', 'seconds': seconds}
+        run_id = response.json()['run_id']
+
+        status = {}
+        while time.perf_counter() - started < timeout:
+            status = slr_jobs.read_status(run_id) or {}
+            if status.get('status') in (slr_jobs.STATUS_DONE, slr_jobs.STATUS_FAILED):
+                break
+            time.sleep(POLL_INTERVAL)
+        seconds['run'] = time.perf_counter() - started - seconds['upload']
+        run = {'run_id': run_id, 'status': status.get('status', 'timeout'), 'seconds': seconds}
+        if run['status'] != slr_jobs.STATUS_DONE:
+            run['error'] = status.get('error') or f'not finished after {timeout}s'
+            return run
+
+        page_bytes = {}
+        for name, url in (
+            ('results_page', reverse('facturation_slr_run', kwargs={'run_id': run_id})),
+            ('edit_page', reverse('edit_slr_adjustments', kwargs={'run_id': run_id})),
+            # First block of the edit grid, sorted as a user looking for the largest cuts would
+            ('grid_page', reverse('slr_adjustments_grid', kwargs={'run_id': run_id}) + '?' + urlencode({'sort': '-Heures Retirées', 'limit': 200})),
+            ('download', reverse('download_slr_report', kwargs={'run_id': run_id, 'filename': status['initial_excel_filename']})),
+        ):
+            started = time.perf_counter()
+            response = client.get(url)
+            page_bytes[name] = len(b''.join(response))
+            response.close()
+            seconds[name] = time.perf_counter() - started
+
+        # The metrics endpoint now includes xlsx_write, measured by the download
+        metrics = client.get(reverse('slr_run_metrics', kwargs={'run_id': run_id})).json()
+        rss = instrumentation.peak_rss()
+        run.update(
+            seconds={name: round(value, 3) for name, value in seconds.items()},
+            response_bytes=page_bytes,
+            stages={stage.pop('stage'): stage for stage in metrics['stages']},
+            rss_peak_mb=round(rss / instrumentation.MB, 1) if rss is not None else None,
+        )
+        shutil.rmtree(slr_jobs.get_run_dir(run_id), ignore_errors=True)
+        return run
+
+    def load_baseline(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return {result['rows']: result['summary'] for result in json.load(f)['sizes']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+    def print_summary(self, result, baseline):
+        summary = result['summary']
+        before = (baseline or {}).get(result['rows'])
+        rows = [(stage, metrics['seconds'], (before or {}).get('stages', {}).get(stage, {}).get('seconds')) for stage, metrics in summary['stages'].items()]
+        rows += [(f'[{name}]', value, (before or {}).get('requests', {}).get(name)) for name, value in summary['requests'].items()]
+        self.stdout.write(f"  {'stage':<20}{'seconds':>10}" + (f"{'baseline':>10}{'ratio':>8}" if before else ''))
+        for name, seconds, old in rows:
+            line = f"  {name:<20}{seconds if seconds is not None else '-':>10}"
+            if before:
+                ratio = f'{seconds / old:.2f}' if seconds is not None and old else '-'
+                line += f"{old if old is not None else '-':>10}{ratio:>8}"
+            self.stdout.write(line)
@@ -1,16 +1,88 @@
 import pandas as pd
+import numpy as np
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from billing import reference_data
 from billing.models import Mission
 import os
 
+# Expected Excel column names (adjust if they are slightly different in the file)
+COL_SWIFT_CODE = "SWIFT Code"
+COL_LIBELLE_PROJET = "Libelle Projet "  # Name in Excel
+COL_COMMENT = "Comment"
+COL_CUSTOMER_NAME = "Customer Name"
+REQUIRED_COLUMNS = [COL_SWIFT_CODE, COL_LIBELLE_PROJET, COL_COMMENT, COL_CUSTOMER_NAME]
+
+# Mission fields written from the sheet, keyed on otp_l2
+UPDATE_FIELDS = ['libelle_de_projet', 'code_type', 'belgian_name']
+LOOKUP_CHUNK_SIZE = 900
+
+
+def clean_text(values):
+    """Stripped strings with blanks, NaN and literal "nan" turned into ""."""
+    cleaned = values.astype(str).str.strip().where(values.notna(), '')
+    return cleaned.mask(cleaned.str.lower() == 'nan', '')
+
+
+def prepare_missions(df):
+    """Vectorised cleaning of the "Subset" sheet.
+
+    Returns ``(missions, skipped_rows)``: one row per otp_l2 with the fields
+    of ``UPDATE_FIELDS`` (the last occurrence wins, as row-by-row upserts
+    did) and the Excel row numbers that had no SWIFT Code.
+    """
+    otp_l2 = clean_text(df[COL_SWIFT_CODE])
+    missions = pd.DataFrame({
+        'otp_l2': otp_l2,
+        'libelle_de_projet': clean_text(df[COL_LIBELLE_PROJET]),
+        'code_type': np.where(clean_text(df[COL_COMMENT]).str.upper() == 'CODE DES', Mission.CODE_DES, Mission.CODE_FRANCE),
+        'belgian_name': clean_text(df[COL_CUSTOMER_NAME]),
+    })
+    empty = otp_l2 == ''
+    skipped_rows = (df.index[empty] + 2).tolist()
+    missions = missions[~empty].drop_duplicates('otp_l2', keep='last').reset_index(drop=True)
+    return missions, skipped_rows
+
+
+def diff_missions(missions):
+    """Split the sheet rows into new, changed and unchanged missions.
+
+    ``changed`` maps otp_l2 to ``{field: (old, new)}``.
+    """
+    keys = missions['otp_l2'].tolist()
+    existing = {}
+    # Chunked to stay under SQLite's bound-parameter limit
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        for row in Mission.objects.filter(otp_l2__in=chunk).values('otp_l2', *UPDATE_FIELDS):
+            existing[row['otp_l2']] = row
+    new, changed, unchanged = [], {}, 0
+    for row in missions.to_dict('records'):
+        current = existing.get(row['otp_l2'])
+        if current is None:
+            new.append(row)
+            continue
+        fields = {f: (current[f], row[f]) for f in UPDATE_FIELDS if (current[f] or '') != row[f]}
+        if fields:
+            changed[row['otp_l2']] = fields
+        else:
+            unchanged += 1
+    return new, changed, unchanged
+
+
 class Command(BaseCommand):
     help = 'Populates the Mission database from a specified Excel file (sheet "Subset").'
 
     def add_arguments(self, parser):
         parser.add_argument('excel_file_path', type=str, help='The full path to the Excel file.')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would change without writing to the database.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT ... ON CONFLICT statement (default: 1000).')
 
     def handle(self, *args, **options):
         excel_file_path = options['excel_file_path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
 
         if not os.path.exists(excel_file_path):
             raise CommandError(f'Error: Excel file not found at path: {excel_file_path}')
@@ -18,68 +90,51 @@ class Command(BaseCommand):
         self.stdout.write(f"Starting to populate missions from: {excel_file_path}")
 
         try:
-            # Read the specified sheet from the Excel file
-            df = pd.read_excel(excel_file_path, sheet_name='Subset')
+            # Read only the columns we use from the specified sheet
+            df = pd.read_excel(excel_file_path, sheet_name='Subset', usecols=lambda col: col in REQUIRED_COLUMNS)
             self.stdout.write(f"Successfully read sheet 'Subset'. Found {len(df)} rows.")
         except Exception as e:
             raise CommandError(f"Error reading Excel file or sheet 'Subset': {e}")
 
-        created_count = 0
-        updated_count = 0
-
-        # Define expected Excel column names (adjust if they are slightly different in the file)
-        col_swift_code = "SWIFT Code"
-        col_libelle_projet_excel = "Libelle Projet "  # Name in Excel
-        col_comment_excel = "Comment"
-        col_customer_name_excel = "Customer Name"
-
         # Verify necessary columns exist
-        required_cols = [col_swift_code, col_libelle_projet_excel, col_comment_excel, col_customer_name_excel]
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
         if missing_cols:
             raise CommandError(f"Missing required columns in Excel sheet 'Subset': {', '.join(missing_cols)}")
 
-        for index, row in df.iterrows():
-            try:
-                otp_l2_value = str(row[col_swift_code]).strip()
-                # Keep skipping if otp_l2 (primary lookup key) is essentially empty
-                if not otp_l2_value or otp_l2_value.lower() == 'nan' or pd.isna(row[col_swift_code]):
-                    self.stdout.write(self.style.WARNING(f"Skipping row {index+2} due to empty or invalid SWIFT Code: '{row[col_swift_code]}'"))
-                    continue
-
-                # For Libelle Projet: fallback to "" if Excel cell is empty/NaN
-                libelle_projet_value = str(row[col_libelle_projet_excel]).strip() if pd.notna(row[col_libelle_projet_excel]) else ""
-                if libelle_projet_value.lower() == 'nan':  # Catch if str(np.nan) or similar became "nan"
-                    libelle_projet_value = ""
-
-                # Comment to code_type logic (already handles empty by defaulting, which is good)
-                comment_value_excel = str(row[col_comment_excel]).strip() if pd.notna(row[col_comment_excel]) else ""
-                code_type_value_db = Mission.CODE_FRANCE  # Default
-                if comment_value_excel.upper() == 'CODE DES':
-                    code_type_value_db = Mission.CODE_DES
-
-                # For Customer name (mapping to belgian_name): fallback to "" if Excel cell is empty/NaN
-                belgian_name_value = str(row[col_customer_name_excel]).strip() if pd.notna(row[col_customer_name_excel]) else ""
-                if belgian_name_value.lower() == 'nan':  # Catch if str(np.nan) or similar became "nan"
-                    belgian_name_value = ""
-
-                mission, created = Mission.objects.update_or_create(
-                    otp_l2=otp_l2_value,
-                    defaults={
-                        'libelle_de_projet': libelle_projet_value,
-                        'code_type': code_type_value_db,
-                        'belgian_name': belgian_name_value,
-                    }
+        missions, skipped_rows = prepare_missions(df)
+        if skipped_rows:
+            shown = ', '.join(str(row) for row in skipped_rows[:20])
+            more = f" (and {len(skipped_rows) - 20} more)" if len(skipped_rows) > 20 else ""
+            self.stdout.write(self.style.WARNING(f"Skipped {len(skipped_rows)} row(s) with an empty SWIFT Code: {shown}{more}"))
+
+        new, changed, unchanged = diff_missions(missions)
+
+        if options['dry_run']:
+            for row in new:
+                self.stdout.write(self.style.SUCCESS(f"+ {row['otp_l2']} - {row['libelle_de_projet']}"))
+            for otp_l2, fields in changed.items():
+                details = ', '.join(f"{field}: {old!r} -> {value!r}" for field, (old, value) in fields.items())
+                self.stdout.write(f"~ {otp_l2}: {details}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run, nothing written. Would create: {len(new)}, update: {len(changed)}, unchanged: {unchanged}."
+            ))
+            return
+
+        # Only new and changed missions are written, in one transaction
+        to_write = missions[missions['otp_l2'].isin([row['otp_l2'] for row in new] + list(changed))]
+        objs = [Mission(**row) for row in to_write.to_dict('records')]
+        with transaction.atomic():
+            for start in range(0, len(objs), batch_size):
+                Mission.objects.bulk_create(
+                    objs[start:start + batch_size],
+                    update_conflicts=True,
+                    unique_fields=['otp_l2'],
+                    update_fields=UPDATE_FIELDS,
                 )
+                self.stdout.write(f"Written {min(start + batch_size, len(objs))}/{len(objs)} missions...")
+            # bulk_create() sends no post_save signals
+            transaction.on_commit(reference_data.invalidate)
 
-                if created:
-                    created_count += 1
-                    self.stdout.write(self.style.SUCCESS(f"Created Mission: {mission.otp_l2} - {mission.libelle_de_projet}"))
-                else:
-                    updated_count += 1
-                    self.stdout.write(f"Updated Mission: {mission.otp_l2} - {mission.libelle_de_projet}")
-
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Error processing row {index + 2}: {row.to_dict()}. Error: {e}"))
-
-        self.stdout.write(self.style.SUCCESS(f"Mission population complete. Created: {created_count}, Updated: {updated_count}.")) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(
+            f"Mission population complete. Created: {len(new)}, Updated: {len(changed)}, Unchanged: {unchanged}."
+        ))
@@ -0,0 +1,206 @@
+from decimal import Decimal, InvalidOperation
+import re
+
+import openpyxl
+from openpyxl.utils import column_index_from_string
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from billing import reference_data
+from billing.models import Resource
+from billing.slr_engine import normalize_name
+import os
+
+# Columns of the "Consultants" sheet of the Fichier de traitement, as read by main.py
+DEFAULT_NAME_COL = 'C'
+DEFAULT_RATE_COL = 'D'
+DEFAULT_RATE_DES_COL = 'E'
+DEFAULT_GRADE_COL = 'I'
+
+UPDATE_FIELDS = ['full_name', 'normalized_name', 'grade', 'rate_ibm', 'rate_des']
+LOOKUP_CHUNK_SIZE = 900
+
+
+def grade_lookup(choices):
+    """Map codes and labels of a choices list, case-insensitively, to the code.
+
+    'FR_STF', 'FR_Staff' and 'Staff' all resolve to 'FR_STF'.
+    """
+    lookup = {}
+    for code, label in choices:
+        for key in (code, label, re.sub(r'^(FR|DES)_', '', label)):
+            lookup[' '.join(key.lower().split())] = code
+    return lookup
+
+
+def to_decimal(value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        return Decimal(str(value).strip().replace(',', '.')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def name_matricule(name):
+    """Matricule for sheets without one: stable per normalized name."""
+    return 'SLR-' + re.sub(r'\W+', '-', normalize_name(name)).strip('-').upper()[:45]
+
+
+class Command(BaseCommand):
+    help = 'Populates the Resource database from the "Consultants" sheet of the Fichier de traitement.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('excel_file_path', type=str, help='The full path to the Excel file.')
+        parser.add_argument('--sheet', default='Consultants', help='Sheet name (default: Consultants).')
+        parser.add_argument('--name-col', default=DEFAULT_NAME_COL, help=f'Column of the consultant name (default: {DEFAULT_NAME_COL}).')
+        parser.add_argument('--rate-col', default=DEFAULT_RATE_COL, help=f'Column of the IBM rate (default: {DEFAULT_RATE_COL}).')
+        parser.add_argument('--rate-des-col', default=DEFAULT_RATE_DES_COL, help=f'Column of the DES rate (default: {DEFAULT_RATE_DES_COL}).')
+        parser.add_argument('--grade-col', default=DEFAULT_GRADE_COL, help=f'Column of the grade (default: {DEFAULT_GRADE_COL}).')
+        parser.add_argument('--grade-des-col', help='Column of the DES grade, if the sheet has one.')
+        parser.add_argument(
+            '--matricule-col',
+            help='Column of the matricule. Without it, rows are matched to existing Resources by '
+                 'normalized name and new ones get a name-based matricule.',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Show what would change without writing to the database.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per INSERT ... ON CONFLICT statement (default: 500).')
+
+    def handle(self, *args, **options):
+        excel_file_path = options['excel_file_path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+        if not os.path.exists(excel_file_path):
+            raise CommandError(f'Error: Excel file not found at path: {excel_file_path}')
+
+        columns = {}
+        for key in ('name', 'rate', 'rate_des', 'grade', 'grade_des', 'matricule'):
+            letter = options[f'{key}_col']
+            if letter:
+                try:
+                    columns[key] = column_index_from_string(letter.strip().upper()) - 1
+                except ValueError:
+                    raise CommandError(f"Invalid column letter for --{key.replace('_', '-')}-col: {letter}")
+
+        self.stdout.write(f"Starting to populate resources from: {excel_file_path}")
+        rows, warnings = self.read_rows(excel_file_path, options['sheet'], columns)
+        for message in warnings:
+            self.stdout.write(self.style.WARNING(message))
+        self.stdout.write(f"Read {len(rows)} consultant(s) from sheet '{options['sheet']}'.")
+
+        update_fields = UPDATE_FIELDS + (['grade_des'] if 'grade_des' in columns else [])
+        with transaction.atomic():
+            self.assign_matricules(rows, by_name='matricule' not in columns)
+            rows = list({row['matricule']: row for row in rows}.values())
+            existing = self.existing_matricules([row['matricule'] for row in rows])
+            created = sum(1 for row in rows if row['matricule'] not in existing)
+            updated = len(rows) - created
+
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(f"Dry run, nothing written. Would create: {created}, update: {updated}."))
+                return
+
+            for start in range(0, len(rows), batch_size):
+                Resource.objects.bulk_create(
+                    [Resource(**row) for row in rows[start:start + batch_size]],
+                    update_conflicts=True,
+                    unique_fields=['matricule'],
+                    update_fields=update_fields,
+                )
+                self.stdout.write(f"Written {min(start + batch_size, len(rows))}/{len(rows)} resources...")
+            # bulk_create() neither calls save() nor sends post_save signals
+            transaction.on_commit(reference_data.invalidate)
+
+        self.stdout.write(self.style.SUCCESS(f"Resource population complete. Created: {created}, Updated: {updated}."))
+
+    def read_rows(self, path, sheet, columns):
+        """Stream the sheet and return ``(rows, warnings)``, one Resource field dict per consultant."""
+        grades = grade_lookup(Resource.GRADE_CHOICES)
+        grades_des = grade_lookup(Resource.GRADE_DES_CHOICES)
+        try:
+            wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        except Exception as e:
+            raise CommandError(f"Error reading Excel file: {e}")
+        try:
+            if sheet not in wb.sheetnames:
+                raise CommandError(f"Sheet '{sheet}' not found in {path}")
+            last_col = max(columns.values()) + 1
+
+            def cell(values, key):
+                index = columns.get(key)
+                if index is None or index >= len(values):
+                    return None
+                return values[index]
+
+            by_key = {}
+            unknown_grades, missing_rates, skipped = set(), 0, 0
+            for values in wb[sheet].iter_rows(min_row=2, max_col=last_col, values_only=True):
+                if all(v is None for v in values):
+                    continue
+                name = cell(values, 'name')
+                name = str(name).strip() if name is not None else ''
+                if not name:
+                    skipped += 1
+                    continue
+
+                rate, rate_des = to_decimal(cell(values, 'rate')), to_decimal(cell(values, 'rate_des'))
+                if rate is None or rate_des is None:
+                    missing_rates += 1
+                grade_value = ' '.join(str(cell(values, 'grade') or '').lower().split())
+                grade = grades.get(grade_value)
+                if grade is None:
+                    if grade_value:
+                        unknown_grades.add(grade_value)
+                    grade = Resource.GRADE_FR_STF
+
+                row = {
+                    'full_name': name,
+                    'normalized_name': normalize_name(name),
+                    'grade': grade,
+                    'rate_ibm': rate or Decimal('0.00'),
+                    'rate_des': rate_des or Decimal('0.00'),
+                }
+                if 'grade_des' in columns:
+                    grade_des_value = ' '.join(str(cell(values, 'grade_des') or '').lower().split())
+                    row['grade_des'] = grades_des.get(grade_des_value, Resource.GRADE_DES_STG)
+                    if grade_des_value and grade_des_value not in grades_des:
+                        unknown_grades.add(grade_des_value)
+                if 'matricule' in columns:
+                    matricule = cell(values, 'matricule')
+                    row['matricule'] = str(matricule).strip() if matricule is not None else ''
+                    if not row['matricule']:
+                        skipped += 1
+                        continue
+                # Last row wins for a repeated consultant
+                by_key[row.get('matricule') or row['normalized_name']] = row
+        finally:
+            wb.close()
+
+        warnings = []
+        if skipped:
+            warnings.append(f"Skipped {skipped} row(s) without a name or matricule.")
+        if missing_rates:
+            warnings.append(f"{missing_rates} consultant(s) have a blank or invalid rate, stored as 0.")
+        if unknown_grades:
+            warnings.append(f"Unknown grade(s) mapped to the default: {', '.join(sorted(unknown_grades))}")
+        return list(by_key.values()), warnings
+
+    def assign_matricules(self, rows, by_name):
+        """Without a matricule column, reuse the matricule of the Resource with the same normalized name."""
+        if not by_name:
+            return
+        names = [row['normalized_name'] for row in rows]
+        known = {}
+        for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            chunk = names[start:start + LOOKUP_CHUNK_SIZE]
+            for normalized_name, matricule in Resource.objects.filter(normalized_name__in=chunk).values_list('normalized_name', 'matricule'):
+                known.setdefault(normalized_name, matricule)
+        for row in rows:
+            row['matricule'] = known.get(row['normalized_name']) or name_matricule(row['full_name'])
+
+    def existing_matricules(self, matricules):
+        existing = set()
+        for start in range(0, len(matricules), LOOKUP_CHUNK_SIZE):
+            chunk = matricules[start:start + LOOKUP_CHUNK_SIZE]
+            existing.update(Resource.objects.filter(matricule__in=chunk).values_list('matricule', flat=True))
+        return existing
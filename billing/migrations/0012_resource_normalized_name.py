@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+def populate_normalized_name(apps, schema_editor):
+    # Same key as slr_engine.normalize_name, inlined so the migration does not depend on app code
+    Resource = apps.get_model('billing', 'Resource')
+    resources = list(Resource.objects.only('pk', 'full_name'))
+    for resource in resources:
+        resource.normalized_name = str(resource.full_name).lower().strip()
+    Resource.objects.bulk_update(resources, ['normalized_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0011_add_stagiaire_grade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='normalized_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='Normalized Name'),
+        ),
+        migrations.RunPython(populate_normalized_name, migrations.RunPython.noop),
+    ]
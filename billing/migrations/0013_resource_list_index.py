@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0012_resource_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['full_name', 'id'], name='billing_resource_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:27
+
+import billing.fts
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0013_resource_list_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MissionSearchIndex',
+            fields=[
+                ('mission', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='billing.mission')),
+                ('fts', billing.fts.FTSMatchField(db_column='billing_mission_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'billing_mission_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ResourceSearchIndex',
+            fields=[
+                ('resource', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='billing.resource')),
+                ('fts', billing.fts.FTSMatchField(db_column='billing_resource_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'billing_resource_fts',
+                'managed': False,
+            },
+        ),
+    ]
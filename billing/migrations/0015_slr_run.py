@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0014_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlrRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.CharField(max_length=36, unique=True, verbose_name='Run ID')),
+                ('period', models.DateField(blank=True, null=True, verbose_name='Période')),
+                ('heures_filename', models.CharField(blank=True, max_length=255, verbose_name='Fichier Heures IBM')),
+                ('heures_sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 Heures IBM')),
+                ('mafe_sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 MAFE')),
+                ('reference_version', models.PositiveIntegerField(blank=True, null=True, verbose_name='Version des données de référence')),
+                ('status', models.CharField(choices=[('queued', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], default='queued', max_length=10, verbose_name='Statut')),
+                ('row_counts', models.JSONField(blank=True, default=dict, verbose_name='Nombre de lignes')),
+                ('stage_metrics', models.JSONField(blank=True, default=dict, verbose_name='Mesures des étapes')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Créé le')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminé le')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slr_runs', to=settings.AUTH_USER_MODEL, verbose_name='Lancé par')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['period', '-created_at'], name='billing_slrrun_period_idx'), models.Index(fields=['-created_at'], name='billing_slrrun_created_idx'), models.Index(fields=['owner', '-created_at'], name='billing_slrrun_owner_idx')],
+            },
+        ),
+    ]
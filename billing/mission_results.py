@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Mission
+from .slr_engine import GROUP_KEY, MONTHS, parse_period
+
+# Write-back of per-project SLR results into Mission.calculated_* for the
+# mission tracking page. Results are per project ('Libelle projet'); every
+# mission mapped to a project (through libelle_de_projet, blank meaning
+# 'Code France' as in the reference data) gets its project's totals.
+#
+# A mission holding the results of a later period than the one written is
+# left alone, so re-running an old month does not hide the current one.
+
+CODE_FRANCE_PROJECT = 'Code France'
+TRACKED_FIELDS = ['calculated_total_heures', 'calculated_estimee', 'calculation_period']
+BATCH_SIZE = 500
+CENT = Decimal('0.01')
+
+
+def period_key(period):
+    """Sortable ``(year, month)`` of a period label such as 'May 25', or None."""
+    mois, annee = parse_period(period)
+    if not mois:
+        return None
+    return int(annee[-2:]), MONTHS.index(mois)
+
+
+def _decimal(value):
+    if value is None or pd.isna(value):
+        return None
+    return Decimal(str(float(value))).quantize(CENT)
+
+
+def _affected(values, period, new_key, clear):
+    """Missions ``write_back`` may change: those of the result's projects and, to clear them, those holding ``period``."""
+    condition = Q(libelle_de_projet__in=list(values))
+    if CODE_FRANCE_PROJECT in values:
+        condition |= Q(libelle_de_projet__isnull=True) | Q(libelle_de_projet='')
+    if clear and period is not None:
+        # Labels are few (one per month); match them by period, as write_back does
+        labels = Mission.objects.filter(calculation_period__isnull=False).values_list('calculation_period', flat=True).distinct()
+        same_period = [
+            label for label in labels
+            if (period_key(label) == new_key if new_key is not None else label == period)
+        ]
+        condition |= Q(calculation_period__in=same_period)
+    return condition
+
+
+def write_back(result, period, clear=True):
+    """Store the project totals of ``result`` on the matching missions; returns the number updated.
+
+    Missions of the same period whose project is no longer in ``result``
+    are cleared, unless ``clear`` is False: ``result`` then only holds the
+    projects to update, as after a single edit.
+    """
+    totals = result.drop_duplicates(GROUP_KEY).set_index(GROUP_KEY)
+    values = {
+        project: (_decimal(hours), _decimal(estimee))
+        for project, hours, estimee in zip(totals.index, totals['Adjusted Hours'], totals['Estimees'])
+    }
+    period = period or None
+    new_key = period_key(period)
+
+    changed = []
+    with transaction.atomic():
+        missions = (
+            Mission.objects.select_for_update()
+            .filter(_affected(values, period, new_key, clear))
+            .only('pk', 'libelle_de_projet', *TRACKED_FIELDS)
+        )
+        for mission in missions:
+            current_key = period_key(mission.calculation_period)
+            if new_key is not None and current_key is not None and current_key > new_key:
+                continue
+            hours, estimee = values.get(mission.libelle_de_projet or CODE_FRANCE_PROJECT, (None, None))
+            if hours is None and estimee is None:
+                # Not in this result: only clear what an earlier run of the same period wrote
+                same_period = current_key == new_key if new_key is not None else mission.calculation_period == period
+                if not clear or period is None or not same_period:
+                    continue
+                new_period = None
+            else:
+                new_period = period
+            if (mission.calculated_total_heures, mission.calculated_estimee, mission.calculation_period) == (hours, estimee, new_period):
+                continue
+            mission.calculated_total_heures = hours
+            mission.calculated_estimee = estimee
+            mission.calculation_period = new_period
+            changed.append(mission)
+        # One UPDATE ... CASE per batch; bulk_update sends no signals, and the
+        # calculated fields are not part of the reference data anyway
+        Mission.objects.bulk_update(changed, TRACKED_FIELDS, batch_size=BATCH_SIZE)
+    return len(changed)
@@ -1,5 +1,12 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
+
+from .fts import FTSMatchField
+from .slr_engine import normalize_name
 
 # Create your models here.
 
@@ -49,6 +56,8 @@ class Resource(models.Model):
     ]
 
     full_name = models.CharField(max_length=255, verbose_name="Full Name") # Name belgium
+    # Join key against the hours file, see slr_engine.normalize_name; set on save
+    normalized_name = models.CharField(max_length=255, db_index=True, editable=False, blank=True, verbose_name="Normalized Name")
     picture = models.ImageField(upload_to='resources/', null=True, blank=True, verbose_name="Profile Picture")
     matricule = models.CharField(max_length=50, unique=True, verbose_name="Matricule") 
     grade = models.CharField(
@@ -70,9 +79,22 @@ class Resource(models.Model):
     rate_ibm = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Rate IBM") # Rate
     rate_des = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Rate DES")
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order of the resource list
+            models.Index(fields=['full_name', 'id'], name='billing_resource_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.full_name
 
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.full_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'full_name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_name'}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         try:
             return reverse('resource_detail', kwargs={'pk': self.pk})
@@ -126,3 +148,89 @@ class Mission(models.Model):
 
     def get_absolute_url(self):
         return reverse('mission_detail', kwargs={'pk': self.pk})
+
+
+class MissionSearchIndex(models.Model):
+    """SQLite FTS5 index over Mission, kept in sync by triggers (see search.py)."""
+    mission = models.OneToOneField(
+        Mission, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_index',
+    )
+    fts = FTSMatchField(db_column='billing_mission_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'billing_mission_fts'
+
+
+class ResourceSearchIndex(models.Model):
+    """SQLite FTS5 index over Resource, kept in sync by triggers (see search.py)."""
+    resource = models.OneToOneField(
+        Resource, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_index',
+    )
+    fts = FTSMatchField(db_column='billing_resource_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'billing_resource_fts'
+
+
+class SlrRun(models.Model):
+    """Registry of SLR runs; the tables themselves stay in the run directory (see slr_jobs)."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    run_id = models.CharField(max_length=36, unique=True, verbose_name="Run ID")
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='slr_runs', verbose_name="Lancé par",
+    )
+    # First day of the month the hours belong to, None if the filename has no period
+    period = models.DateField(null=True, blank=True, verbose_name="Période")
+    heures_filename = models.CharField(max_length=255, blank=True, verbose_name="Fichier Heures IBM")
+    heures_sha256 = models.CharField(max_length=64, blank=True, verbose_name="SHA-256 Heures IBM")
+    mafe_sha256 = models.CharField(max_length=64, blank=True, verbose_name="SHA-256 MAFE")
+    reference_version = models.PositiveIntegerField(null=True, blank=True, verbose_name="Version des données de référence")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name="Statut")
+    row_counts = models.JSONField(default=dict, blank=True, verbose_name="Nombre de lignes")
+    # {stage: {seconds, rows, rss_peak_mb, ...}}, see instrumentation.StageRecorder
+    stage_metrics = models.JSONField(default=dict, blank=True, verbose_name="Mesures des étapes")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Créé le")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Terminé le")
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['period', '-created_at'], name='billing_slrrun_period_idx'),
+            models.Index(fields=['-created_at'], name='billing_slrrun_created_idx'),
+            models.Index(fields=['owner', '-created_at'], name='billing_slrrun_owner_idx'),
+        ]
+
+    def __str__(self):
+        period = self.period.strftime('%b %y') if self.period else '?'
+        return f"{period} - {self.heures_filename} ({self.get_status_display()})"
+
+    @property
+    def duration(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.created_at
+
+    def previous_month_run(self):
+        """Latest finished run of the month before this one (one lookup on the period index)."""
+        if self.period is None:
+            return None
+        previous = (self.period.replace(day=1) - timedelta(days=1)).replace(day=1)
+        return SlrRun.objects.filter(period=previous, status=self.STATUS_DONE).order_by('-created_at').first()
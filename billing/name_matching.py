@@ -0,0 +1,69 @@
+import heapq
+import re
+from collections import defaultdict
+
+from .slr_engine import normalize_name
+
+# Fuzzy lookup of consultant names that did not match a Resource exactly.
+# Names are indexed by their character trigrams in an inverted index, so a
+# query only visits the names sharing at least one trigram with it instead of
+# scoring every Resource.
+
+NGRAM_SIZE = 3
+MIN_SCORE = 0.5
+MAX_SUGGESTIONS = 3
+
+
+def fuzzy_key(name):
+    """Order and punctuation insensitive form of a name: 'DOE, John' and 'john doe' agree."""
+    return ' '.join(sorted(re.findall(r'\w+', normalize_name(name))))
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    padded = f' {text} '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NGramIndex:
+    """Inverted trigram index over ``(key, name)`` pairs, scored with the Dice coefficient."""
+
+    def __init__(self, entries=()):
+        self._postings = defaultdict(list)
+        self._names = {}
+        self._sizes = {}
+        for key, name in entries:
+            self.add(key, name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, key, name):
+        grams = ngrams(fuzzy_key(name))
+        self._names[key] = name
+        self._sizes[key] = len(grams)
+        for gram in grams:
+            self._postings[gram].append(key)
+
+    def search(self, name, limit=MAX_SUGGESTIONS, min_score=MIN_SCORE):
+        """Best ``(key, name, score)`` candidates for ``name``, highest score first."""
+        grams = ngrams(fuzzy_key(name))
+        shared = defaultdict(int)
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+        scored = (
+            (2 * count / (len(grams) + self._sizes[key]), key)
+            for key, count in shared.items()
+        )
+        best = heapq.nlargest(limit, (item for item in scored if item[0] >= min_score), key=lambda item: item[0])
+        return [(key, self._names[key], round(score, 3)) for score, key in best]
+
+
+def suggest_matches(unmatched, index, limit=MAX_SUGGESTIONS):
+    """Add a 'Suggestions' column ("Name (score); ...") to the unmatched names table."""
+    unmatched = unmatched.copy()
+    unmatched['Suggestions'] = [
+        '; '.join(f'{name} ({score:.0%})' for _, name, score in index.search(nom, limit))
+        for nom in unmatched['Nom']
+    ]
+    return unmatched
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.db.models import Q
+
+# Keyset (cursor) pagination for the list pages. A page is fetched with
+# WHERE (key, pk) > (last key, last pk) ORDER BY key, pk LIMIT n, so every page
+# costs one index range scan however deep the user pages, unlike OFFSET.
+# A key prefixed with '-' sorts descending, as in order_by().
+
+PAGE_SIZE = 50
+
+
+def _json_default(value):
+    # Full precision: DjangoJSONEncoder cuts datetimes to milliseconds, which would skip rows
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not a valid cursor value')
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=_json_default).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """The key values of a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _field(key):
+    return key.lstrip('-')
+
+
+def _reversed(keys):
+    return [_field(k) if k.startswith('-') else f'-{k}' for k in keys]
+
+
+def _after(keys, values, reverse=False):
+    """Q for rows strictly after ``values`` in ``keys`` order (before it when ``reverse``)."""
+    condition = Q()
+    for i, key in enumerate(keys):
+        equal = {_field(k): v for k, v in zip(keys[:i], values[:i])}
+        op = 'lt' if reverse != key.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{_field(key)}__{op}': values[i]})
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, rows, keys, has_next, has_previous):
+        self.rows = rows
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = encode_cursor([rows[-1][_field(k)] for k in keys]) if rows and has_next else None
+        self.previous_cursor = encode_cursor([rows[0][_field(k)] for k in keys]) if rows and has_previous else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def keyset_paginate(queryset, keys, fields, after=None, before=None, page_size=PAGE_SIZE):
+    """One page of ``queryset.values(*fields)`` ordered by ``keys`` (unique together, e.g. ending in 'pk').
+
+    ``after``/``before`` are cursors from a previous page's ``next_cursor`` /
+    ``previous_cursor``; a malformed cursor restarts from the first page.
+    """
+    fields = list(fields) + [_field(k) for k in keys if _field(k) not in fields]
+    after_values, before_values = decode_cursor(after), decode_cursor(before)
+    if before_values is not None and len(before_values) == len(keys):
+        # Walk backwards from the cursor, then restore ascending order
+        qs = queryset.filter(_after(keys, before_values, reverse=True)).order_by(*_reversed(keys))
+        rows = list(qs.values(*fields)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(rows, keys, has_next=True, has_previous=has_previous)
+
+    qs = queryset.order_by(*keys)
+    has_previous = False
+    if after_values is not None and len(after_values) == len(keys):
+        qs = qs.filter(_after(keys, after_values))
+        has_previous = True
+    rows = list(qs.values(*fields)[:page_size + 1])
+    has_next = len(rows) > page_size
+    return KeysetPage(rows[:page_size], keys, has_next=has_next, has_previous=has_previous)
@@ -0,0 +1,237 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# On-disk cache of parsed input workbooks. An entry is keyed by the SHA-256 of
+# the file bytes plus the reader and its arguments (sheet, usecols, period...),
+# so re-uploading the same workbook, or re-running after editing only one of
+# the inputs, skips the Excel parsing of the unchanged files.
+#
+# Entries are Arrow IPC files. Typed columns are stored natively; object
+# columns, which hold whatever openpyxl returned (str, int, float, datetime,
+# None, NaN mixed in one column), are stored as text plus a type tag so they
+# come back exactly as parsed. The directory is kept under ``max_bytes`` by
+# evicting the least recently used entries.
+#
+# Bump FORMAT_VERSION whenever a reader's output changes.
+
+FORMAT_VERSION = '1'
+HASH_CHUNK_SIZE = 1024 * 1024
+METADATA_KEY = b'slr_parse_cache'
+ENTRY_SUFFIX = '.arrow'
+
+logger = logging.getLogger(__name__)
+
+# Type tags of the values of object columns
+TAG_NONE, TAG_NAN, TAG_STR, TAG_INT, TAG_FLOAT, TAG_BOOL, TAG_DATETIME, TAG_DATE, TAG_TIME, TAG_TIMESTAMP = range(10)
+_ENCODERS = {
+    str: (TAG_STR, str),
+    int: (TAG_INT, str),
+    float: (TAG_FLOAT, repr),
+    bool: (TAG_BOOL, str),
+    datetime.datetime: (TAG_DATETIME, datetime.datetime.isoformat),
+    datetime.date: (TAG_DATE, datetime.date.isoformat),
+    datetime.time: (TAG_TIME, datetime.time.isoformat),
+    pd.Timestamp: (TAG_TIMESTAMP, pd.Timestamp.isoformat),
+}
+_DECODERS = {
+    TAG_STR: str,
+    TAG_INT: int,
+    TAG_FLOAT: float,
+    TAG_BOOL: lambda text: text == 'True',
+    TAG_DATETIME: datetime.datetime.fromisoformat,
+    TAG_DATE: datetime.date.fromisoformat,
+    TAG_TIME: datetime.time.fromisoformat,
+    TAG_TIMESTAMP: pd.Timestamp,
+}
+NATIVE_DTYPES = ('float64', 'int64', 'bool', 'datetime64[ns]')
+
+
+class Uncacheable(TypeError):
+    """A parsed table holds values the cache cannot round-trip exactly."""
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _encode_object(series):
+    """``(texts, tags)`` arrays of an object column, encoded one value type at a time."""
+    values = series.to_numpy()
+    # Factorised, as comparing an array to some types (pd.Timestamp) does not broadcast
+    codes, kinds = pd.factorize(series.map(type))
+    texts = np.full(len(values), None, dtype=object)
+    tags = np.full(len(values), TAG_NONE, dtype=np.int8)
+    for code, kind in enumerate(kinds):
+        mask = codes == code
+        if kind is type(None):
+            continue
+        if kind is float:
+            nan = mask & pd.isna(series).to_numpy()
+            tags[nan] = TAG_NAN
+            mask &= ~nan
+            if not mask.any():
+                continue
+        encoder = _ENCODERS.get(kind)
+        if encoder is None:
+            raise Uncacheable(f'{kind.__name__} value in column {series.name!r}')
+        tags[mask] = encoder[0]
+        texts[mask] = values[mask] if kind is str else np.array([encoder[1](v) for v in values[mask]], dtype=object)
+    return pa.array(texts, type=pa.string()), pa.array(tags)
+
+
+def _decode_object(texts, tags):
+    values = texts.to_numpy(zero_copy_only=False).astype(object)
+    tags = tags.to_numpy()
+    for tag in np.unique(tags):
+        mask = tags == tag
+        if tag == TAG_NAN:
+            values[mask] = float('nan')
+        elif tag in _DECODERS and tag != TAG_STR:
+            values[mask] = np.array([_DECODERS[tag](text) for text in values[mask]], dtype=object)
+    return pd.Series(values, dtype=object)
+
+
+def to_arrow(df, extra=None):
+    """Arrow table of a parsed DataFrame; ``extra`` (JSON) rides along in the schema metadata."""
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise Uncacheable('only DataFrames with a default index are cached')
+    arrays, names, columns = [], [], []
+    for i, name in enumerate(df.columns):
+        series = df.iloc[:, i]
+        dtype = str(series.dtype)
+        if dtype == 'object':
+            texts, tags = _encode_object(series)
+            arrays += [texts, tags]
+            names += [f'{i}', f'{i}.tag']
+        elif dtype in NATIVE_DTYPES:
+            arrays.append(pa.Array.from_pandas(series))
+            names.append(f'{i}')
+        else:
+            raise Uncacheable(f'{dtype} column {name!r}')
+        columns.append({'name': name, 'dtype': dtype})
+    metadata = {'columns': columns, 'rows': len(df), 'extra': extra}
+    try:
+        encoded = json.dumps(metadata).encode('utf-8')
+    except TypeError as e:
+        raise Uncacheable(str(e))
+    return pa.Table.from_arrays(arrays, names=names, metadata={METADATA_KEY: encoded})
+
+
+def from_arrow(table):
+    """``(df, extra)`` back from ``to_arrow``."""
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    data = {}
+    for i, column in enumerate(metadata['columns']):
+        if column['dtype'] == 'object':
+            series = _decode_object(table.column(f'{i}'), table.column(f'{i}.tag'))
+        else:
+            series = table.column(f'{i}').to_pandas().astype(column['dtype'])
+        data[i] = series
+    df = pd.DataFrame(data, index=pd.RangeIndex(metadata['rows']))
+    df.columns = pd.Index([column['name'] for column in metadata['columns']], dtype=object)
+    return df, metadata['extra']
+
+
+def _reader_name(reader):
+    return f'{reader.__module__}.{reader.__qualname__}'
+
+
+class ParseCache:
+    """Directory of parsed workbooks, bounded to about ``max_bytes`` on disk."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, digest, reader, args, kwargs):
+        signature = json.dumps(
+            [FORMAT_VERSION, pd.__version__, digest, _reader_name(reader), list(args), sorted(kwargs.items())],
+            default=str,
+        )
+        return hashlib.sha256(signature.encode('utf-8')).hexdigest()
+
+    def read(self, reader, path, *args, digest=None, **kwargs):
+        """``reader(path, *args, **kwargs)`` served from the cache.
+
+        ``reader`` returns a DataFrame, or a tuple of a DataFrame followed by
+        JSON-serialisable values (as ``read_mafe`` does). ``digest`` is the
+        file's ``file_digest`` when the caller already has it.
+        """
+        key = self.key(digest or file_digest(path), reader, args, kwargs)
+        entry = self.directory / f'{key}{ENTRY_SUFFIX}'
+        try:
+            with pa.memory_map(str(entry), 'r') as source:
+                df, extra = from_arrow(pa.ipc.open_file(source).read_all())
+        except (FileNotFoundError, pa.ArrowInvalid, KeyError, ValueError):
+            pass
+        else:
+            self._touch(entry)
+            logger.info('Parse cache hit for %s (%s)', os.path.basename(path), _reader_name(reader))
+            return df if extra is None else (df, *extra)
+
+        result = reader(path, *args, **kwargs)
+        df, extra = (result[0], list(result[1:])) if isinstance(result, tuple) else (result, None)
+        try:
+            self._store(entry, to_arrow(df, extra))
+        except Uncacheable as e:
+            logger.info('Not caching %s: %s', os.path.basename(path), e)
+        return result
+
+    def cached(self, reader):
+        """``reader`` wrapped to go through the cache, for call sites that take a reader."""
+        def read(path, *args, **kwargs):
+            return self.read(reader, path, *args, **kwargs)
+        return read
+
+    def _touch(self, entry):
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def _store(self, entry, table):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry.with_name(f'{entry.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, entry)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the directory fits in ``max_bytes``."""
+        with self._lock:
+            entries = []
+            for path in self.directory.glob(f'*{ENTRY_SUFFIX}'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
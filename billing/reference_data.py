@@ -0,0 +1,146 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+
+from . import name_matching
+from .models import Mission, Resource
+from .run_cache import run_cache
+from .run_store import RunStore, locked
+
+# Versioned snapshots of the Mission/Resource reference data used by SLR runs.
+#
+# A snapshot holds the three mappings a run needs as columnar tables in a
+# run archive under slr_reference/v<version>/. post_save/post_delete signals
+# (see signals.py) replace the "current token" once the change commits; the
+# next load builds a new version only if the latest snapshot was built for an
+# older token. Builds hold the lock of REFERENCE_DIR (run_store.locked), so
+# only one process builds the snapshot of a token. Snapshots are kept, so a
+# run that recorded its version can be recomputed later without querying
+# the ORM.
+#
+# bulk_create(), bulk_update() and QuerySet.update() send no signals: code
+# that uses them must call invalidate() itself.
+
+REFERENCE_DIR = Path(settings.MEDIA_ROOT) / 'slr_reference'
+TOKEN_FILENAME = 'token.json'
+LATEST_FILENAME = 'latest.json'
+CACHE_KEY = '_reference'
+
+
+class ReferenceSnapshot:
+    """One version of the reference tables: ``codes``, ``consultants`` and ``belgian_names``."""
+
+    def __init__(self, version, codes, consultants, belgian_names):
+        self.version = version
+        self.codes = codes
+        self.consultants = consultants
+        self.belgian_names = belgian_names
+        self._name_index = None
+
+    @property
+    def nbytes(self):
+        return int(sum(df.memory_usage(deep=True).sum() for df in (self.codes, self.consultants, self.belgian_names)))
+
+    @property
+    def name_index(self):
+        """Trigram index of the Resource full names, built on first use."""
+        if self._name_index is None:
+            self._name_index = name_matching.NGramIndex(zip(self.consultants['pk'], self.consultants['full_name']))
+        return self._name_index
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    REFERENCE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def invalidate():
+    """Mark the reference data as changed; the next load_snapshot() builds a new version."""
+    _write_json(REFERENCE_DIR / TOKEN_FILENAME, {'token': uuid.uuid4().hex})
+
+
+def current_token():
+    state = _read_json(REFERENCE_DIR / TOKEN_FILENAME)
+    if state is None:
+        invalidate()
+        state = _read_json(REFERENCE_DIR / TOKEN_FILENAME)
+    return state['token']
+
+
+def query_tables():
+    """The reference tables straight from the ORM."""
+    codes = pd.DataFrame(list(Mission.objects.values('otp_l2', 'libelle_de_projet')), columns=['otp_l2', 'libelle_de_projet'])
+    codes = codes.rename(columns={'otp_l2': 'Code projet', 'libelle_de_projet': 'Libelle projet'})
+    codes['Libelle projet'] = codes['Libelle projet'].fillna('Code France')
+
+    consultants = pd.DataFrame(
+        list(Resource.objects.values('pk', 'full_name', 'normalized_name', 'rate_ibm', 'rate_des', 'grade')),
+        columns=['pk', 'full_name', 'normalized_name', 'rate_ibm', 'rate_des', 'grade'],
+    )
+    consultants = consultants.rename(columns={'normalized_name': 'Nom', 'rate_ibm': 'Rate', 'rate_des': 'Rate DES', 'grade': 'Grade'})
+    consultants['Rate'] = pd.to_numeric(consultants['Rate'], errors='coerce').astype('float64')
+    consultants['Rate DES'] = pd.to_numeric(consultants['Rate DES'], errors='coerce').astype('float64')
+
+    belgian_names = pd.DataFrame(list(Mission.objects.values('belgian_name', 'libelle_de_projet')), columns=['belgian_name', 'libelle_de_projet'])
+    belgian_names = belgian_names.rename(columns={'belgian_name': 'Customer Name', 'libelle_de_projet': 'Libelle projet'})
+    return {'codes': codes, 'consultants': consultants, 'belgian_names': belgian_names}
+
+
+def _version_dir(version):
+    return REFERENCE_DIR / f'v{version}'
+
+
+def _load_version(version):
+    snapshot = run_cache.get(CACHE_KEY, 'snapshot', version)
+    if snapshot is None:
+        store = RunStore(_version_dir(version))
+        if not store.exists():
+            raise ValueError(f'Reference data snapshot v{version} not found')
+        snapshot = ReferenceSnapshot(version, store.read('codes'), store.read('consultants'), store.read('belgian_names'))
+        run_cache.put(CACHE_KEY, 'snapshot', version, snapshot, snapshot.nbytes)
+    return snapshot
+
+
+def load_snapshot(version=None):
+    """The current reference snapshot, or a given ``version`` of it.
+
+    Builds and stores a new version when Mission or Resource changed since
+    the latest one; otherwise only reads the latest snapshot.
+    """
+    if version is not None:
+        return _load_version(version)
+    token = current_token()
+    latest = _read_json(REFERENCE_DIR / LATEST_FILENAME)
+    if latest is not None and latest['token'] == token:
+        return _load_version(latest['version'])
+    REFERENCE_DIR.mkdir(parents=True, exist_ok=True)
+    with locked(REFERENCE_DIR):
+        # Built by another process while this one waited
+        latest = _read_json(REFERENCE_DIR / LATEST_FILENAME)
+        if latest is not None and latest['token'] == token:
+            return _load_version(latest['version'])
+        version = (latest['version'] if latest else 0) + 1
+        # Left by a build that died before updating latest.json
+        while _version_dir(version).exists():
+            version += 1
+        tables = query_tables()
+        version_dir = _version_dir(version)
+        version_dir.mkdir(parents=True, exist_ok=True)
+        RunStore(version_dir).write(tables)
+        _write_json(REFERENCE_DIR / LATEST_FILENAME, {'version': version, 'token': token})
+    return _load_version(version)
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from django.conf import settings
+
+# In-process LRU cache of the DataFrames of SLR runs. Entries are keyed by
+# (run_id, artifact) and carry a version of their source (a file's mtime and
+# size, or a table version of the run archive), so rewriting the source or
+# switching to its _updated variant makes the old entry unreachable without
+# any explicit invalidation.
+
+
+def file_version(*paths):
+    """Version tuple of one or more files; missing files count as (0, 0)."""
+    version = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            version.append((path.name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append((path.name, 0, 0))
+    return tuple(version)
+
+
+def estimate_nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return 0
+
+
+class RunCache:
+    """Thread-safe LRU cache bounded by an approximate memory budget in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, run_id, artifact, version):
+        key = (run_id, artifact)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, run_id, artifact, version, value, nbytes=None):
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        key = (run_id, artifact)
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return value
+            self._entries[key] = (version, value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+        return value
+
+    def invalidate(self, run_id, artifact=None):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == run_id and artifact in (None, k[1])]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+run_cache = RunCache(getattr(settings, 'SLR_RUN_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
@@ -0,0 +1,214 @@
+import json
+import os
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the writers of this process are serialized
+    fcntl = None
+
+from .run_cache import run_cache
+
+# All tables of an SLR run in one file. The archive is a sequence of Arrow IPC
+# file segments followed by a JSON index and a fixed-size trailer:
+#
+#     MAGIC | segment | segment | ... | index (JSON) | index length (<Q) | MAGIC
+#
+# Readers memory-map the archive and open only the segments they need, and
+# only the columns they ask for are converted to pandas.
+# Writers append the new segments and a new index to the end of the file; the
+# segments of replaced tables become dead space, and once it outweighs the
+# live tables the archive is compacted into a new file swapped in with
+# os.replace. Writers hold an exclusive flock() on the run directory's lock
+# file and readers a shared one while they open the archive, so a reader
+# never sees a half-appended tail, whichever process or thread writes.
+
+ARCHIVE_FILENAME = 'run.arrow'
+MAGIC = b'SLRRUN01'
+TRAILER = struct.Struct('<Q')
+ALIGNMENT = 64
+BATCH_ROWS = 64 * 1024
+LOCK_FILENAME = 'run.lock'
+# Compact once the file is this many times the size of its live tables
+COMPACT_RATIO = 2
+
+_write_lock = threading.Lock()
+# Run directories locked by the current thread: path -> shared
+_held = threading.local()
+
+
+@contextmanager
+def locked(run_dir, shared=False):
+    """Hold the lock of a run directory: shared for readers, exclusive for writers.
+
+    Reentrant within a thread: a nested call under a lock the thread already
+    holds does nothing, except asking for the exclusive lock under a shared
+    one, which would deadlock and raises RuntimeError.
+    """
+    held = getattr(_held, 'locks', None)
+    if held is None:
+        held = _held.locks = {}
+    key = os.path.abspath(run_dir)
+    if key in held:
+        if held[key] and not shared:
+            raise RuntimeError(f'Exclusive lock of {run_dir} requested under its shared lock')
+        yield
+        return
+    held[key] = shared
+    try:
+        if fcntl is None:
+            if shared:
+                yield
+            else:
+                with _write_lock:
+                    yield
+            return
+        with open(run_dir / LOCK_FILENAME, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        del held[key]
+
+
+class RunStore:
+    """The table archive of one run directory."""
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.path = run_dir / ARCHIVE_FILENAME
+
+    def exists(self):
+        return self.path.exists()
+
+    def _open(self):
+        """``(buffer, index)`` of the archive; the buffer is memory-mapped, not read."""
+        with locked(self.run_dir, shared=True):
+            return self._map()
+
+    def _map(self):
+        with pa.memory_map(str(self.path), 'r') as source:
+            buffer = source.read_buffer()
+        tail = len(MAGIC) + TRAILER.size
+        if buffer.size < len(MAGIC) + tail or buffer[:len(MAGIC)].to_pybytes() != MAGIC \
+                or buffer[-len(MAGIC):].to_pybytes() != MAGIC:
+            raise ValueError(f'{self.path} is not a run archive')
+        (index_length,) = TRAILER.unpack(buffer[-tail:-len(MAGIC)].to_pybytes())
+        index = json.loads(buffer[buffer.size - tail - index_length:buffer.size - tail].to_pybytes())
+        return buffer, index
+
+    def index(self):
+        """Table name -> ``{offset, length, rows, columns, version}``; empty for a new run."""
+        if not self.exists():
+            return {}
+        return self._open()[1]['tables']
+
+    def has(self, name):
+        return name in self.index()
+
+    def version(self, name):
+        """Opaque version of one table; changes whenever that table is rewritten."""
+        entry = self.index().get(name)
+        return None if entry is None else entry['version']
+
+    def segment(self, name):
+        """Raw Arrow IPC bytes of a table, as a zero-copy buffer."""
+        buffer, index = self._open()
+        entry = index['tables'][name]
+        return buffer.slice(entry['offset'], entry['length'])
+
+    def read_arrow(self, name, columns=None):
+        """A table as ``pyarrow.Table``, limited to ``columns``."""
+        table = pa.ipc.open_file(self.segment(name)).read_all()
+        if columns is not None:
+            # Keep the pandas index columns so to_pandas() restores the original index
+            pandas_meta = table.schema.pandas_metadata or {}
+            index_columns = [c for c in pandas_meta.get('index_columns', []) if isinstance(c, str)]
+            table = table.select(list(columns) + [c for c in index_columns if c not in columns])
+        return table
+
+    def read(self, name, columns=None):
+        return self.read_arrow(name, columns).to_pandas()
+
+    def write(self, tables):
+        """Store DataFrames by name, replacing tables of the same name and keeping the rest."""
+        new_segments = {}
+        for name, df in tables.items():
+            table = pa.Table.from_pandas(df)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=BATCH_ROWS)
+            new_segments[name] = (sink.getvalue(), {
+                'rows': table.num_rows,
+                'columns': table.column_names,
+                'version': uuid.uuid4().hex,
+            })
+
+        with locked(self.run_dir):
+            if not self.exists():
+                self._rewrite(new_segments)
+                return
+            buffer, index = self._map()
+            kept = {name: entry for name, entry in index['tables'].items() if name not in tables}
+            added = sum(segment.size for segment, _ in new_segments.values())
+            live = sum(entry['length'] for entry in kept.values()) + added
+            if buffer.size + added > COMPACT_RATIO * live:
+                segments = {name: (buffer.slice(entry['offset'], entry['length']), entry) for name, entry in kept.items()}
+                segments.update(new_segments)
+                self._rewrite(segments)
+            else:
+                self._append(kept, new_segments)
+
+    def _write_segments(self, f, segments, index):
+        """Write ``segments`` at the end of ``f``, then an index of them plus ``index``'s tables."""
+        tables = dict(index)
+        for name, (segment, entry) in segments.items():
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            offset = f.tell()
+            f.write(memoryview(segment))
+            tables[name] = dict(entry, offset=offset, length=segment.size)
+        index_bytes = json.dumps({'format': 1, 'tables': tables}).encode('utf-8')
+        f.write(index_bytes)
+        f.write(TRAILER.pack(len(index_bytes)))
+        f.write(MAGIC)
+
+    def _append(self, kept, segments):
+        """Append ``segments`` and an index that also lists the ``kept`` entries."""
+        with open(self.path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            try:
+                self._write_segments(f, segments, kept)
+            except BaseException:
+                # Drop the partial tail so the previous index is the last one again
+                f.truncate(end)
+                raise
+
+    def _rewrite(self, segments):
+        """Write a new archive of ``segments`` only and swap it in."""
+        tmp_path = self.path.with_name(f'{ARCHIVE_FILENAME}.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC)
+                self._write_segments(f, segments, {})
+            os.replace(tmp_path, self.path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+
+def read_cached(run_dir, name, columns=None):
+    """``RunStore.read`` served from the run cache. Treat the result as read-only."""
+    store = RunStore(run_dir)
+    artifact = name if columns is None else (name, tuple(columns))
+    version = store.version(name)
+    df = run_cache.get(run_dir.name, artifact, version)
+    if df is None:
+        df = run_cache.put(run_dir.name, artifact, version, store.read(name, columns))
+    return df
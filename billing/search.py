@@ -0,0 +1,154 @@
+import logging
+
+from django.db import OperationalError, connection, connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Ranked search over missions and resources.
+#
+# On SQLite each table has an external-content FTS5 table with the trigram
+# tokenizer (substring matches, like icontains, but served from an index),
+# kept in sync by triggers so bulk_create() and QuerySet.update() are covered
+# too. On PostgreSQL the same columns get pg_trgm GIN indexes, which serve the
+# icontains filters, and results are ranked by trigram similarity. Other
+# backends fall back to plain icontains.
+#
+# Every search annotates ``search_rank``: lower is a better match.
+
+SEARCH_INDEXES = {
+    # FTS table: (content table, indexed columns)
+    'billing_mission_fts': ('billing_mission', ['otp_l2', 'belgian_name', 'libelle_de_projet', 'code_type']),
+    'billing_resource_fts': ('billing_resource', ['full_name', 'matricule', 'grade', 'grade_des']),
+}
+MISSION_SEARCH_FIELDS = SEARCH_INDEXES['billing_mission_fts'][1]
+RESOURCE_SEARCH_FIELDS = SEARCH_INDEXES['billing_resource_fts'][1]
+# The trigram tokenizer cannot match terms shorter than a trigram
+MIN_TERM_LENGTH = 3
+
+logger = logging.getLogger(__name__)
+_fts_available = {}
+
+
+class Similarity(Func):
+    function = 'similarity'
+    output_field = FloatField()
+
+
+def _sqlite_statements(fts_table, content_table, columns):
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    triggers = {
+        f'{fts_table}_ai': (
+            f'AFTER INSERT ON {content_table} BEGIN '
+            f'INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new}); END'
+        ),
+        f'{fts_table}_ad': (
+            f'AFTER DELETE ON {content_table} BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+        ),
+        f'{fts_table}_au': (
+            f'AFTER UPDATE ON {content_table} BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f'INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new}); END'
+        ),
+    }
+    table = (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5('
+        f"{cols}, content='{content_table}', content_rowid='id', tokenize='trigram')"
+    )
+    return table, triggers
+
+
+def ensure_search_indexes(using=None, **kwargs):
+    """Create the search indexes if missing; run after every migrate.
+
+    SQLite table rebuilds during migrations drop triggers, so missing
+    triggers are recreated and the FTS table is rebuilt from its content.
+    An FTS table whose columns differ from SEARCH_INDEXES is recreated.
+    """
+    conn = connections[using] if using else connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            existing = {row[0] for row in cursor.fetchall()}
+            for fts_table, (content_table, columns) in SEARCH_INDEXES.items():
+                table, triggers = _sqlite_statements(fts_table, content_table, columns)
+                cursor.execute(f'PRAGMA table_info({fts_table})')
+                indexed = [row[1] for row in cursor.fetchall()]
+                if indexed and indexed != columns:
+                    for name in triggers:
+                        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                    cursor.execute(f'DROP TABLE {fts_table}')
+                    existing -= set(triggers)
+                try:
+                    cursor.execute(table)
+                except OperationalError as e:
+                    # No FTS5 or trigram tokenizer (SQLite < 3.34): search falls back to icontains
+                    logger.warning('Search index %s not created: %s', fts_table, e)
+                    continue
+                missing = [name for name in triggers if name not in existing]
+                for name in missing:
+                    cursor.execute(f'CREATE TRIGGER {name} {triggers[name]}')
+                if missing:
+                    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+        elif conn.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for content_table, columns in SEARCH_INDEXES.values():
+                for column in columns:
+                    cursor.execute(
+                        f'CREATE INDEX IF NOT EXISTS {content_table}_{column}_trgm '
+                        f'ON {content_table} USING gin ({column} gin_trgm_ops)'
+                    )
+
+
+def fts_available():
+    """Whether the FTS tables exist in the default database (checked once per database)."""
+    name = connection.settings_dict['NAME']
+    if name not in _fts_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s)", list(SEARCH_INDEXES))
+            _fts_available[name] = cursor.fetchone()[0] == len(SEARCH_INDEXES)
+    return _fts_available[name]
+
+
+def fts_query(query):
+    """FTS5 MATCH expression for a free-text query, or None if a term is too short.
+
+    Each term is quoted as a phrase so user input cannot inject FTS syntax;
+    terms are ANDed.
+    """
+    terms = query.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def _icontains(fields, query):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def search(queryset, fields, query):
+    """Filter ``queryset`` on ``query`` over ``fields`` and annotate ``search_rank``."""
+    query = query.strip()
+    vendor = connection.vendor
+    match = fts_query(query) if vendor == 'sqlite' and fts_available() else None
+    if match is not None:
+        return queryset.filter(search_index__fts__match=match).annotate(search_rank=F('search_index__rank'))
+    queryset = queryset.filter(_icontains(fields, query))
+    if vendor == 'postgresql':
+        similarities = [Similarity(Coalesce(field, Value('')), Value(query)) for field in fields]
+        best = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        return queryset.annotate(search_rank=-best)
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_missions(queryset, query):
+    return search(queryset, MISSION_SEARCH_FIELDS, query)
+
+
+def search_resources(queryset, query):
+    return search(queryset, RESOURCE_SEARCH_FIELDS, query)
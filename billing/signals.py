@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import reference_data
+from .models import Mission, Resource
+
+
+@receiver([post_save, post_delete], sender=Mission)
+@receiver([post_save, post_delete], sender=Resource)
+def invalidate_reference_data(sender, **kwargs):
+    # Only once committed, so a snapshot never captures a change that rolls back
+    transaction.on_commit(reference_data.invalidate)
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+from django.db import DatabaseError
+
+from . import mission_results, slr_engine, slr_report
+from .instrumentation import untimed
+from .run_cache import file_version, run_cache
+from .run_store import RunStore, locked, read_cached
+
+# Manual Adjusted Hours edits of a run. Single-cell edits are appended to a
+# small journal instead of rewriting the run archive; readers replay the
+# journal on top of the latest tables and a full save folds it back in.
+# Edits and saves hold the run directory's lock (run_store.locked) from
+# loading the state to persisting it, so workers of other processes never
+# build on a state that misses an edit. Each edit also writes its project's
+# new totals back to the missions (see mission_results), a save all of them.
+
+JOURNAL_FILENAME = 'adjustments.jsonl'
+KPI_FILENAME = 'kpis.json'
+COMPACT_AFTER = 200
+STATE_ARTIFACT = 'adjustment_state'
+REPORTS_DIRNAME = 'reports'
+REPORT_TABLES = ['employee_summary', 'global_summary', 'adjusted', 'result']
+
+logger = logging.getLogger(__name__)
+
+
+def get_latest_table(run_dir, base):
+    """Archive name of the latest version of a run table: ``<base>_updated`` once saved."""
+    updated = f'{base}_updated'
+    return updated if RunStore(run_dir).has(updated) else f'{base}_initial'
+
+
+def read_latest(run_dir, base, columns=None):
+    """Latest version of a run table, served from the run cache. Treat it as read-only."""
+    return read_cached(run_dir, get_latest_table(run_dir, base), columns)
+
+
+def read_journal(run_dir):
+    try:
+        with open(run_dir / JOURNAL_FILENAME, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def record_adjustment(run_dir, row_id, adjusted_hours):
+    """Append one edit to the run's journal."""
+    with open(run_dir / JOURNAL_FILENAME, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'row_id': row_id, 'adjusted_hours': adjusted_hours}) + '\n')
+
+
+class AdjustmentState:
+    """The current ``adjusted`` and ``result`` tables of a run with O(1) row lookups.
+
+    ``journal_length`` counts the journal edits applied on top of the tables.
+    """
+
+    def __init__(self, adjusted, result):
+        self.adjusted = adjusted
+        self.result = result
+        self.journal_length = 0
+        self.rows = slr_engine.row_labels(adjusted, 'ID')
+        self.projects = slr_engine.row_labels(result, slr_engine.GROUP_KEY)
+
+    @property
+    def nbytes(self):
+        return int(self.adjusted.memory_usage(deep=True).sum() + self.result.memory_usage(deep=True).sum())
+
+    def apply(self, row_id, adjusted_hours):
+        """Apply one edit; returns the row label, or None if ``row_id`` is unknown."""
+        row = self.rows.get(row_id)
+        if row is None:
+            return None
+        project_row = self.project_row(row)
+        slr_engine.apply_adjustment(self.adjusted, self.result, row, project_row, adjusted_hours)
+        return row
+
+    def project_row(self, row):
+        """Label of the ``result`` row of the project of ``adjusted`` row ``row``, or None."""
+        return self.projects.get(self.adjusted.at[row, slr_engine.GROUP_KEY])
+
+    def project_totals(self, row):
+        project_row = self.project_row(row)
+        if project_row is None:
+            return None
+        return self.result.loc[project_row, [slr_engine.GROUP_KEY] + slr_engine.SUM_COLUMNS + ['Estimees', 'Ecart']].to_dict()
+
+
+def state_version(run_dir):
+    """Version of a run's adjustment state: changes with its tables and its journal."""
+    store = RunStore(run_dir)
+    return (
+        store.version(get_latest_table(run_dir, 'adjusted')),
+        store.version(get_latest_table(run_dir, 'result')),
+        file_version(run_dir / JOURNAL_FILENAME),
+    )
+
+
+def _cache_state(run_dir, state):
+    run_cache.put(run_dir.name, STATE_ARTIFACT, state_version(run_dir), state, state.nbytes)
+
+
+def load_state(run_dir):
+    """Load the latest adjusted/result tables of a run with pending journal edits applied.
+
+    The state is cached per run and mutated in place by edits, so callers that
+    change it must go through ``apply_edit`` or ``save_state``.
+    """
+    state = run_cache.get(run_dir.name, STATE_ARTIFACT, state_version(run_dir))
+    if state is not None:
+        return state
+    store = RunStore(run_dir)
+    state = AdjustmentState(
+        store.read(get_latest_table(run_dir, 'adjusted')),
+        store.read(get_latest_table(run_dir, 'result')),
+    )
+    for entry in read_journal(run_dir):
+        state.apply(entry['row_id'], entry['adjusted_hours'])
+        state.journal_length += 1
+    _cache_state(run_dir, state)
+    return state
+
+
+def apply_edit(run_dir, row_id, adjusted_hours):
+    """Apply and persist one edit, and write its project's totals back to the missions.
+
+    Returns ``(state, row)``; ``row`` is None if ``row_id`` is unknown.
+    """
+    with locked(run_dir):
+        # Reloaded from disk when another process changed the tables or the journal
+        state = load_state(run_dir)
+        row = state.rows.get(row_id)
+        if row is None:
+            return state, None
+        project_row = state.project_row(row)
+        before = None if project_row is None else state.result.loc[project_row, ['Adjusted Cost', 'Ecart']].to_dict()
+        try:
+            state.apply(row_id, adjusted_hours)
+            record_adjustment(run_dir, row_id, adjusted_hours)
+            state.journal_length += 1
+            if state.journal_length >= COMPACT_AFTER:
+                save_state(run_dir, state.adjusted, state.result)
+            else:
+                _cache_state(run_dir, state)
+                if project_row is not None:
+                    update_kpi_snapshot(run_dir, state.result, project_row, before)
+                    # Only the edited project's totals changed
+                    _write_back(run_dir, state.result.loc[[project_row]], clear=False)
+        except Exception:
+            run_cache.invalidate(run_dir.name, STATE_ARTIFACT)
+            raise
+        return state, row
+
+
+def load_result(run_dir, columns=None):
+    """Latest ``result`` table of a run; only replays the journal when edits are pending."""
+    if not (run_dir / JOURNAL_FILENAME).exists():
+        return read_latest(run_dir, 'result', columns)
+    result = load_state(run_dir).result
+    return result if columns is None else result[columns]
+
+
+def save_state(run_dir, adjusted, result):
+    """Store the full tables as the run's ``_updated`` tables and clear the journal.
+
+    The new project totals are also written back to the missions.
+    """
+    with locked(run_dir):
+        # The journal is only cleared once its edits are in the archive
+        RunStore(run_dir).write({'adjusted_updated': adjusted, 'result_updated': result})
+        (run_dir / JOURNAL_FILENAME).unlink(missing_ok=True)
+        _cache_state(run_dir, AdjustmentState(adjusted, result))
+        write_kpi_snapshot(run_dir, result)
+        _write_back(run_dir, result)
+
+
+def _write_back(run_dir, result, clear=True):
+    # slr_jobs imports this module
+    from . import slr_jobs
+    period = (slr_jobs.read_status(run_dir.name) or {}).get('period')
+    try:
+        mission_results.write_back(result, period, clear=clear)
+    except DatabaseError:
+        # The tables are saved; the mission totals catch up on the next edit or save
+        logger.exception('Mission totals of run %s not stored', run_dir.name)
+
+
+def write_kpi_snapshot(run_dir, result, employee_summary=None):
+    """Recompute the dashboard KPIs of a run and store them next to its archive."""
+    if employee_summary is None:
+        employee_summary = read_latest(run_dir, 'employee_summary', slr_engine.KPI_EMPLOYEE_COLUMNS)
+    kpis = slr_engine.compute_kpis(result, employee_summary)
+    with locked(run_dir):
+        _write_kpis(run_dir, kpis)
+    return kpis
+
+
+def update_kpi_snapshot(run_dir, result, project_row, before):
+    """Patch the KPI snapshot after one edit, see ``slr_engine.patch_kpis``."""
+    with locked(run_dir):
+        try:
+            with open(run_dir / KPI_FILENAME, encoding='utf-8') as f:
+                kpis = json.load(f)
+        except FileNotFoundError:
+            kpis = None
+        if kpis is not None:
+            _write_kpis(run_dir, slr_engine.patch_kpis(kpis, result, project_row, before))
+    if kpis is None:
+        write_kpi_snapshot(run_dir, result)
+
+
+def _write_kpis(run_dir, kpis):
+    tmp_path = run_dir / f'{KPI_FILENAME}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(kpis, f)
+    os.replace(tmp_path, run_dir / KPI_FILENAME)
+
+
+def load_kpi_snapshot(run_dir):
+    """The run's KPI snapshot; built on the fly for runs that predate snapshots."""
+    try:
+        with open(run_dir / KPI_FILENAME, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return write_kpi_snapshot(run_dir, load_result(run_dir, slr_engine.KPI_RESULT_COLUMNS))
+
+
+def _report_inputs(run_dir, initial):
+    extra = ['unmatched_names'] if RunStore(run_dir).has('unmatched_names') else []
+    if initial:
+        return ['base_df'] + [f'{base}_initial' for base in REPORT_TABLES] + extra
+    return ['base_df'] + [get_latest_table(run_dir, base) for base in REPORT_TABLES] + extra
+
+
+def report_digest(run_dir, initial=False):
+    """Content hash of the tables a run's report is built from.
+
+    Hashes the tables' archive segments (and the pending journal) rather than
+    their names, so an unchanged state maps to the same report whichever
+    tables hold it. Cached per table version.
+    """
+    store = RunStore(run_dir)
+    names = _report_inputs(run_dir, initial)
+    journal = None if initial else run_dir / JOURNAL_FILENAME
+    artifact = 'report_digest_initial' if initial else 'report_digest'
+    version = tuple(store.version(name) for name in names) + (journal and file_version(journal),)
+    digest = run_cache.get(run_dir.name, artifact, version)
+    if digest is None:
+        sha = hashlib.sha256(slr_report.REPORT_FORMAT_VERSION.encode())
+        for name in names:
+            sha.update(memoryview(store.segment(name)))
+        if journal is not None and journal.exists():
+            sha.update(journal.read_bytes())
+        digest = run_cache.put(run_dir.name, artifact, version, sha.hexdigest())
+    return digest
+
+
+def get_report(run_dir, initial=False, stage=untimed):
+    """Path of the xlsx report of a run, built on first request.
+
+    Reports live in ``reports/<digest>.xlsx`` so saving adjustments costs
+    nothing until someone downloads; returns ``(path, digest)``. Building
+    the workbook is wrapped in ``stage('xlsx_write')``.
+    """
+    reports_dir = run_dir / REPORTS_DIRNAME
+    # Only the digest and the snapshot of the tables hold the run's lock; the
+    # workbook is built outside it, so edits go on meanwhile
+    with locked(run_dir, shared=True):
+        digest = report_digest(run_dir, initial)
+        path = reports_dir / f'{digest}.xlsx'
+        if path.exists():
+            return path, digest
+        if initial:
+            store = RunStore(run_dir)
+            tables = {base: store.read(f'{base}_initial') for base in REPORT_TABLES}
+        else:
+            # Edits mutate the cached state in place
+            state = load_state(run_dir)
+            tables = {
+                'employee_summary': read_latest(run_dir, 'employee_summary'),
+                'global_summary': read_latest(run_dir, 'global_summary'),
+                'adjusted': state.adjusted.copy(),
+                'result': state.result.copy(),
+            }
+        has_unmatched = RunStore(run_dir).has('unmatched_names')
+        initial_digest = report_digest(run_dir, initial=True)
+
+    tables['base'] = read_cached(run_dir, 'base_df')
+    if has_unmatched:
+        tables['unmatched'] = read_cached(run_dir, 'unmatched_names')
+    reports_dir.mkdir(exist_ok=True)
+    with stage('xlsx_write') as metrics:
+        # Written to a temporary file and swapped in, so concurrent builds of one digest are safe
+        slr_report.write_report(path, tables)
+        metrics['rows'] = len(tables['adjusted'])
+
+    # Keep the initial report and this one; older current-state reports are stale
+    keep = {path.name, f'{initial_digest}.xlsx'}
+    for stale in reports_dir.glob('*.xlsx'):
+        if stale.name not in keep:
+            stale.unlink(missing_ok=True)
+    return path, digest
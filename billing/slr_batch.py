@@ -0,0 +1,102 @@
+import glob
+import os
+import time
+from pathlib import Path
+
+from .slr_engine import MONTHS, parse_period
+
+# Helpers of the batch_slr command. Pool workers import this module before
+# Django is set up (spawn start method, e.g. on Windows), so nothing Django is
+# imported at module level.
+
+EXCEL_SUFFIXES = ('.xlsx', '.xls')
+# The readers use openpyxl, which cannot open these
+LEGACY_SUFFIXES = ('.xls',)
+
+
+def is_heures(name):
+    # Same rule as the main.py folder watcher
+    return 'IBM' in name and name.endswith(EXCEL_SUFFIXES) and ('Heures' in name or name.startswith('IBM'))
+
+
+def is_mafe(name):
+    return 'MAFE' in name and name.endswith(EXCEL_SUFFIXES)
+
+
+def period_key(name):
+    """``(mois, yy)`` of a filename, or None; 2- and 4-digit years pair up."""
+    mois, annee = parse_period(name)
+    return (mois, annee[-2:]) if mois else None
+
+
+def month_number(mois):
+    return MONTHS.index(mois) if mois in MONTHS else len(MONTHS)
+
+
+def pair_files(paths):
+    """Pair Heures IBM and MAFE files by period.
+
+    Returns ``(pairs, problems)``: ``pairs`` maps ``(mois, yy)`` to
+    ``(heures_path, mafe_path)``; ``problems`` lists files left out and why.
+    """
+    found = {'heures': {}, 'mafe': {}}
+    problems = []
+    for path in sorted(set(paths)):
+        name = path.name
+        if name.startswith('~$'):
+            continue
+        kind = 'heures' if is_heures(name) else 'mafe' if is_mafe(name) else None
+        if kind is None:
+            continue
+        if name.lower().endswith(LEGACY_SUFFIXES):
+            problems.append(f'{name}: legacy .xls workbook, save it as .xlsx')
+            continue
+        key = period_key(name)
+        if key is None:
+            problems.append(f'{name}: no month/year in the filename')
+            continue
+        found[kind].setdefault(key, []).append(path)
+
+    pairs = {}
+    for key in sorted(set(found['heures']) | set(found['mafe']), key=lambda k: (k[1], month_number(k[0]))):
+        heures, mafe = found['heures'].get(key, []), found['mafe'].get(key, [])
+        label = ' '.join(key)
+        if len(heures) > 1 or len(mafe) > 1:
+            names = ', '.join(p.name for p in heures + mafe)
+            problems.append(f'{label}: several files for the same month ({names})')
+        elif not heures or not mafe:
+            problems.append(f"{label}: no {'MAFE report' if heures else 'Heures IBM file'} for {(heures or mafe)[0].name}")
+        else:
+            pairs[key] = (heures[0], mafe[0])
+    return pairs, problems
+
+
+def expand_paths(specs):
+    """Files named by ``specs``: directories (their Excel files), glob patterns or plain paths."""
+    paths = []
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            paths.extend(p for p in path.iterdir() if p.is_file() and p.name.endswith(EXCEL_SUFFIXES))
+        elif glob.has_magic(spec):
+            paths.extend(Path(p) for p in glob.glob(spec) if os.path.isfile(p))
+        elif path.is_file():
+            paths.append(path)
+    return paths
+
+
+def init_worker(settings_module):
+    """Pool initializer: set up Django in the worker process."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def run_month(run_id, heures_path, mafe_path, heures_filename, reference_version):
+    """Run one month in a pool worker; returns ``(run_id, status, seconds)``."""
+    from . import slr_jobs
+
+    started = time.perf_counter()
+    slr_jobs.execute_run(run_id, Path(heures_path), Path(mafe_path), heures_filename, reference_version)
+    status = slr_jobs.read_status(run_id) or {}
+    return run_id, status.get('status'), time.perf_counter() - started
@@ -0,0 +1,318 @@
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import untimed
+
+# Shared SLR computation used by the web views and the main.py folder watcher.
+# Nothing in here touches Django so the script can import it standalone.
+
+MOIS_MAPPING = {
+    'Janvier': 'Jan', 'Février': 'Feb', 'Mars': 'Mar', 'Avril': 'Apr', 'Mai': 'May', 'Juin': 'Jun',
+    'Juillet': 'Jul', 'Août': 'Aug', 'Septembre': 'Sep', 'Octobre': 'Oct', 'Novembre': 'Nov', 'Décembre': 'Dec',
+    'Jan': 'Jan', 'Feb': 'Feb', 'Mar': 'Mar', 'Apr': 'Apr', 'May': 'May', 'Jun': 'Jun',
+    'Jul': 'Jul', 'Aug': 'Aug', 'Sep': 'Sep', 'Oct': 'Oct', 'Nov': 'Nov', 'Dec': 'Dec'
+}
+# Jan..Dec, in calendar order
+MONTHS = list(dict.fromkeys(MOIS_MAPPING.values()))
+PERIOD_RE = re.compile(r'(Janvier|Février|Mars|Avril|Mai|Juin|Juillet|Août|Septembre|Octobre|Novembre|Décembre|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]*(\d{2,4})')
+
+BASE_COLUMNS = ['Code projet', 'Nom', 'Grade', 'Date', 'Heures']
+MAFE_HEADER_ROW = 14
+GROUP_KEY = 'Libelle projet'
+SUM_COLUMNS = ['Total Heures', 'Adjusted Hours', 'Adjusted Cost', 'Heures Retirées']
+TECHNICAL_COLUMNS = ['Total_Projet_Cout', 'coeff_total', 'total_rate_proj', 'priority_coeff', 'final_coeff']
+# The only columns compute_kpis() reads
+KPI_RESULT_COLUMNS = [GROUP_KEY, 'Estimees', 'Adjusted Cost', 'Ecart']
+KPI_EMPLOYEE_COLUMNS = [GROUP_KEY, 'Nom']
+
+
+def parse_period(filename):
+    """Return (mois, annee) parsed from a Heures IBM filename, or ('', '')."""
+    match = PERIOD_RE.search(filename or '')
+    if not match:
+        return '', ''
+    return MOIS_MAPPING.get(match.group(1), match.group(1)), match.group(2)
+
+
+def period_start(filename):
+    """First day of the month parsed from a filename, or None."""
+    mois, annee = parse_period(filename)
+    if not mois:
+        return None
+    return date(2000 + int(annee[-2:]), MONTHS.index(mois) + 1, 1)
+
+
+def clean_header(values):
+    """Normalise MAFE header cells the way the report has always done it."""
+    return [str(v).strip().replace('\n', ' ').replace('\r', ' ') for v in values]
+
+
+def find_forecast_column(columns, mois, annee):
+    return next((col for col in columns if mois in col and 'Forecasts' in col and annee[-2:] in col), None)
+
+
+def normalize_name(value):
+    """Join key of a consultant name; ``Resource.normalized_name`` stores the same key."""
+    return str(value).lower().strip()
+
+
+def normalize_names(values):
+    # Hours files repeat each name on every row; normalise each distinct value once
+    series = pd.Series(values)
+    uniques = series.unique()
+    return series.map(dict(zip(uniques, (normalize_name(v) for v in uniques))))
+
+
+def to_number(values):
+    """Coerce a column of Excel cells to float64, treating blanks and dashes as 0."""
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64').fillna(0)
+    cleaned = series.astype(str).str.strip().replace(['', '-', 'nan', 'None'], '0')
+    return pd.to_numeric(cleaned, errors='coerce').fillna(0).astype('float64')
+
+
+def prepare_base(base_df, codes_df):
+    """Attach the project label to each hours row and type the join/measure columns."""
+    base_df = base_df.copy()
+    codes = codes_df.drop_duplicates('Code projet')
+    base_df[GROUP_KEY] = base_df['Code projet'].map(codes.set_index('Code projet')[GROUP_KEY])
+    base_df['Nom'] = normalize_names(base_df['Nom']).to_numpy()
+    base_df['Heures'] = pd.to_numeric(base_df['Heures'], errors='coerce').fillna(0).astype('float64')
+    return base_df
+
+
+def prepare_consultants(consultants_df):
+    consultants_df = consultants_df.copy()
+    consultants_df['Nom'] = normalize_names(consultants_df['Nom']).to_numpy()
+    consultants_df['Rate'] = pd.to_numeric(consultants_df['Rate'], errors='coerce').fillna(0).astype('float64')
+    consultants_df['Rate DES'] = pd.to_numeric(consultants_df['Rate DES'], errors='coerce').fillna(0).astype('float64')
+    return consultants_df
+
+
+def prepare_mafe_subset(mafe_df, forecast_col, belgian_names_df=None):
+    """Reduce the MAFE sheet to (Country, Customer Name, Libelle projet, Estimees).
+
+    ``belgian_names_df`` maps 'Customer Name' to 'Libelle projet'; customers
+    without a mapping keep their own name as project label.
+    """
+    if not forecast_col:
+        return pd.DataFrame(columns=['Country', 'Customer Name', GROUP_KEY, 'Estimees'])
+    mafe_subset = mafe_df[['Country', 'Customer Name', forecast_col]].rename(columns={forecast_col: 'Estimees'})
+    if belgian_names_df is not None and not belgian_names_df.empty:
+        mapping = belgian_names_df.drop_duplicates('Customer Name').set_index('Customer Name')[GROUP_KEY]
+        mafe_subset[GROUP_KEY] = mafe_subset['Customer Name'].map(mapping)
+    else:
+        mafe_subset[GROUP_KEY] = np.nan
+    mafe_subset[GROUP_KEY] = mafe_subset[GROUP_KEY].fillna(mafe_subset['Customer Name'])
+    return mafe_subset
+
+
+def build_employee_summary(base_df, consultants_df):
+    employee_summary = (
+        base_df.groupby([GROUP_KEY, 'Nom', 'Grade'], as_index=False)['Heures'].sum()
+        .rename(columns={'Heures': 'Total Heures'})
+    )
+    rates = consultants_df.drop_duplicates('Nom').set_index('Nom')
+    employee_summary['Rate'] = employee_summary['Nom'].map(rates['Rate'])
+    employee_summary['Rate DES'] = employee_summary['Nom'].map(rates['Rate DES'])
+    employee_summary['Total'] = employee_summary['Rate'] * employee_summary['Total Heures']
+    employee_summary['Total DES'] = employee_summary['Rate DES'] * employee_summary['Total Heures']
+    return employee_summary
+
+
+def build_global_summary(employee_summary, mafe_subset):
+    summary_by_proj = employee_summary.groupby(GROUP_KEY, as_index=False)[['Total Heures', 'Total', 'Total DES']].sum()
+    global_summary = mafe_subset[[GROUP_KEY, 'Estimees']].drop_duplicates().merge(summary_by_proj, on=GROUP_KEY, how='left')
+    global_summary[['Total Heures', 'Total', 'Total DES']] = global_summary[['Total Heures', 'Total', 'Total DES']].fillna(0)
+    global_summary['Estimees'] = to_number(global_summary['Estimees']).to_numpy()
+    return global_summary
+
+
+def project_estimates(global_summary):
+    """One forecast per project, summing the MAFE lines mapped onto the same label."""
+    return global_summary.groupby(GROUP_KEY)['Estimees'].sum()
+
+
+def compute_adjusted_hours(total_heures, final_coeff):
+    """Vectorised adjustment: scale down, floor at 0, then apply the 30% rule."""
+    total_heures = np.asarray(total_heures, dtype='float64')
+    hours = np.round(total_heures * (1 - np.asarray(final_coeff, dtype='float64')))
+    hours = np.where(hours < 0, 0.0, hours)
+    # Rows that were adjusted all the way down keep 30% of their hours
+    thirty_pct = (hours == 0) & (total_heures > 0)
+    return np.where(thirty_pct, np.round(total_heures * 0.3), hours)
+
+
+def build_adjusted(employee_summary, global_summary):
+    adjusted = employee_summary.copy()
+    adjusted['Estimees'] = adjusted[GROUP_KEY].map(project_estimates(global_summary))
+    groups = adjusted.groupby(GROUP_KEY)
+    adjusted['Total_Projet_Cout'] = groups['Total'].transform('sum')
+    total_cout = adjusted['Total_Projet_Cout'].to_numpy()
+    adjusted['coeff_total'] = np.where(total_cout > 0, adjusted['Estimees'].to_numpy() / np.where(total_cout > 0, total_cout, 1), 0)
+    adjusted['total_rate_proj'] = groups['Rate'].transform('sum')
+    total_rate = adjusted['total_rate_proj'].to_numpy()
+    adjusted['priority_coeff'] = np.where(total_rate > 0, adjusted['Rate'].to_numpy() / np.where(total_rate > 0, total_rate, 1), 0)
+    adjusted['final_coeff'] = adjusted['coeff_total'] * adjusted['priority_coeff']
+
+    adjusted['Adjusted Hours'] = compute_adjusted_hours(adjusted['Total Heures'], adjusted['final_coeff'])
+    adjusted['Heures Retirées'] = adjusted['Total Heures'] - adjusted['Adjusted Hours']
+    adjusted['Adjusted Cost'] = adjusted['Adjusted Hours'] * adjusted['Rate']
+    adjusted.insert(0, 'ID', adjusted['Nom'].astype(str) + ' - ' + adjusted[GROUP_KEY].astype(str))
+    return adjusted
+
+
+def build_result(adjusted, global_summary):
+    result = adjusted.groupby(GROUP_KEY, as_index=False)[SUM_COLUMNS].sum()
+    result['Estimees'] = result[GROUP_KEY].map(project_estimates(global_summary))
+    result['Ecart'] = result['Estimees'] - result['Adjusted Cost']
+    return result
+
+
+def row_labels(df, key):
+    """Map each value of ``key`` to the index label of its first row."""
+    labels = pd.Series(df.index, index=df[key].to_numpy())
+    return labels[~labels.index.duplicated()].to_dict()
+
+
+def apply_adjustment(adjusted, result, row, project_row, new_hours):
+    """Apply one Adjusted Hours edit in place as a delta.
+
+    Updates row ``row`` of ``adjusted`` and, when given, the matching project
+    row ``project_row`` of ``result`` without re-aggregating anything.
+    """
+    old_values = {col: adjusted.at[row, col] for col in SUM_COLUMNS}
+    adjusted.at[row, 'Adjusted Hours'] = new_hours
+    adjusted.at[row, 'Heures Retirées'] = adjusted.at[row, 'Total Heures'] - new_hours
+    adjusted.at[row, 'Adjusted Cost'] = new_hours * adjusted.at[row, 'Rate']
+    if project_row is not None:
+        # groupby sums skip NaN, so a NaN cell contributes nothing to the project row
+        for col in ('Adjusted Hours', 'Heures Retirées', 'Adjusted Cost'):
+            result.at[project_row, col] += np.nan_to_num(adjusted.at[row, col]) - np.nan_to_num(old_values[col])
+        result.at[project_row, 'Ecart'] = result.at[project_row, 'Estimees'] - result.at[project_row, 'Adjusted Cost']
+
+
+def _pct(ecart, budget):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(budget != 0, ecart / budget * 100, 0.0)
+
+
+def compute_kpis(result, employee_summary):
+    """Dashboard KPIs, overall and per project, in one groupby pass over each table."""
+    per_project = result.drop_duplicates(GROUP_KEY).set_index(GROUP_KEY)[['Estimees', 'Adjusted Cost', 'Ecart']].sort_index()
+    nb_employes = employee_summary.groupby(GROUP_KEY)['Nom'].nunique()
+    per_project['nbEmployes'] = nb_employes.reindex(per_project.index, fill_value=0)
+    per_project['pctAjustement'] = _pct(per_project['Ecart'].to_numpy(), per_project['Estimees'].to_numpy())
+
+    total_budget = result['Estimees'].sum()
+    total_ecart = result['Ecart'].sum()
+    overall = {
+        'nbEmployes': int(employee_summary['Nom'].nunique()),
+        'totalBudgetEstime': float(total_budget),
+        'totalAdjustedCost': float(result['Adjusted Cost'].sum()),
+        'totalEcart': float(total_ecart),
+        'pctAjustement': float(total_ecart / total_budget * 100) if total_budget else 0,
+    }
+    projects = {}
+    for name, nb, budget, cost, ecart, pct in zip(
+        per_project.index, per_project['nbEmployes'], per_project['Estimees'],
+        per_project['Adjusted Cost'], per_project['Ecart'], per_project['pctAjustement'],
+    ):
+        budget, cost, ecart = float(budget), float(cost), float(ecart)
+        projects[name] = {
+            'kpis': {
+                'nbEmployes': int(nb),
+                'totalBudgetEstime': budget,
+                'totalAdjustedCost': cost,
+                'totalEcart': ecart,
+                'pctAjustement': float(pct),
+            },
+            'chart1_data': {'budgetEstime': budget, 'adjustedCost': cost},
+            'chart2_data': {'budgetEstime': budget, 'ecart': ecart},
+        }
+    return {'overall': overall, 'projects': projects}
+
+
+def patch_kpis(kpis, result, project_row, before):
+    """Update ``compute_kpis`` output in place after an edit of ``result`` row ``project_row``.
+
+    ``before`` holds the row's 'Adjusted Cost' and 'Ecart' prior to the edit.
+    Only that project's entry and the overall totals move; nbEmployes cannot.
+    """
+    budget = float(result.at[project_row, 'Estimees'])
+    cost = float(result.at[project_row, 'Adjusted Cost'])
+    ecart = float(result.at[project_row, 'Ecart'])
+    overall = kpis['overall']
+    # Sums skip NaN, so do the deltas
+    overall['totalAdjustedCost'] += float(np.nan_to_num(cost) - np.nan_to_num(before['Adjusted Cost']))
+    overall['totalEcart'] += float(np.nan_to_num(ecart) - np.nan_to_num(before['Ecart']))
+    total_budget = overall['totalBudgetEstime']
+    overall['pctAjustement'] = float(overall['totalEcart'] / total_budget * 100) if total_budget else 0
+
+    project = kpis['projects'].get(result.at[project_row, GROUP_KEY])
+    if project is not None:
+        project['kpis'].update(
+            totalAdjustedCost=cost,
+            totalEcart=ecart,
+            pctAjustement=float(_pct(np.float64(ecart), np.float64(budget))),
+        )
+        project['chart1_data']['adjustedCost'] = cost
+        project['chart2_data']['ecart'] = ecart
+    return kpis
+
+
+def unmatched_names(employee_summary):
+    """Consultants of the hours file that have no rate, with their total hours."""
+    missing = employee_summary[employee_summary['Rate'].isna()]
+    return (
+        missing.groupby('Nom', as_index=False)['Total Heures'].sum()
+        .sort_values(['Total Heures', 'Nom'], ascending=[False, True], ignore_index=True)
+    )
+
+
+def round_numeric(df):
+    numeric = df.select_dtypes(include='number').columns
+    df[numeric] = df[numeric].round(0)
+    return df
+
+
+def compute_slr(base_df, codes_df, consultants_df, mafe_subset, stage=untimed):
+    """Run the full SLR calculation.
+
+    Takes the raw hours rows (``BASE_COLUMNS``), the code -> project mapping
+    ('Code projet', 'Libelle projet'), the consultant rates ('Nom', 'Rate',
+    'Rate DES') and the prepared MAFE subset. Returns a dict with the typed
+    ``base`` rows plus ``employee_summary``, ``global_summary``, ``adjusted``,
+    ``result`` and the ``unmatched`` consultant names.
+
+    ``stage(name)`` wraps each step in a context manager yielding a metrics
+    dict, e.g. ``instrumentation.StageRecorder.stage``.
+    """
+    with stage('merge_codes') as metrics:
+        base_df = prepare_base(base_df, codes_df)
+        metrics['rows'] = len(base_df)
+    with stage('merge_consultants') as metrics:
+        consultants_df = prepare_consultants(consultants_df)
+        metrics['rows'] = len(consultants_df)
+    with stage('employee_summary') as metrics:
+        employee_summary = build_employee_summary(base_df, consultants_df)
+        global_summary = build_global_summary(employee_summary, mafe_subset)
+        metrics['rows'] = len(employee_summary)
+    with stage('adjustment') as metrics:
+        adjusted = build_adjusted(employee_summary, global_summary)
+        result = build_result(adjusted, global_summary)
+        tables = {
+            'base': base_df,
+            'consultants': consultants_df,
+            'employee_summary': round_numeric(employee_summary),
+            'global_summary': round_numeric(global_summary),
+            'adjusted': round_numeric(adjusted),
+            'result': round_numeric(result),
+            'unmatched': unmatched_names(employee_summary),
+        }
+        metrics['rows'] = len(adjusted)
+    return tables
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from .run_cache import run_cache
+from .slr_engine import GROUP_KEY, TECHNICAL_COLUMNS
+
+# Server side of the edit_slr_adjustments grid: one page of the run's
+# adjusted rows, filtered, sorted and reduced to the requested columns, so
+# the browser only ever receives the rows it shows. The row order of each
+# filter and sort is cached per state version, so scrolling through a run
+# filters and sorts it once rather than for every block.
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+KEY_COLUMN = 'ID'
+# query parameter: (column, match)
+FILTERS = {
+    'project': (GROUP_KEY, 'exact'),
+    'employee': ('Nom', 'contains'),
+    'grade': ('Grade', 'exact'),
+}
+
+
+class GridError(ValueError):
+    """Invalid grid parameters."""
+
+
+def display_columns(adjusted):
+    return [col for col in adjusted.columns if col not in TECHNICAL_COLUMNS]
+
+
+def _int(params, name, default, minimum=0, maximum=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise GridError(f'"{name}" must be an integer')
+    if value < minimum:
+        raise GridError(f'"{name}" must be at least {minimum}')
+    return min(value, maximum) if maximum is not None else value
+
+
+def _list(params, name):
+    value = params.get(name) or ''
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_params(params):
+    """Keyword arguments of ``query`` from the request's GET parameters.
+
+    ``offset``/``limit`` page the rows, ``sort`` is a comma-separated list of
+    columns (``-`` prefix for descending), ``columns`` the comma-separated
+    columns to return and ``project``/``employee``/``grade`` filter the rows.
+    """
+    return {
+        'offset': _int(params, 'offset', 0),
+        'limit': _int(params, 'limit', DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT),
+        'sort': _list(params, 'sort'),
+        'columns': _list(params, 'columns') or None,
+        'filters': {name: params[name] for name in FILTERS if params.get(name)},
+    }
+
+
+def _check_columns(names, available):
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise GridError(f'Unknown column(s): {", ".join(unknown)}')
+
+
+def _filter_mask(adjusted, filters):
+    mask = pd.Series(True, index=adjusted.index)
+    for name, value in filters.items():
+        column, match = FILTERS[name]
+        values = adjusted[column].astype(str)
+        if match == 'contains':
+            mask &= values.str.contains(value.strip(), case=False, regex=False)
+        else:
+            mask &= values == value
+    return mask
+
+
+def _row_order(adjusted, sort, filters):
+    """Positions of the rows of ``adjusted`` matching ``filters``, in ``sort`` order."""
+    positions = np.arange(len(adjusted))
+    if filters:
+        positions = positions[_filter_mask(adjusted, filters).to_numpy()]
+    if sort:
+        sort_columns = [key.lstrip('-') for key in sort]
+        ascending = [not key.startswith('-') for key in sort]
+        if KEY_COLUMN not in sort_columns:
+            # The ID breaks ties so pages stay stable between requests
+            sort_columns, ascending = sort_columns + [KEY_COLUMN], ascending + [True]
+        keys = adjusted[sort_columns].iloc[positions].reset_index(drop=True)
+        order = keys.sort_values(sort_columns, ascending=ascending, kind='stable', na_position='last').index
+        positions = positions[order.to_numpy()]
+    return positions
+
+
+def query(adjusted, offset=0, limit=DEFAULT_LIMIT, sort=(), columns=None, filters=None, run_id=None, version=None):
+    """One page of ``adjusted``.
+
+    Returns ``total`` and ``filtered`` row counts, the returned ``columns``
+    (``ID`` first, it identifies a row for edits) and ``rows`` as lists of
+    JSON-ready values in that column order. With ``run_id`` and the
+    ``version`` of the state ``adjusted`` belongs to, the row order is
+    cached in the run cache.
+    """
+    available = display_columns(adjusted)
+    columns = columns or available
+    _check_columns(columns, available)
+    columns = [KEY_COLUMN] + [col for col in columns if col != KEY_COLUMN]
+    _check_columns([key.lstrip('-') for key in sort], available)
+
+    filters = filters or {}
+    if not sort and not filters:
+        positions = None
+    elif run_id is None:
+        positions = _row_order(adjusted, sort, filters)
+    else:
+        artifact = ('grid_rows', tuple(sort), tuple(sorted(filters.items())))
+        positions = run_cache.get(run_id, artifact, version)
+        if positions is None:
+            positions = run_cache.put(run_id, artifact, version, _row_order(adjusted, sort, filters))
+
+    if positions is None:
+        filtered = len(adjusted)
+        page = adjusted.iloc[offset:offset + limit]
+    else:
+        filtered = len(positions)
+        page = adjusted.iloc[positions[offset:offset + limit]]
+    page = page[columns].astype(object)
+    return {
+        'total': len(adjusted),
+        'filtered': filtered,
+        'offset': offset,
+        'limit': limit,
+        'columns': columns,
+        'rows': page.where(page.notna(), None).to_numpy().tolist(),
+    }
+
+
+def facets(adjusted):
+    """Values offered by the project and grade filters."""
+    return {
+        'projects': sorted(adjusted[GROUP_KEY].dropna().astype(str).unique()),
+        'grades': sorted(adjusted['Grade'].dropna().astype(str).unique()),
+    }
@@ -0,0 +1,347 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from . import instrumentation, mission_results, name_matching, reference_data, slr_adjustments, slr_engine, slr_readers
+from .models import SlrRun
+from .parse_cache import ParseCache, file_digest
+from .run_store import RunStore, locked
+
+# Define temporary storage path for SLR runs
+TEMP_FILES_BASE_DIR = Path(settings.MEDIA_ROOT) / 'slr_temp_runs'
+TEMP_FILES_BASE_DIR.mkdir(parents=True, exist_ok=True)
+
+STATUS_FILENAME = 'status.json'
+
+# Re-uploading a workbook already parsed skips its parsing
+parse_cache = ParseCache(
+    getattr(settings, 'SLR_PARSE_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'slr_parse_cache'),
+    getattr(settings, 'SLR_PARSE_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+)
+
+STATUS_QUEUED = SlrRun.STATUS_QUEUED
+STATUS_RUNNING = SlrRun.STATUS_RUNNING
+STATUS_DONE = SlrRun.STATUS_DONE
+STATUS_FAILED = SlrRun.STATUS_FAILED
+
+# (stage, progress % reported when the stage starts)
+STAGES = [
+    ('parse_heures', 5),
+    ('parse_mafe', 20),
+    ('reference_data', 35),
+    ('compute', 45),
+    ('write_tables', 65),
+]
+STAGE_PROGRESS = dict(STAGES)
+# Measured when the report is first downloaded rather than during the run
+ON_DEMAND_STAGES = ('xlsx_write',)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SLR_WORKER_COUNT', 2),
+    thread_name_prefix='slr-run',
+)
+
+# Runs queued or running in this process get their status file touched every
+# HEARTBEAT_SECONDS; a queued or running run whose status file is older than
+# STALE_AFTER_SECONDS belonged to a process that died and is marked failed.
+HEARTBEAT_SECONDS = getattr(settings, 'SLR_HEARTBEAT_SECONDS', 30)
+STALE_AFTER_SECONDS = getattr(settings, 'SLR_STALE_AFTER_SECONDS', 10 * HEARTBEAT_SECONDS)
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+_active_runs = set()
+_active_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+def get_run_dir(run_id):
+    return TEMP_FILES_BASE_DIR / run_id
+
+
+def read_status(run_id):
+    """Return the status dict of a run, or None if the run is unknown."""
+    try:
+        with open(get_run_dir(run_id) / STATUS_FILENAME, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_status(run_id, **fields):
+    """Merge ``fields`` into the run's status file.
+
+    The file is replaced atomically so the status endpoint, which may be
+    served by another gunicorn worker, never sees a half-written file, and
+    the run directory's lock keeps concurrent writers from losing updates.
+    """
+    run_dir = get_run_dir(run_id)
+    with locked(run_dir):
+        status = read_status(run_id) or {'run_id': run_id, 'logs': []}
+        logs = fields.pop('log', None)
+        if logs:
+            status['logs'].append(logs)
+        status.update(fields)
+        status['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        tmp_path = run_dir / f'{STATUS_FILENAME}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, run_dir / STATUS_FILENAME)
+    return status
+
+
+def _track(run_id):
+    """Keep the status of ``run_id`` fresh while this process holds it."""
+    global _heartbeat_thread
+    with _active_lock:
+        _active_runs.add(run_id)
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat, name='slr-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+
+
+def _untrack(run_id):
+    with _active_lock:
+        _active_runs.discard(run_id)
+
+
+def _heartbeat():
+    global _heartbeat_thread
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        with _active_lock:
+            if not _active_runs:
+                _heartbeat_thread = None
+                return
+            run_ids = list(_active_runs)
+        for run_id in run_ids:
+            try:
+                # Only refreshes updated_at
+                write_status(run_id)
+            except OSError:
+                # Run directory removed
+                _untrack(run_id)
+
+
+def fail_stale_runs(run_ids=None):
+    """Mark queued or running runs without a recent heartbeat as failed, in status.json and SlrRun.
+
+    Limited to ``run_ids`` when given; returns the number of runs marked.
+    """
+    runs = SlrRun.objects.filter(status__in=ACTIVE_STATUSES)
+    if run_ids is not None:
+        runs = runs.filter(run_id__in=run_ids)
+    cutoff = datetime.now() - timedelta(seconds=STALE_AFTER_SECONDS)
+    marked = 0
+    for run_id in runs.values_list('run_id', flat=True):
+        status = read_status(run_id)
+        if status is not None:
+            if status.get('status') not in ACTIVE_STATUSES:
+                continue
+            if datetime.fromisoformat(status['updated_at']) >= cutoff:
+                continue
+        error = f"Interrupted: no heartbeat for more than {STALE_AFTER_SECONDS}s"
+        if status is not None:
+            write_status(
+                run_id,
+                status=STATUS_FAILED,
+                error=error,
+                finished_at=datetime.now().isoformat(timespec='seconds'),
+                log=f"ERROR: {error}",
+            )
+        record_run(run_id, status=STATUS_FAILED, error=error, finished_at=timezone.now())
+        marked += 1
+    return marked
+
+
+def _enter_stage(run_id, stage, recorder=None, log=None):
+    """Report ``stage`` in the status file; with a recorder, also start measuring it."""
+    metrics = recorder.start(stage) if recorder is not None else None
+    write_status(run_id, stage=stage, progress=STAGE_PROGRESS[stage], log=log or f"INFO: Stage '{stage}' started")
+    return metrics
+
+
+def new_recorder():
+    """Stage recorder of a run; ``SLR_TRACE_MEMORY`` adds tracemalloc figures."""
+    return instrumentation.StageRecorder(trace_memory=getattr(settings, 'SLR_TRACE_MEMORY', False))
+
+
+def record_stage_metrics(run_id, metrics):
+    """Merge ``metrics`` measured after the run (see ON_DEMAND_STAGES) into its status and SlrRun."""
+    status = read_status(run_id)
+    if status is None:
+        return
+    write_status(run_id, stage_metrics={**status.get('stage_metrics', {}), **metrics})
+    try:
+        run = SlrRun.objects.filter(run_id=run_id).first()
+        if run is not None:
+            run.stage_metrics = {**run.stage_metrics, **metrics}
+            run.save(update_fields=['stage_metrics'])
+    except DatabaseError as e:
+        write_status(run_id, log=f"WARNING: Run registry not updated: {e}")
+
+
+def record_run(run_id, **fields):
+    """Update the run's SlrRun row; the status file stays the source of truth while it runs."""
+    try:
+        SlrRun.objects.filter(run_id=run_id).update(**fields)
+    except DatabaseError as e:
+        write_status(run_id, log=f"WARNING: Run registry not updated: {e}")
+
+
+def queue_run(run_id, heures_filename, owner=None):
+    """Record a new run as queued."""
+    write_status(
+        run_id,
+        status=STATUS_QUEUED,
+        stage='queued',
+        progress=0,
+        heures_filename=heures_filename,
+        created_at=datetime.now().isoformat(timespec='seconds'),
+        log=f"INFO: Run {run_id} queued",
+    )
+    SlrRun.objects.create(
+        run_id=run_id,
+        owner=owner if owner is not None and owner.is_authenticated else None,
+        period=slr_engine.period_start(heures_filename),
+        heures_filename=heures_filename,
+    )
+
+
+def submit_run(run_id, heures_path, mafe_path, heures_filename, owner=None):
+    """Queue an SLR run on the local worker pool and return immediately."""
+    queue_run(run_id, heures_filename, owner)
+    _track(run_id)
+    return _executor.submit(execute_run, run_id, Path(heures_path), Path(mafe_path), heures_filename)
+
+
+def execute_run(run_id, heures_path, mafe_path, heures_filename, reference_version=None):
+    """Parse both workbooks, run the SLR engine and persist every artifact of the run.
+
+    ``reference_version`` pins the reference data snapshot (several runs of a
+    batch share one); by default the current snapshot is used.
+    """
+    run_dir = get_run_dir(run_id)
+    recorder = new_recorder()
+    _track(run_id)
+    try:
+        write_status(run_id, status=STATUS_RUNNING, started_at=datetime.now().isoformat(timespec='seconds'))
+        # Hashed once here; the parse cache is keyed by the same digests
+        heures_sha256, mafe_sha256 = file_digest(heures_path), file_digest(mafe_path)
+        record_run(run_id, status=STATUS_RUNNING, heures_sha256=heures_sha256, mafe_sha256=mafe_sha256)
+
+        metrics = _enter_stage(run_id, 'parse_heures', recorder)
+        base_df = parse_cache.read(slr_readers.read_heures, heures_path, digest=heures_sha256)
+        metrics['rows'] = len(base_df)
+        write_status(run_id, log=f"INFO: Heures IBM file parsed. base_df shape: {base_df.shape}")
+
+        metrics = _enter_stage(run_id, 'parse_mafe', recorder)
+        # Month and year drive the MAFE forecast column
+        mois, annee = slr_engine.parse_period(heures_filename)
+        mafe_df, forecast_col_cleaned = parse_cache.read(slr_readers.read_mafe, mafe_path, mois, annee, digest=mafe_sha256)
+        metrics['rows'] = len(mafe_df)
+        write_status(run_id, period=f"{mois} {annee}".strip(), log=f"INFO: MAFE report file parsed for {mois} {annee}. mafe_df shape: {mafe_df.shape}")
+
+        metrics = _enter_stage(run_id, 'reference_data', recorder)
+        # Codes, consultant rates and Belgian names from the current reference snapshot
+        reference = reference_data.load_snapshot(reference_version)
+        codes_df = reference.codes
+        consultants_df = reference.consultants[['Nom', 'Rate', 'Rate DES', 'Grade']]
+        belgian_names_df = reference.belgian_names
+        write_status(run_id, reference_version=reference.version, log=f"INFO: Using reference data snapshot v{reference.version}")
+
+        mafe_subset = slr_engine.prepare_mafe_subset(mafe_df, forecast_col_cleaned, belgian_names_df)
+        metrics['rows'] = len(mafe_subset)
+        recorder.stop()
+
+        # The engine reports its own steps (merge_codes ... adjustment)
+        _enter_stage(run_id, 'compute')
+        tables = slr_engine.compute_slr(base_df, codes_df, consultants_df, mafe_subset, stage=recorder.stage)
+        unmatched = tables['unmatched']
+        if not unmatched.empty:
+            with recorder.stage('match_names') as metrics:
+                tables['unmatched'] = name_matching.suggest_matches(unmatched, reference.name_index)
+                metrics['rows'] = len(unmatched)
+            write_status(run_id, log=f"WARNING: {len(unmatched)} consultant name(s) have no matching Resource and no rate")
+
+        metrics = _enter_stage(run_id, 'write_tables', recorder)
+        archived = {
+            'base_df': tables['base'],
+            'consultants_df': tables['consultants'],
+            'mafe_df': mafe_df.astype(str),
+            'codes_df': codes_df,
+            'employee_summary_initial': tables['employee_summary'],
+            'global_summary_initial': tables['global_summary'],
+            'adjusted_initial': tables['adjusted'],
+            'result_initial': tables['result'],
+            'unmatched_names': tables['unmatched'],
+        }
+        RunStore(run_dir).write(archived)
+        metrics['rows'] = sum(len(df) for df in archived.values())
+        slr_adjustments.write_kpi_snapshot(run_dir, tables['result'], tables['employee_summary'])
+        write_status(run_id, log=f"INFO: All DataFrames for run_id {run_id} saved to the run archive.")
+        try:
+            with recorder.stage('write_back') as metrics:
+                updated = mission_results.write_back(tables['result'], f"{mois} {annee}".strip())
+                metrics['rows'] = updated
+            write_status(run_id, log=f"INFO: Calculated totals stored on {updated} mission(s)")
+        except DatabaseError as e:
+            # The run itself is complete; only the tracking page misses this month
+            write_status(run_id, log=f"WARNING: Mission totals not stored: {e}")
+
+        recorder.stop()
+
+        # The xlsx itself is built on first download, see slr_adjustments.get_report
+        initial_excel_filename = f"Initial_SLR_Report_{run_id[:8]}.xlsx"
+
+        now_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+        write_status(
+            run_id,
+            status=STATUS_DONE,
+            stage=STATUS_DONE,
+            progress=100,
+            initial_excel_filename=initial_excel_filename,
+            unmatched_count=len(tables['unmatched']),
+            stage_metrics=recorder.metrics,
+            original_filename=f"SLR_Facturation_{now_str}.xlsx",
+            finished_at=datetime.now().isoformat(timespec='seconds'),
+            log=f"INFO: Initial report available as {initial_excel_filename}",
+        )
+        record_run(
+            run_id,
+            status=STATUS_DONE,
+            reference_version=reference.version,
+            row_counts={
+                'base': len(tables['base']),
+                'mafe': len(mafe_df),
+                'employee_summary': len(tables['employee_summary']),
+                'adjusted': len(tables['adjusted']),
+                'result': len(tables['result']),
+                'unmatched': len(tables['unmatched']),
+            },
+            stage_metrics=recorder.metrics,
+            finished_at=timezone.now(),
+        )
+    except Exception as e:
+        recorder.stop()
+        write_status(
+            run_id,
+            status=STATUS_FAILED,
+            stage_metrics=recorder.metrics,
+            error=str(e),
+            finished_at=datetime.now().isoformat(timespec='seconds'),
+            log=f"ERROR: Exception during calculation: {str(e)}\n{traceback.format_exc()}",
+        )
+        record_run(run_id, status=STATUS_FAILED, error=str(e), stage_metrics=recorder.metrics, finished_at=timezone.now())
+    finally:
+        _untrack(run_id)
+        close_old_connections()
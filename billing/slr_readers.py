@@ -0,0 +1,135 @@
+import openpyxl
+import pandas as pd
+
+from .slr_engine import BASE_COLUMNS, MAFE_HEADER_ROW, clean_header, find_forecast_column
+
+# Streaming workbook readers for the SLR inputs. They walk the sheets in
+# openpyxl read-only mode so only the requested columns are ever materialised.
+
+HEURES_SHEET = 'base'
+# Columns E, H, I, M and N of the "base" sheet, in BASE_COLUMNS order
+HEURES_COLUMN_INDEXES = [4, 7, 8, 12, 13]
+MAFE_SHEET = '(Tab A) FULLY COMMITTED'
+MAFE_KEY_COLUMNS = ['Country', 'Customer Name']
+CHUNK_SIZE = 50000
+
+
+def _open_workbook(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+
+def _heures_columns(columns):
+    """Turn one chunk of raw cell values into typed columns."""
+    code, nom, grade, date, heures = columns
+    return {
+        'Code projet': pd.Series(code, dtype=object),
+        'Nom': pd.Series(nom, dtype=object),
+        'Grade': pd.Series(grade, dtype=object),
+        'Date': pd.Series(date, dtype=object).infer_objects(),
+        'Heures': pd.to_numeric(pd.Series(heures, dtype=object), errors='coerce').astype('float64'),
+    }
+
+
+def _concat_columns(chunks):
+    """One DataFrame from chunks given as ``{column: Series}`` dicts, built a column at a time.
+
+    Each column is dropped from the chunks once it is concatenated, so the
+    rows are held twice for one column at most instead of for the whole table.
+    """
+    columns = {}
+    for col in list(chunks[0]):
+        columns[col] = pd.concat([chunk.pop(col) for chunk in chunks], ignore_index=True)
+    return pd.DataFrame(columns, copy=False)
+
+
+def _iter_heures_columns(source, chunk_size):
+    wb = _open_workbook(source)
+    try:
+        ws = wb[HEURES_SHEET]
+        first_col = HEURES_COLUMN_INDEXES[0]
+        offsets = [i - first_col for i in HEURES_COLUMN_INDEXES]
+        rows = ws.iter_rows(
+            min_row=2,
+            min_col=first_col + 1,
+            max_col=HEURES_COLUMN_INDEXES[-1] + 1,
+            values_only=True,
+        )
+        columns = [[] for _ in offsets]
+        for row in rows:
+            values = [row[o] if o < len(row) else None for o in offsets]
+            if all(v is None for v in values):
+                continue
+            for column, value in zip(columns, values):
+                column.append(value)
+            if len(columns[0]) >= chunk_size:
+                yield _heures_columns(columns)
+                columns = [[] for _ in offsets]
+        if columns[0]:
+            yield _heures_columns(columns)
+    finally:
+        wb.close()
+
+
+def iter_heures_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield the Heures IBM "base" rows as typed DataFrames of at most ``chunk_size`` rows."""
+    for columns in _iter_heures_columns(source, chunk_size):
+        yield pd.DataFrame(columns, copy=False)
+
+
+def read_heures(source, chunk_size=CHUNK_SIZE):
+    """Read columns E, H, I, M and N of the "base" sheet into a DataFrame with ``BASE_COLUMNS``."""
+    chunks = list(_iter_heures_columns(source, chunk_size))
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype='float64' if col == 'Heures' else object) for col in BASE_COLUMNS})
+    base_df = _concat_columns(chunks)
+    base_df['Date'] = base_df['Date'].infer_objects()
+    return base_df
+
+
+def _non_blank_rows(ws):
+    # pandas skips fully blank rows when counting rows, mirror that
+    for row in ws.iter_rows(values_only=True):
+        if any(v is not None for v in row):
+            yield row
+
+
+def read_mafe(source, mois, annee, chunk_size=CHUNK_SIZE):
+    """Read only Country, Customer Name and the month's forecast column of the MAFE report.
+
+    The header row (``MAFE_HEADER_ROW``) is read first and the forecast column is
+    picked from ``mois``/``annee``; data rows are then streamed keeping those three
+    cells only. Returns ``(mafe_df, forecast_col)``, ``forecast_col`` being None
+    when the report has no forecast for that period.
+    """
+    wb = _open_workbook(source)
+    try:
+        rows = _non_blank_rows(wb[MAFE_SHEET])
+        header = None
+        for index, row in enumerate(rows):
+            if index == MAFE_HEADER_ROW:
+                header = clean_header('nan' if v is None else v for v in row)
+                break
+        if header is None:
+            raise ValueError(f"Sheet '{MAFE_SHEET}' has no header row {MAFE_HEADER_ROW + 1}")
+
+        missing = [col for col in MAFE_KEY_COLUMNS if col not in header]
+        if missing:
+            raise ValueError(f"Missing required columns in sheet '{MAFE_SHEET}': {', '.join(missing)}")
+        forecast_col = find_forecast_column(header, mois, annee)
+        columns = MAFE_KEY_COLUMNS + ([forecast_col] if forecast_col else [])
+        indexes = [header.index(col) for col in columns]
+
+        chunks = []
+        values = [[] for _ in indexes]
+        for row in rows:
+            for column, i in zip(values, indexes):
+                column.append(row[i] if i < len(row) else None)
+            if len(values[0]) >= chunk_size:
+                chunks.append({col: pd.Series(v, dtype=object) for col, v in zip(columns, values)})
+                values = [[] for _ in indexes]
+        chunks.append({col: pd.Series(v, dtype=object) for col, v in zip(columns, values)})
+    finally:
+        wb.close()
+    return _concat_columns(chunks), forecast_col
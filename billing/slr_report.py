@@ -0,0 +1,112 @@
+import math
+import os
+import uuid
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# The SLR xlsx report. Written row by row in xlsxwriter's constant_memory mode
+# straight to its destination, so a sheet is never held in memory as a whole.
+
+# Bump when the layout or formatting changes so cached reports get rebuilt
+REPORT_FORMAT_VERSION = '2'
+
+REPORT_LAYOUT = [
+    ('00_Base', 'base', ['Date', 'Code projet', 'Nom', 'Grade', 'Heures', 'Libelle projet']),
+    ('01_Employee_Summary', 'employee_summary', ['Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Rate DES', 'Total', 'Total DES']),
+    ('02_Global_Summary', 'global_summary', ['Libelle projet', 'Total Heures', 'Total', 'Total DES', 'Estimees']),
+    ('03_Adjusted', 'adjusted', ['ID', 'Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Total', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost']),
+    ('04_Result', 'result', ['Libelle projet', 'Total Heures', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost', 'Estimees', 'Ecart']),
+    ('05_Unmatched_Names', 'unmatched', ['Nom', 'Total Heures', 'Suggestions']),
+]
+
+
+def _column_writer(ws, series, datetime_format):
+    """Return ``(values, write)`` for one column, ``write(row, col, value)`` skipping blanks."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Timestamps are datetimes; NaT stays NaT and is skipped by write()
+        values = series.astype(object).to_numpy()
+
+        def write(row, col, value):
+            if value is not None and not pd.isna(value):
+                ws.write_datetime(row, col, value, datetime_format)
+        return values, write
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+
+        def write(row, col, value):
+            if math.isfinite(value):
+                ws.write_number(row, col, value)
+        return values, write
+
+    values = series.to_numpy(dtype=object)
+
+    def write(row, col, value):
+        if value is None:
+            return
+        if isinstance(value, str):
+            ws.write_string(row, col, value)
+        elif isinstance(value, (bool, np.bool_)):
+            ws.write_boolean(row, col, bool(value))
+        elif isinstance(value, (int, float, np.integer, np.floating)):
+            if math.isfinite(value):
+                ws.write_number(row, col, value)
+        elif isinstance(value, (datetime, date)):
+            if not pd.isna(value):
+                ws.write_datetime(row, col, value, datetime_format)
+        elif not pd.isna(value):
+            ws.write_string(row, col, str(value))
+    return values, write
+
+
+def _write_sheet(workbook, sheet, df, columns, formats):
+    ws = workbook.add_worksheet(sheet)
+    columns = [col for col in columns if col in df.columns]
+    for i, col in enumerate(columns):
+        width = max(15, len(str(col)) + 2)
+        ws.set_column(i, i, width, formats['int'] if pd.api.types.is_integer_dtype(df[col]) else None)
+
+    # constant_memory forbids add_table(): header style, filter and frozen header instead
+    for i, col in enumerate(columns):
+        ws.write_string(0, i, str(col), formats['header'])
+    ws.freeze_panes(1, 0)
+    if columns:
+        ws.autofilter(0, 0, max(len(df), 1), len(columns) - 1)
+
+    writers = [_column_writer(ws, df[col], formats['datetime']) for col in columns]
+    writes = [w for _, w in writers]
+    for row, values in enumerate(zip(*(v for v, _ in writers)), start=1):
+        for col, (write, value) in enumerate(zip(writes, values)):
+            write(row, col, value)
+
+
+def write_report(path, tables):
+    """Write the SLR report for ``tables`` (keys of ``REPORT_LAYOUT``) to ``path``.
+
+    The workbook is streamed to a temporary file next to ``path`` and moved into
+    place once complete, so a concurrent download never sees a partial file.
+    """
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    workbook = xlsxwriter.Workbook(tmp_path, {'constant_memory': True})
+    try:
+        try:
+            formats = {
+                'header': workbook.add_format({'bold': True, 'bg_color': '#D9D2E9'}),
+                'int': workbook.add_format({'num_format': '0'}),
+                'datetime': workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'}),
+            }
+            for sheet, key, columns in REPORT_LAYOUT:
+                # Optional sheets (unmatched names) are left out when absent
+                if key in tables:
+                    _write_sheet(workbook, sheet, tables[key], columns, formats)
+        finally:
+            workbook.close()
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
@@ -0,0 +1,163 @@
+import calendar
+from datetime import datetime
+
+import numpy as np
+import xlsxwriter
+
+from .slr_engine import MAFE_HEADER_ROW, MONTHS
+from .slr_readers import HEURES_COLUMN_INDEXES, HEURES_SHEET, MAFE_KEY_COLUMNS, MAFE_SHEET
+
+# Synthetic SLR inputs for benchmarking: an Heures IBM "base" sheet of any
+# number of rows, the matching MAFE report and the Mission/Resource rows
+# they refer to. Everything is drawn from a seeded generator, so a size and
+# a seed always give the same workbooks.
+#
+# The proportions follow a real month: about 100 hour rows per consultant,
+# three OTP codes per project, a few consultants missing from Resources,
+# names typed with other casing/spacing in the hours file, codes without a
+# Mission and MAFE customers without a project.
+
+ROWS_PER_CONSULTANT = 100
+ROWS_PER_PROJECT = 1000
+CODES_PER_PROJECT = 3
+PROJECTS_PER_CONSULTANT = 3
+UNMATCHED_SHARE = 0.01
+UNKNOWN_CODE_SHARE = 0.002
+HOURS = [1.0, 2.0, 3.5, 4.0, 7.5, 8.0]
+GRADES = ['FR_JSA', 'FR_STF', 'FR_SRS', 'FR_MGR', 'FR_SMGR', 'FR_NEP', 'FR_STG']
+GRADES_DES = ['DES_CJ', 'DES_C1', 'DES_C2', 'DES_SC1', 'DES_SC2', 'DES_M1', 'DES_STG']
+RATES = [45.0, 60.0, 75.0, 95.0, 120.0, 160.0, 25.0]
+SYLLABLES = ['ma', 'ri', 'lo', 'ben', 'sa', 'ra', 'kha', 'li', 'dou', 'mi', 'ne', 'tou', 'za', 'ya', 'fa', 'rou']
+MAFE_FILLER_COLUMNS = 40
+
+
+class Workload:
+    """Generated reference data plus the writers of both input workbooks."""
+
+    def __init__(self, rows, mois='May', annee='25', seed=0):
+        self.rows = rows
+        self.mois = mois
+        self.annee = annee[-2:]
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        n_consultants = max(20, rows // ROWS_PER_CONSULTANT)
+        n_projects = max(10, rows // ROWS_PER_PROJECT)
+        self.projects = [f'Projet {i:05d}' for i in range(n_projects)]
+        self.customers = [f'Customer {i:05d}' for i in range(n_projects)]
+        self.codes = [f'OTP{p:05d}-{c}' for p in range(n_projects) for c in range(CODES_PER_PROJECT)]
+        self.names = _unique_names(rng, n_consultants)
+        self.grades = rng.integers(0, len(GRADES), n_consultants)
+        self.matched = np.ones(n_consultants, dtype=bool)
+        self.matched[rng.choice(n_consultants, max(1, round(n_consultants * UNMATCHED_SHARE)), replace=False)] = False
+
+    @property
+    def filename(self):
+        """Heures IBM filename carrying the period, as uploaded."""
+        return f'Heures IBM {self.mois} {self.annee}.xlsx'
+
+    @property
+    def forecast_column(self):
+        return f'{self.mois} Forecasts\n{self.annee}'
+
+    def missions(self):
+        """Mission field dicts, one per OTP code; the first project is 'Code France'."""
+        missions = []
+        for i, code in enumerate(self.codes):
+            project = i // CODES_PER_PROJECT
+            missions.append({
+                'otp_l2': code,
+                'belgian_name': self.customers[project],
+                'libelle_de_projet': None if project == 0 else self.projects[project],
+                'code_type': 'DES' if project % 7 == 3 else 'FR',
+            })
+        return missions
+
+    def resources(self):
+        """Resource field dicts of the consultants present in Resources."""
+        return [
+            {
+                'full_name': name,
+                'matricule': f'BM{i:07d}',
+                'grade': GRADES[grade],
+                'grade_des': GRADES_DES[grade],
+                'rate_ibm': RATES[grade],
+                'rate_des': round(RATES[grade] * 0.8, 2),
+            }
+            for i, (name, grade, matched) in enumerate(zip(self.names, self.grades, self.matched))
+            if matched
+        ]
+
+    def write_heures(self, path):
+        """Heures IBM workbook: a "base" sheet with the five read columns among filler ones."""
+        rng = np.random.default_rng([self.seed, 1])
+        n = self.rows
+        consultant = rng.integers(0, len(self.names), n)
+        # Each consultant books on a few projects of their own
+        home = consultant * PROJECTS_PER_CONSULTANT
+        code = (home + rng.integers(0, PROJECTS_PER_CONSULTANT, n)) * 7 % len(self.codes)
+        unknown = rng.random(n) < UNKNOWN_CODE_SHARE
+        year = 2000 + int(self.annee)
+        month = MONTHS.index(self.mois) + 1
+        days = [datetime(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1) if calendar.weekday(year, month, d) < 5]
+        day = rng.integers(0, len(days), n)
+        hours = rng.integers(0, len(HOURS), n)
+        # Some rows spell the name differently; normalize_name must join them
+        variant = rng.random(n) < 0.05
+
+        width = HEURES_COLUMN_INDEXES[-1] + 2
+        code_col, nom_col, grade_col, date_col, hours_col = HEURES_COLUMN_INDEXES
+        workbook = xlsxwriter.Workbook(str(path), {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy'})
+        try:
+            sheet = workbook.add_worksheet(HEURES_SHEET)
+            sheet.write_row(0, 0, [f'Colonne {i + 1}' for i in range(width)])
+            for i in range(n):
+                row = [None] * width
+                row[0] = 'IBM France'
+                row[code_col] = f'UNKNOWN-{code[i] % 50}' if unknown[i] else self.codes[code[i]]
+                name = self.names[consultant[i]]
+                row[nom_col] = f' {name.upper()} ' if variant[i] else name
+                row[grade_col] = GRADES[self.grades[consultant[i]]]
+                row[date_col] = days[day[i]]
+                row[hours_col] = HOURS[hours[i]]
+                sheet.write_row(i + 1, 0, row)
+        finally:
+            workbook.close()
+
+    def write_mafe(self, path):
+        """MAFE report: title rows (some blank), the header on the 15th non-blank row, one line per customer."""
+        rng = np.random.default_rng([self.seed, 2])
+        months = [f'{m} Forecasts\n{self.annee}' for m in MONTHS]
+        header = MAFE_KEY_COLUMNS + [f'Info {j}' for j in range(MAFE_FILLER_COLUMNS)] + months
+        forecast = months.index(self.forecast_column)
+        # A tenth of the customers have no Mission and keep their own name as project
+        customers = self.customers + [f'Prospect {i:05d}' for i in range(max(1, len(self.customers) // 10))]
+
+        workbook = xlsxwriter.Workbook(str(path), {'constant_memory': True})
+        try:
+            sheet = workbook.add_worksheet(MAFE_SHEET)
+            row_index = 0
+            for i in range(MAFE_HEADER_ROW):
+                sheet.write(row_index, 0, f'(Tab A) FULLY COMMITTED - ligne de titre {i + 1}')
+                # Blank rows do not count towards the header row, see slr_readers.read_mafe
+                row_index += 2 if i % 4 == 3 else 1
+            sheet.write_row(row_index, 0, header)
+            for customer in customers:
+                row_index += 1
+                values = ['France', customer] + [f'x{j}' for j in range(MAFE_FILLER_COLUMNS)]
+                amounts = [float(rng.integers(1000, 80000)) for _ in months]
+                # Reports show an empty forecast as a dash
+                if rng.random() < 0.05:
+                    amounts[forecast] = '-'
+                sheet.write_row(row_index, 0, values + amounts)
+        finally:
+            workbook.close()
+
+
+def _unique_names(rng, count):
+    names = set()
+    while len(names) < count:
+        first = ''.join(rng.choice(SYLLABLES, rng.integers(2, 4))).capitalize()
+        last = ''.join(rng.choice(SYLLABLES, rng.integers(2, 5))).upper()
+        names.add(f'{last} {first}')
+    return sorted(names)
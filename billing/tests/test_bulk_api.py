@@ -0,0 +1,122 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from billing.models import Mission, Resource
+
+
+class BulkOperationsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('bulk', password='secret')
+        cls.alpha = Mission.objects.create(otp_l2='OTP-ALPHA', belgian_name='Client Alpha', libelle_de_projet='Alpha')
+        cls.beta = Mission.objects.create(otp_l2='OTP-BETA', belgian_name='Client Beta', libelle_de_projet='Beta')
+        cls.resource = Resource.objects.create(full_name='Durand Léa', matricule='M001', rate_ibm=Decimal('75'), rate_des=Decimal('60'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, operations, atomic=True, client=None):
+        return (client or self.client).post(
+            reverse('bulk_operations'),
+            json.dumps({'atomic': atomic, 'operations': operations}),
+            content_type='application/json',
+        )
+
+    def test_natural_key_lookups(self):
+        response = self.post([
+            {'op': 'update', 'model': 'mission', 'key': 'OTP-ALPHA', 'data': {'libelle_de_projet': 'Alpha 2'}},
+            {'op': 'update', 'model': 'resource', 'key': 'M001', 'data': {'full_name': ' DURAND Léa ', 'rate_ibm': '80.00'}},
+            {'op': 'delete', 'model': 'mission', 'key': 'OTP-BETA'},
+            {'op': 'create', 'model': 'mission', 'data': {'otp_l2': 'OTP-GAMMA', 'belgian_name': 'Client Gamma', 'code_type': 'FR'}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body['success'])
+        self.assertEqual([r['status'] for r in body['results']], ['updated', 'updated', 'deleted', 'created'])
+
+        self.alpha.refresh_from_db()
+        self.assertEqual(self.alpha.libelle_de_projet, 'Alpha 2')
+        # Partial update: fields not sent are kept
+        self.assertEqual(self.alpha.belgian_name, 'Client Alpha')
+        self.resource.refresh_from_db()
+        self.assertEqual(self.resource.rate_ibm, Decimal('80.00'))
+        self.assertEqual(self.resource.normalized_name, 'durand léa')
+        self.assertFalse(Mission.objects.filter(otp_l2='OTP-BETA').exists())
+        self.assertTrue(Mission.objects.filter(otp_l2='OTP-GAMMA').exists())
+
+    def test_atomic_batch_is_rolled_back_on_any_error(self):
+        response = self.post([
+            {'op': 'update', 'model': 'mission', 'key': 'OTP-ALPHA', 'data': {'libelle_de_projet': 'Changed'}},
+            {'op': 'delete', 'model': 'mission', 'key': 'OTP-BETA'},
+            {'op': 'update', 'model': 'mission', 'key': 'OTP-MISSING', 'data': {'libelle_de_projet': 'x'}},
+            {'op': 'create', 'model': 'mission', 'data': {'otp_l2': 'OTP-ALPHA', 'belgian_name': 'Duplicate'}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        statuses = [r['status'] for r in response.json()['results']]
+        self.assertEqual(statuses, ['skipped', 'skipped', 'not_found', 'invalid'])
+        self.alpha.refresh_from_db()
+        self.assertEqual(self.alpha.libelle_de_projet, 'Alpha')
+        self.assertEqual(Mission.objects.count(), 2)
+
+    def test_non_atomic_batch_applies_the_valid_operations(self):
+        response = self.post([
+            {'op': 'update', 'model': 'mission', 'key': 'OTP-ALPHA', 'data': {'libelle_de_projet': 'Changed'}},
+            {'op': 'update', 'model': 'mission', 'key': 'OTP-BETA', 'data': {'code_type': 'XX'}},
+        ], atomic=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['updated', 'invalid'])
+        self.alpha.refresh_from_db()
+        self.assertEqual(self.alpha.libelle_de_projet, 'Changed')
+
+    def test_deleted_key_can_be_reused_in_the_same_batch(self):
+        response = self.post([
+            {'op': 'delete', 'model': 'mission', 'key': 'OTP-BETA'},
+            {'op': 'create', 'model': 'mission', 'data': {'otp_l2': 'OTP-BETA', 'belgian_name': 'Client Beta 2', 'code_type': 'DES'}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Mission.objects.get(otp_l2='OTP-BETA').belgian_name, 'Client Beta 2')
+
+    def test_duplicate_keys_within_the_batch(self):
+        response = self.post([
+            {'op': 'create', 'model': 'resource', 'data': {'full_name': 'A', 'matricule': 'M900', 'grade': 'FR_STF', 'grade_des': 'DES_STG', 'rate_ibm': '1', 'rate_des': '1'}},
+            {'op': 'create', 'model': 'resource', 'data': {'full_name': 'B', 'matricule': 'M900', 'grade': 'FR_STF', 'grade_des': 'DES_STG', 'rate_ibm': '1', 'rate_des': '1'}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'][1]['status'], 'invalid')
+        self.assertFalse(Resource.objects.filter(matricule='M900').exists())
+
+    def test_malformed_payload(self):
+        response = self.client.post(reverse('bulk_operations'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('bulk_operations'), json.dumps({'operations': 'x'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.post([{'op': 'delete', 'model': 'mission', 'key': 'OTP-BETA'}])
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+        self.assertTrue(Mission.objects.filter(otp_l2='OTP-BETA').exists())
+
+    def test_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        operation = [{'op': 'delete', 'model': 'mission', 'key': 'OTP-BETA'}]
+        self.assertEqual(self.post(operation, client=client).status_code, 403)
+        self.assertTrue(Mission.objects.filter(otp_l2='OTP-BETA').exists())
+
+        # The documented way: the csrftoken cookie sent back in X-CSRFToken
+        client.get(reverse('mission_list'))
+        response = client.post(
+            reverse('bulk_operations'),
+            json.dumps({'operations': operation}),
+            content_type='application/json',
+            HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Mission.objects.filter(otp_l2='OTP-BETA').exists())
@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.test import RequestFactory, SimpleTestCase
+
+from billing.downloads import serve_file
+
+
+class ServeFileTests(SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp(prefix='slr-download-'))
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = directory / 'report.xlsx'
+        self.path.write_bytes(self.content)
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        response = serve_file(self.factory.get('/report', **headers), self.path, 'SLR.xlsx', etag='abc123')
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_full_download(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"abc123"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('SLR.xlsx', response['Content-Disposition'])
+        self.assertEqual(self.body(response), self.content)
+
+    def test_if_none_match(self):
+        response = self.serve(HTTP_IF_NONE_MATCH='"abc123"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_single_range(self):
+        response = self.serve(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self.body(response), self.content[100:200])
+
+    def test_open_and_suffix_ranges(self):
+        size = len(self.content)
+        response = self.serve(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response['Content-Range'], f'bytes 1000-{size - 1}/{size}')
+        self.assertEqual(self.body(response), self.content[1000:])
+        response = self.serve(HTTP_RANGE='bytes=-10')
+        self.assertEqual(response['Content-Range'], f'bytes {size - 10}-{size - 1}/{size}')
+        self.assertEqual(self.body(response), self.content[-10:])
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_range_of_a_changed_file_sends_it_all(self):
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"older"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"abc123"').status_code, 206)
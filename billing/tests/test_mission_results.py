@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+import pandas as pd
+from django.test import TestCase
+
+from billing.mission_results import period_key, write_back
+from billing.models import Mission
+
+
+def result(*projects):
+    """Result rows of ``(project, adjusted hours, estimees)``, two per project: only the first counts."""
+    rows = [
+        {'Libelle projet': project, 'Nom': name, 'Adjusted Hours': hours, 'Estimees': estimee}
+        for project, hours, estimee in projects
+        for name in ('A', 'B')
+    ]
+    return pd.DataFrame(rows)
+
+
+class WriteBackTests(TestCase):
+
+    def setUp(self):
+        Mission.objects.create(otp_l2='FR-1', belgian_name='Client France', libelle_de_projet=None)
+        Mission.objects.create(otp_l2='FR-2', belgian_name='Client France', libelle_de_projet='')
+        Mission.objects.create(otp_l2='AL-1', belgian_name='Client Alpha', libelle_de_projet='Alpha')
+        Mission.objects.create(otp_l2='AL-2', belgian_name='Client Alpha', libelle_de_projet='Alpha')
+        Mission.objects.create(otp_l2='BE-1', belgian_name='Client Beta', libelle_de_projet='Beta')
+        Mission.objects.create(otp_l2='GA-1', belgian_name='Client Gamma', libelle_de_projet='Gamma')
+
+    def values(self, otp):
+        mission = Mission.objects.get(otp_l2=otp)
+        return mission.calculated_total_heures, mission.calculated_estimee, mission.calculation_period
+
+    def test_period_key(self):
+        self.assertEqual(period_key('May 25'), period_key('Heures IBM May 2025'))
+        self.assertLess(period_key('Dec 24'), period_key('Jan 25'))
+        self.assertIsNone(period_key(None))
+        self.assertIsNone(period_key('no period'))
+
+    def test_totals_go_to_every_mission_of_the_project(self):
+        updated = write_back(result(('Alpha', 12.344, 1000), ('Code France', 8, 500.5)), 'May 25')
+        self.assertEqual(updated, 4)
+        self.assertEqual(self.values('AL-1'), (Decimal('12.34'), Decimal('1000.00'), 'May 25'))
+        self.assertEqual(self.values('AL-2'), self.values('AL-1'))
+        # Blank and null libelle both mean 'Code France'
+        self.assertEqual(self.values('FR-1'), (Decimal('8.00'), Decimal('500.50'), 'May 25'))
+        self.assertEqual(self.values('FR-2'), self.values('FR-1'))
+        self.assertEqual(self.values('BE-1'), (None, None, None))
+
+    def test_nan_is_stored_as_null(self):
+        write_back(result(('Alpha', float('nan'), 1000)), 'May 25')
+        self.assertEqual(self.values('AL-1'), (None, Decimal('1000.00'), 'May 25'))
+
+    def test_later_period_is_not_overwritten(self):
+        write_back(result(('Alpha', 10, 100)), 'Jun 25')
+        self.assertEqual(write_back(result(('Alpha', 5, 50), ('Beta', 3, 30)), 'May 25'), 1)
+        self.assertEqual(self.values('AL-1'), (Decimal('10.00'), Decimal('100.00'), 'Jun 25'))
+        self.assertEqual(self.values('BE-1'), (Decimal('3.00'), Decimal('30.00'), 'May 25'))
+
+    def test_same_period_clears_projects_no_longer_in_the_result(self):
+        write_back(result(('Alpha', 10, 100), ('Beta', 3, 30)), 'May 25')
+        write_back(result(('Gamma', 1, 10)), 'Apr 25')
+        write_back(result(('Alpha', 11, 110)), 'May 25')
+        self.assertEqual(self.values('AL-1'), (Decimal('11.00'), Decimal('110.00'), 'May 25'))
+        self.assertEqual(self.values('BE-1'), (None, None, None))
+        # An earlier period's results are not this run's to clear
+        self.assertEqual(self.values('GA-1'), (Decimal('1.00'), Decimal('10.00'), 'Apr 25'))
+
+    def test_equivalent_labels_are_the_same_period(self):
+        write_back(result(('Alpha', 10, 100), ('Beta', 3, 30)), 'May 2025')
+        self.assertEqual(write_back(result(('Alpha', 9, 90)), 'May 25'), 3)
+        self.assertEqual(self.values('AL-1'), (Decimal('9.00'), Decimal('90.00'), 'May 25'))
+        self.assertEqual(self.values('BE-1'), (None, None, None))
+
+    def test_unchanged_missions_are_not_written(self):
+        write_back(result(('Alpha', 10, 100)), 'May 25')
+        self.assertEqual(write_back(result(('Alpha', 10, 100)), 'May 25'), 0)
+
+    def test_without_clear_only_the_given_projects_change(self):
+        write_back(result(('Alpha', 10, 100), ('Beta', 3, 30)), 'May 25')
+        self.assertEqual(write_back(result(('Alpha', 11, 110)), 'May 25', clear=False), 2)
+        self.assertEqual(self.values('AL-1'), (Decimal('11.00'), Decimal('110.00'), 'May 25'))
+        self.assertEqual(self.values('BE-1'), (Decimal('3.00'), Decimal('30.00'), 'May 25'))
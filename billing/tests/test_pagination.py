@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from billing.models import Mission, Resource
+from billing.pagination import decode_cursor, encode_cursor, keyset_paginate
+from billing.search import search_missions
+
+
+def walk_forward(queryset, keys, page_size):
+    pages, after = [], None
+    while True:
+        page = keyset_paginate(queryset, keys=keys, fields=['pk'], after=after, page_size=page_size)
+        pages.append([row['pk'] for row in page])
+        if not page.has_next:
+            return pages, page
+        after = page.next_cursor
+
+
+class KeysetPaginateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate names: the pk breaks the ties
+        names = ['Martin', 'Bernard', 'Dubois', 'Martin', 'Petit', 'Bernard', 'Leroy', 'Martin']
+        for i, name in enumerate(names):
+            Resource.objects.create(full_name=name, matricule=f'M{i:03d}', rate_ibm=Decimal('100'), rate_des=Decimal('80'))
+        cls.ordered = list(Resource.objects.order_by('full_name', 'pk').values_list('pk', flat=True))
+
+    def test_forward_pages_cover_every_row_once(self):
+        pages, last = walk_forward(Resource.objects.all(), ['full_name', 'pk'], 3)
+        self.assertEqual([len(p) for p in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), self.ordered)
+        self.assertTrue(last.has_previous)
+        self.assertIsNone(last.next_cursor)
+
+    def test_first_page(self):
+        page = keyset_paginate(Resource.objects.all(), keys=['full_name', 'pk'], fields=['pk'], page_size=3)
+        self.assertFalse(page.has_previous)
+        self.assertIsNone(page.previous_cursor)
+        self.assertTrue(page.has_next)
+
+    def test_backward_pages_mirror_forward_pages(self):
+        pages, page = walk_forward(Resource.objects.all(), ['full_name', 'pk'], 3)
+        backward = [[row['pk'] for row in page]]
+        while page.has_previous:
+            page = keyset_paginate(Resource.objects.all(), keys=['full_name', 'pk'], fields=['pk'], before=page.previous_cursor, page_size=3)
+            backward.append([row['pk'] for row in page])
+        # Walking back from the end realigns on the cursor, so pages may split differently
+        self.assertEqual(sum(backward[::-1], []), self.ordered)
+        self.assertFalse(page.has_previous)
+        self.assertTrue(page.has_next)
+
+    def test_descending_keys(self):
+        pages, _ = walk_forward(Resource.objects.all(), ['-full_name', '-pk'], 3)
+        expected = list(Resource.objects.order_by('-full_name', '-pk').values_list('pk', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_malformed_cursor_restarts_from_the_first_page(self):
+        for cursor in ('not-base64!', encode_cursor(['only one key']), encode_cursor({'a': 1})):
+            page = keyset_paginate(Resource.objects.all(), keys=['full_name', 'pk'], fields=['pk'], after=cursor, page_size=3)
+            self.assertEqual([row['pk'] for row in page], self.ordered[:3])
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(['Dubois', 3])), ['Dubois', 3])
+        self.assertIsNone(decode_cursor(''))
+
+
+class SearchRankPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            Mission.objects.create(otp_l2=f'OTP{i:03d}', belgian_name=f'Client Renault {i}', libelle_de_projet='Renault' * (i + 1))
+        Mission.objects.create(otp_l2='OTP999', belgian_name='Client Peugeot', libelle_de_projet='Peugeot')
+
+    def test_pages_follow_the_rank(self):
+        results = search_missions(Mission.objects.all(), 'renault')
+        pages, _ = walk_forward(results, ['search_rank', 'pk'], 3)
+        expected = list(results.order_by('search_rank', 'pk').values_list('pk', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(len(expected), 7)
+
+        ranks = list(results.order_by('search_rank', 'pk').values_list('search_rank', flat=True))
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_search_list_page(self):
+        self.client.force_login(get_user_model().objects.create_user('viewer'))
+        response = self.client.get(reverse('mission_list'), {'search': 'peugeot'})
+        self.assertEqual([row['otp_l2'] for row in response.context['page']], ['OTP999'])
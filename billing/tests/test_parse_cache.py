@@ -0,0 +1,103 @@
+import datetime
+import math
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from billing.parse_cache import ParseCache, Uncacheable, file_digest, from_arrow, to_arrow
+
+
+def mixed_frame():
+    """Columns as openpyxl returns them: typed ones and object columns mixing every cell type."""
+    return pd.DataFrame({
+        'Code projet': ['C1', None, 'C3', 42],
+        'Heures': [7.5, float('nan'), 0.0, -1.25],
+        'Lignes': np.array([1, 2, 3, 4], dtype='int64'),
+        'Actif': [True, False, True, True],
+        'Date': pd.to_datetime(['2025-05-01', None, '2025-05-03', '2025-05-04']),
+        'Cellules': pd.Series([
+            datetime.datetime(2025, 5, 1, 8, 30), datetime.date(2025, 5, 2), datetime.time(17, 45), pd.Timestamp('2025-05-04 12:00'),
+        ], dtype=object),
+        'Divers': pd.Series(['-', 3, 2.5, float('nan')], dtype=object),
+        'Booléens': pd.Series([True, 'True', None, False], dtype=object),
+    })
+
+
+class RoundTripTests(SimpleTestCase):
+
+    def assertSameCells(self, actual, expected):
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        self.assertEqual(list(actual.dtypes), list(expected.dtypes))
+        for column in expected.columns:
+            for a, e in zip(actual[column], expected[column]):
+                if isinstance(e, float) and math.isnan(e):
+                    self.assertTrue(isinstance(a, float) and math.isnan(a), column)
+                elif e is pd.NaT:
+                    self.assertIs(a, pd.NaT, column)
+                else:
+                    # Same value and same Python type, e.g. 3 stays an int and '3' a str
+                    self.assertEqual((type(a), a), (type(e), e), column)
+
+    def test_types_round_trip(self):
+        df = mixed_frame()
+        restored, extra = from_arrow(to_arrow(df, ['Mai Forecasts 25']))
+        self.assertSameCells(restored, df)
+        self.assertEqual(extra, ['Mai Forecasts 25'])
+
+    def test_non_string_column_names(self):
+        df = pd.DataFrame({0: ['a'], 'x': [1.0]})
+        restored, _ = from_arrow(to_arrow(df))
+        self.assertEqual(list(restored.columns), [0, 'x'])
+
+    def test_unsupported_values_are_not_cached(self):
+        with self.assertRaises(Uncacheable):
+            to_arrow(pd.DataFrame({'a': pd.Series([object()], dtype=object)}))
+        with self.assertRaises(Uncacheable):
+            to_arrow(pd.DataFrame({'a': [1]}, index=[5]))
+        with self.assertRaises(Uncacheable):
+            to_arrow(pd.DataFrame({'a': pd.Categorical(['x'])}))
+
+
+class ParseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp(prefix='slr-parse-cache-'))
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = ParseCache(self.directory / 'cache', max_bytes=10 * 1024 * 1024)
+        self.workbook = self.directory / 'heures.xlsx'
+        self.workbook.write_bytes(b'workbook bytes')
+        self.calls = []
+
+    def reader(self, path, mois=''):
+        self.calls.append((path, mois))
+        return mixed_frame(), f'{mois} Forecasts'
+
+    def test_second_read_is_served_from_the_cache(self):
+        first = self.cache.read(self.reader, self.workbook, 'May')
+        second = self.cache.read(self.reader, self.workbook, 'May')
+        self.assertEqual(len(self.calls), 1)
+        RoundTripTests.assertSameCells(self, second[0], first[0])
+        self.assertEqual(second[1], 'May Forecasts')
+
+    def test_key_covers_content_and_arguments(self):
+        self.cache.read(self.reader, self.workbook, 'May')
+        self.cache.read(self.reader, self.workbook, 'Jun')
+        self.workbook.write_bytes(b'edited workbook')
+        self.cache.read(self.reader, self.workbook, 'May')
+        self.assertEqual(len(self.calls), 3)
+
+    def test_given_digest_is_used(self):
+        digest = file_digest(self.workbook)
+        self.cache.read(self.reader, self.workbook, 'May', digest=digest)
+        self.cache.read(self.reader, self.workbook, 'May')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_eviction_keeps_the_directory_bounded(self):
+        self.cache.max_bytes = 1
+        self.cache.read(self.reader, self.workbook, 'May')
+        self.cache.read(self.reader, self.workbook, 'Jun')
+        self.assertLessEqual(len(list((self.directory / 'cache').glob('*.arrow'))), 1)
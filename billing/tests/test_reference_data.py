@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase
+
+from billing import reference_data
+from billing.models import Mission
+from billing.run_cache import run_cache
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp(prefix='slr-reference-'))
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(run_cache.clear)
+        patcher = mock.patch.object(reference_data, 'REFERENCE_DIR', directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Mission.objects.create(otp_l2='C1', belgian_name='Client Alpha', libelle_de_projet='Alpha')
+
+    def test_versions_follow_the_token(self):
+        first = reference_data.load_snapshot()
+        self.assertEqual(reference_data.load_snapshot().version, first.version)
+        Mission.objects.create(otp_l2='C2', belgian_name='Client Beta', libelle_de_projet=None)
+        reference_data.invalidate()
+        second = reference_data.load_snapshot()
+        self.assertEqual(second.version, first.version + 1)
+        self.assertEqual(sorted(second.codes['Libelle projet']), ['Alpha', 'Code France'])
+        # Older versions stay readable
+        run_cache.clear()
+        self.assertEqual(len(reference_data.load_snapshot(first.version).codes), 1)
+
+    def test_concurrent_loads_build_once(self):
+        tables = reference_data.query_tables()
+        barrier = threading.Barrier(4)
+        versions, errors = [], []
+
+        def load():
+            barrier.wait(5)
+            try:
+                versions.append(reference_data.load_snapshot().version)
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch.object(reference_data, 'query_tables', return_value=tables) as query_tables:
+            threads = [threading.Thread(target=load) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+        self.assertEqual(errors, [])
+        self.assertEqual(versions, [1] * 4)
+        self.assertEqual(query_tables.call_count, 1)
+
+    def test_version_left_by_a_dead_build_is_skipped(self):
+        reference_data.load_snapshot()
+        (reference_data.REFERENCE_DIR / 'v2').mkdir()
+        reference_data.invalidate()
+        self.assertEqual(reference_data.load_snapshot().version, 3)
@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from billing.run_store import RunStore, locked
+
+
+class RunStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.run_dir = Path(tempfile.mkdtemp(prefix='slr-run-store-'))
+        self.addCleanup(shutil.rmtree, self.run_dir, ignore_errors=True)
+        self.store = RunStore(self.run_dir)
+
+    def frame(self, n, value=0.0):
+        return pd.DataFrame({'ID': range(n), 'Heures': [value] * n, 'Nom': [f'N{i}' for i in range(n)]})
+
+    def test_tables_round_trip(self):
+        self.store.write({'adjusted': self.frame(10, 1.5), 'empty': self.frame(0)})
+        pd.testing.assert_frame_equal(self.store.read('adjusted'), self.frame(10, 1.5))
+        self.assertEqual(len(self.store.read('empty')), 0)
+        self.assertEqual(list(self.store.read('adjusted', columns=['Nom']).columns), ['Nom'])
+
+    def test_small_writes_are_appended(self):
+        self.store.write({'base': self.frame(1000), 'adjusted': self.frame(1000)})
+        version = self.store.version('base')
+        size = self.store.path.stat().st_size
+        self.store.write({'adjusted': self.frame(1000, 2.0)})
+        self.assertGreater(self.store.path.stat().st_size, size)
+        # Tables that were not written keep their segment
+        self.assertEqual(self.store.version('base'), version)
+        self.assertEqual(self.store.read('adjusted')['Heures'].tolist(), [2.0] * 1000)
+        pd.testing.assert_frame_equal(self.store.read('base'), self.frame(1000))
+
+    def test_dead_space_is_compacted(self):
+        self.store.write({'base': self.frame(1000), 'adjusted': self.frame(1000)})
+        size = self.store.path.stat().st_size
+        for value in range(1, 6):
+            self.store.write({'adjusted': self.frame(1000, float(value))})
+        self.assertLess(self.store.path.stat().st_size, 2 * size)
+        self.assertEqual(self.store.read('adjusted')['Heures'].tolist(), [5.0] * 1000)
+        self.assertEqual(sorted(self.store.index()), ['adjusted', 'base'])
+        self.assertEqual(list(self.run_dir.glob('*.tmp')), [])
+
+    def test_lock_is_reentrant_within_a_thread(self):
+        with locked(self.run_dir):
+            # RunStore takes the lock itself
+            self.store.write({'adjusted': self.frame(3)})
+            self.assertEqual(len(self.store.read('adjusted')), 3)
+        with locked(self.run_dir, shared=True):
+            with self.assertRaises(RuntimeError):
+                self.store.write({'adjusted': self.frame(3)})
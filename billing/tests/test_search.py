@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+
+from billing import search
+from billing.models import Mission, Resource
+from billing.search import ensure_search_indexes, search_missions, search_resources
+
+
+def found(queryset):
+    return sorted(queryset.values_list('pk', flat=True))
+
+
+class SearchIndexSyncTests(TestCase):
+    """The FTS triggers follow every kind of write, including the bulk ones."""
+
+    def test_create_update_delete(self):
+        mission = Mission.objects.create(otp_l2='OTP-1', belgian_name='Client Airbus', libelle_de_projet='Avionique')
+        self.assertEqual(found(search_missions(Mission.objects.all(), 'airbus')), [mission.pk])
+
+        mission.belgian_name = 'Client Thales'
+        mission.save()
+        self.assertEqual(found(search_missions(Mission.objects.all(), 'airbus')), [])
+        self.assertEqual(found(search_missions(Mission.objects.all(), 'thales')), [mission.pk])
+
+        mission.delete()
+        self.assertEqual(found(search_missions(Mission.objects.all(), 'thales')), [])
+
+    def test_bulk_create_and_queryset_update(self):
+        Mission.objects.bulk_create([Mission(otp_l2=f'OTP-{i}', belgian_name=f'Client Safran {i}') for i in range(3)])
+        self.assertEqual(len(found(search_missions(Mission.objects.all(), 'safran'))), 3)
+
+        Mission.objects.filter(otp_l2='OTP-0').update(belgian_name='Client Dassault')
+        self.assertEqual(len(found(search_missions(Mission.objects.all(), 'safran'))), 2)
+        self.assertEqual(len(found(search_missions(Mission.objects.all(), 'dassault'))), 1)
+
+    def test_terms_are_anded_and_quoted(self):
+        Mission.objects.create(otp_l2='OTP-A', belgian_name='Client Orange', libelle_de_projet='Fibre')
+        Mission.objects.create(otp_l2='OTP-B', belgian_name='Client Orange', libelle_de_projet='Mobile')
+        self.assertEqual(search_missions(Mission.objects.all(), 'orange fibre').count(), 1)
+        # FTS syntax in the query is matched literally, not parsed
+        self.assertEqual(search_missions(Mission.objects.all(), 'orange OR "mobile').count(), 0)
+
+
+class SearchFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = Resource.objects.create(
+            full_name='Durand Léa', matricule='M001', grade=Resource.GRADE_FR_MGR, rate_ibm=Decimal('120'), rate_des=Decimal('96'),
+        )
+        cls.staff = Resource.objects.create(
+            full_name='Petit Hugo', matricule='M002', grade=Resource.GRADE_FR_STF, rate_ibm=Decimal('60'), rate_des=Decimal('48'),
+        )
+        cls.des = Mission.objects.create(otp_l2='OTP-D', belgian_name='Client Engie', code_type=Mission.CODE_DES)
+        cls.fr = Mission.objects.create(otp_l2='OTP-F', belgian_name='Client Engie', code_type=Mission.CODE_FRANCE)
+
+    def test_grade_and_grade_des(self):
+        self.assertEqual(found(search_resources(Resource.objects.all(), 'FR_MGR')), [self.manager.pk])
+        self.assertEqual(found(search_resources(Resource.objects.all(), self.staff.grade_des)), sorted([self.manager.pk, self.staff.pk]))
+
+    def test_code_type(self):
+        self.assertEqual(found(search_missions(Mission.objects.all(), 'DES')), [self.des.pk])
+        # Shorter than a trigram: served by icontains over the same fields
+        self.assertEqual(found(search_missions(Mission.objects.all(), 'FR')), [self.fr.pk])
+
+    def test_index_with_old_columns_is_rebuilt(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE billing_resource_fts')
+            for name in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS billing_resource_fts_{name}')
+            cursor.execute(
+                "CREATE VIRTUAL TABLE billing_resource_fts USING fts5("
+                "full_name, matricule, content='billing_resource', content_rowid='id', tokenize='trigram')"
+            )
+        ensure_search_indexes()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA table_info(billing_resource_fts)')
+            columns = [row[1] for row in cursor.fetchall()]
+        self.assertEqual(columns, search.RESOURCE_SEARCH_FIELDS)
+        self.assertEqual(found(search_resources(Resource.objects.all(), 'FR_MGR')), [self.manager.pk])
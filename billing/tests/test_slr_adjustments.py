@@ -0,0 +1,289 @@
+import json
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from billing import slr_adjustments, slr_engine, slr_jobs
+from billing.models import Mission, SlrRun
+from billing.run_cache import run_cache
+from billing.run_store import RunStore, locked
+from billing.slr_engine import GROUP_KEY
+
+from .test_slr_engine import sample_inputs
+
+
+class RunDirMixin:
+    """A computed run of the sample month in a temporary run directory."""
+
+    def setUp(self):
+        self.run_dir = Path(tempfile.mkdtemp(prefix='slr-test-'))
+        self.addCleanup(shutil.rmtree, self.run_dir, ignore_errors=True)
+        self.addCleanup(run_cache.clear)
+        self.tables = slr_engine.compute_slr(*sample_inputs())
+        RunStore(self.run_dir).write({
+            'employee_summary_initial': self.tables['employee_summary'],
+            'global_summary_initial': self.tables['global_summary'],
+            'adjusted_initial': self.tables['adjusted'],
+            'result_initial': self.tables['result'],
+        })
+        slr_adjustments.write_kpi_snapshot(self.run_dir, self.tables['result'], self.tables['employee_summary'])
+
+    def recomputed(self, edits):
+        """``(adjusted, result)`` recomputed from scratch with ``edits`` ({ID: hours}) applied."""
+        adjusted = self.tables['adjusted'].copy()
+        for row_id, hours in edits.items():
+            row = adjusted.index[adjusted['ID'] == row_id][0]
+            adjusted.loc[row, 'Adjusted Hours'] = hours
+            adjusted.loc[row, 'Heures Retirées'] = adjusted.loc[row, 'Total Heures'] - hours
+            adjusted.loc[row, 'Adjusted Cost'] = hours * adjusted.loc[row, 'Rate']
+        return adjusted, slr_engine.build_result(adjusted, self.tables['global_summary'])
+
+
+class ApplyEditTests(RunDirMixin, TestCase):
+    edits = {'dupont marie - Alpha': 10.0, 'martin paul - Alpha': 0.0, 'durand léa - Beta': 2.0, 'dupont marie - Gamma': 0.5}
+
+    def assertSameState(self, state, edits):
+        adjusted, result = self.recomputed(edits)
+        pd.testing.assert_frame_equal(state.adjusted, adjusted, check_dtype=False)
+        pd.testing.assert_frame_equal(
+            state.result.sort_values(GROUP_KEY, ignore_index=True)[result.columns],
+            result.sort_values(GROUP_KEY, ignore_index=True),
+            check_dtype=False,
+        )
+
+    def test_delta_edits_match_full_recompute(self):
+        for row_id, hours in self.edits.items():
+            state, row = slr_adjustments.apply_edit(self.run_dir, row_id, hours)
+            self.assertIsNotNone(row)
+        self.assertSameState(state, self.edits)
+        self.assertEqual(state.journal_length, len(self.edits))
+
+    def test_journal_is_replayed_on_load(self):
+        for row_id, hours in self.edits.items():
+            slr_adjustments.apply_edit(self.run_dir, row_id, hours)
+        run_cache.clear()
+        state = slr_adjustments.load_state(self.run_dir)
+        self.assertSameState(state, self.edits)
+        self.assertEqual(state.journal_length, len(self.edits))
+        self.assertEqual(len(slr_adjustments.read_journal(self.run_dir)), len(self.edits))
+
+    def test_unknown_row(self):
+        state, row = slr_adjustments.apply_edit(self.run_dir, 'nobody - Alpha', 1.0)
+        self.assertIsNone(row)
+        self.assertEqual(slr_adjustments.read_journal(self.run_dir), [])
+
+    def test_edit_of_another_process_is_not_lost(self):
+        slr_adjustments.apply_edit(self.run_dir, 'dupont marie - Alpha', 10.0)
+        # Appended by another worker: this process' cached state lacks it
+        slr_adjustments.record_adjustment(self.run_dir, 'martin paul - Alpha', 0.0)
+        state, _ = slr_adjustments.apply_edit(self.run_dir, 'durand léa - Beta', 2.0)
+        edits = {'dupont marie - Alpha': 10.0, 'martin paul - Alpha': 0.0, 'durand léa - Beta': 2.0}
+        self.assertSameState(state, edits)
+        self.assertEqual(state.journal_length, 3)
+
+    def test_edit_waits_for_the_run_lock(self):
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            with locked(self.run_dir):
+                holding.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        holding.wait(5)
+        editor = threading.Thread(target=slr_adjustments.apply_edit, args=(self.run_dir, 'dupont marie - Alpha', 10.0))
+        editor.start()
+        editor.join(0.2)
+        self.assertTrue(editor.is_alive())
+        self.assertEqual(slr_adjustments.read_journal(self.run_dir), [])
+        release.set()
+        holder.join()
+        editor.join(5)
+        self.assertEqual(len(slr_adjustments.read_journal(self.run_dir)), 1)
+
+    def test_repeated_edit_of_one_row(self):
+        for hours in (1.0, 5.0, 12.0):
+            state, _ = slr_adjustments.apply_edit(self.run_dir, 'durand léa - Alpha', hours)
+        self.assertSameState(state, {'durand léa - Alpha': 12.0})
+
+    def test_compaction_folds_the_journal_into_the_archive(self):
+        with mock.patch.object(slr_adjustments, 'COMPACT_AFTER', 3):
+            for row_id, hours in self.edits.items():
+                state, _ = slr_adjustments.apply_edit(self.run_dir, row_id, hours)
+        # The third edit compacted; the fourth is the only one left in the journal
+        self.assertTrue(RunStore(self.run_dir).has('adjusted_updated'))
+        self.assertEqual(len(slr_adjustments.read_journal(self.run_dir)), 1)
+        self.assertEqual(state.journal_length, 1)
+        run_cache.clear()
+        self.assertSameState(slr_adjustments.load_state(self.run_dir), self.edits)
+
+    def test_failed_edit_drops_the_cached_state(self):
+        slr_adjustments.load_state(self.run_dir)
+        with mock.patch.object(slr_adjustments, 'record_adjustment', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                slr_adjustments.apply_edit(self.run_dir, 'dupont marie - Alpha', 1.0)
+        self.assertSameState(slr_adjustments.load_state(self.run_dir), {})
+
+
+class WriteBackTests(RunDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(slr_jobs, 'TEMP_FILES_BASE_DIR', self.run_dir.parent)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        slr_jobs.write_status(self.run_dir.name, period='May 25')
+        for project in ('Alpha', 'Beta'):
+            Mission.objects.create(otp_l2=f'OTP-{project}', belgian_name=f'Client {project}', libelle_de_projet=project)
+
+    def totals(self, project):
+        mission = Mission.objects.get(libelle_de_projet=project)
+        return mission.calculated_total_heures, mission.calculation_period
+
+    def test_each_edit_writes_its_project_back(self):
+        slr_adjustments.save_state(self.run_dir, self.tables['adjusted'], self.tables['result'])
+        beta = self.totals('Beta')
+        state, _ = slr_adjustments.apply_edit(self.run_dir, 'dupont marie - Alpha', 0.0)
+        alpha_hours = state.result.set_index(GROUP_KEY).at['Alpha', 'Adjusted Hours']
+        self.assertEqual(self.totals('Alpha'), (Decimal(str(alpha_hours)).quantize(Decimal('0.01')), 'May 25'))
+        self.assertEqual(self.totals('Beta'), beta)
+
+
+class SaveStateTests(RunDirMixin, TestCase):
+
+    def test_save_state_stores_updated_tables_and_clears_the_journal(self):
+        slr_adjustments.apply_edit(self.run_dir, 'durand léa - Alpha', 4.0)
+        adjusted, result = self.recomputed({'durand léa - Alpha': 20.0, 'martin paul - Delta': 1.0})
+        slr_adjustments.save_state(self.run_dir, adjusted, result)
+
+        self.assertFalse((self.run_dir / slr_adjustments.JOURNAL_FILENAME).exists())
+        self.assertEqual(slr_adjustments.get_latest_table(self.run_dir, 'result'), 'result_updated')
+        run_cache.clear()
+        state = slr_adjustments.load_state(self.run_dir)
+        pd.testing.assert_frame_equal(state.adjusted, adjusted, check_dtype=False)
+        pd.testing.assert_frame_equal(state.result, result, check_dtype=False)
+        self.assertEqual(state.journal_length, 0)
+
+    def test_initial_tables_are_kept(self):
+        adjusted, result = self.recomputed({'durand léa - Alpha': 20.0})
+        slr_adjustments.save_state(self.run_dir, adjusted, result)
+        initial = RunStore(self.run_dir).read('adjusted_initial')
+        pd.testing.assert_frame_equal(initial, self.tables['adjusted'], check_dtype=False)
+
+
+class ReportTests(RunDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        RunStore(self.run_dir).write({'base_df': self.tables['base']})
+
+    def test_edits_go_on_while_the_workbook_is_built(self):
+        written = {}
+
+        def write_report(path, tables):
+            # An edit from another thread must not wait for the build...
+            editor = threading.Thread(target=slr_adjustments.apply_edit, args=(self.run_dir, 'dupont marie - Alpha', 0.0))
+            editor.start()
+            editor.join(5)
+            written['edited'] = not editor.is_alive()
+            written['adjusted'] = tables['adjusted']
+            path.write_bytes(b'xlsx')
+
+        with mock.patch.object(slr_adjustments.slr_report, 'write_report', side_effect=write_report):
+            path, digest = slr_adjustments.get_report(self.run_dir)
+        self.assertTrue(written['edited'])
+        # ...nor change the tables being written
+        pd.testing.assert_frame_equal(written['adjusted'], self.tables['adjusted'], check_dtype=False)
+        self.assertEqual(path.name, f'{digest}.xlsx')
+        self.assertNotEqual(slr_adjustments.report_digest(self.run_dir), digest)
+
+    def test_report_is_built_once_per_state(self):
+        with mock.patch.object(slr_adjustments.slr_report, 'write_report', side_effect=lambda path, tables: path.write_bytes(b'xlsx')) as write_report:
+            first = slr_adjustments.get_report(self.run_dir)
+            self.assertEqual(slr_adjustments.get_report(self.run_dir), first)
+            self.assertEqual(write_report.call_count, 1)
+
+
+class KpiSnapshotTests(RunDirMixin, TestCase):
+
+    def assertKpisEqual(self, actual, expected):
+        self.assertEqual(actual.keys(), expected.keys())
+        self.assertEqual(actual['projects'].keys(), expected['projects'].keys())
+        for key, value in expected['overall'].items():
+            self.assertAlmostEqual(actual['overall'][key], value, places=6, msg=key)
+        for name, project in expected['projects'].items():
+            for section, values in project.items():
+                for key, value in values.items():
+                    self.assertAlmostEqual(actual['projects'][name][section][key], value, places=6, msg=f'{name} {key}')
+
+    def test_patched_snapshot_matches_compute_kpis(self):
+        for row_id, hours in ApplyEditTests.edits.items():
+            state, _ = slr_adjustments.apply_edit(self.run_dir, row_id, hours)
+        expected = slr_engine.compute_kpis(state.result, self.tables['employee_summary'])
+        self.assertKpisEqual(slr_adjustments.load_kpi_snapshot(self.run_dir), expected)
+
+    def test_edit_does_not_recompute_kpis(self):
+        with mock.patch.object(slr_engine, 'compute_kpis') as compute_kpis:
+            slr_adjustments.apply_edit(self.run_dir, 'dupont marie - Alpha', 3.0)
+        compute_kpis.assert_not_called()
+
+    def test_missing_snapshot_is_rebuilt(self):
+        (self.run_dir / slr_adjustments.KPI_FILENAME).unlink()
+        state, _ = slr_adjustments.apply_edit(self.run_dir, 'dupont marie - Alpha', 3.0)
+        expected = slr_engine.compute_kpis(state.result, self.tables['employee_summary'])
+        self.assertKpisEqual(slr_adjustments.load_kpi_snapshot(self.run_dir), expected)
+
+
+class AjaxEditTests(RunDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(slr_jobs, 'TEMP_FILES_BASE_DIR', self.run_dir.parent)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        SlrRun.objects.create(run_id=self.run_dir.name, status=SlrRun.STATUS_DONE)
+        self.user = get_user_model().objects.create_user('editor', password='secret')
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.client.get(reverse('mission_list'))
+        self.token = self.client.cookies['csrftoken'].value
+
+    def post(self, client=None, token=None, **data):
+        data = {'run_id': self.run_dir.name, 'row_id': 'dupont marie - Alpha', 'adjusted_hours': 10.0, **data}
+        headers = {'HTTP_X_CSRFTOKEN': token} if token else {}
+        return (client or self.client).post(
+            reverse('ajax_update_adjusted_hours'), json.dumps(data), content_type='application/json', **headers,
+        )
+
+    def test_edit(self):
+        resp = self.post(token=self.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()['success'])
+        self.assertEqual(resp.json()['updated_row']['adjusted_hours'], 10.0)
+        self.assertEqual(len(slr_adjustments.read_journal(self.run_dir)), 1)
+
+    def test_requires_login(self):
+        resp = self.post(client=Client())
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(slr_adjustments.read_journal(self.run_dir), [])
+
+    def test_requires_csrf_token(self):
+        self.assertEqual(self.post().status_code, 403)
+        self.assertEqual(slr_adjustments.read_journal(self.run_dir), [])
+
+    def test_run_must_be_registered(self):
+        for run_id in ('unknown', f'../{self.run_dir.name}', None):
+            resp = self.post(token=self.token, run_id=run_id)
+            self.assertEqual(resp.status_code, 404, run_id)
+        SlrRun.objects.filter(run_id=self.run_dir.name).update(status=SlrRun.STATUS_RUNNING)
+        self.assertEqual(self.post(token=self.token).status_code, 404)
+        self.assertEqual(slr_adjustments.read_journal(self.run_dir), [])
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from billing import slr_engine
+from billing.slr_engine import GROUP_KEY
+
+
+def legacy_slr(base_df, codes_df, consultants_df, mafe_subset):
+    """The merge-based calculation facturation_slr ran before slr_engine, kept as the reference."""
+    base_df = base_df.merge(codes_df[['Code projet', GROUP_KEY]], on='Code projet', how='left')
+    consultants_df = consultants_df.copy()
+    base_df['Nom'] = base_df['Nom'].astype(str).str.lower().str.strip()
+    consultants_df['Nom'] = consultants_df['Nom'].astype(str).str.lower().str.strip()
+    base_df['Heures'] = pd.to_numeric(base_df['Heures'], errors='coerce').fillna(0)
+    consultants_df['Rate'] = pd.to_numeric(consultants_df['Rate'], errors='coerce').fillna(0)
+    consultants_df['Rate DES'] = pd.to_numeric(consultants_df['Rate DES'], errors='coerce').fillna(0)
+
+    employee_summary = (
+        base_df.groupby([GROUP_KEY, 'Nom', 'Grade'], as_index=False)
+        .agg({'Heures': 'sum'})
+        .rename(columns={'Heures': 'Total Heures'})
+        .merge(consultants_df[['Nom', 'Rate']], on='Nom', how='left')
+        .merge(consultants_df[['Nom', 'Rate DES']], on='Nom', how='left')
+    )
+    employee_summary['Total'] = employee_summary['Rate'] * employee_summary['Total Heures']
+    employee_summary['Total DES'] = employee_summary['Rate DES'] * employee_summary['Total Heures']
+
+    summary_by_proj = employee_summary.groupby(GROUP_KEY, as_index=False).agg({'Total Heures': 'sum', 'Total': 'sum', 'Total DES': 'sum'})
+    global_summary = pd.merge(mafe_subset[[GROUP_KEY, 'Estimees']].drop_duplicates(), summary_by_proj, on=GROUP_KEY, how='left')
+    global_summary[['Total Heures', 'Total', 'Total DES']] = global_summary[['Total Heures', 'Total', 'Total DES']].fillna(0)
+    global_summary['Estimees'] = pd.to_numeric(global_summary['Estimees'].astype(str).str.strip().replace(['', '-', 'nan', 'None'], '0'), errors='coerce').fillna(0)
+
+    adjusted = employee_summary.merge(global_summary[[GROUP_KEY, 'Estimees']], on=GROUP_KEY, how='left')
+    adjusted['Total_Projet_Cout'] = adjusted.groupby(GROUP_KEY)['Total'].transform('sum')
+    adjusted['coeff_total'] = np.where(adjusted['Total_Projet_Cout'] > 0, adjusted['Estimees'] / adjusted['Total_Projet_Cout'], 0)
+    adjusted['total_rate_proj'] = adjusted.groupby(GROUP_KEY)['Rate'].transform('sum')
+    adjusted['priority_coeff'] = np.where(adjusted['total_rate_proj'] > 0, adjusted['Rate'] / adjusted['total_rate_proj'], 0)
+    adjusted['final_coeff'] = adjusted['coeff_total'] * adjusted['priority_coeff']
+    adjusted['Adjusted Hours'] = (adjusted['Total Heures'] * (1 - adjusted['final_coeff'])).round()
+    adjusted['Adjusted Hours'] = adjusted['Adjusted Hours'].apply(lambda x: max(x, 0))
+    thirty_pct = (adjusted['Adjusted Hours'] == 0) & (adjusted['Total Heures'] > 0)
+    adjusted.loc[thirty_pct, 'Adjusted Hours'] = (adjusted.loc[thirty_pct, 'Total Heures'] * 0.3).round()
+    adjusted['Heures Retirées'] = adjusted['Total Heures'] - adjusted['Adjusted Hours']
+    adjusted['Adjusted Cost'] = adjusted['Adjusted Hours'] * adjusted['Rate']
+    adjusted['ID'] = adjusted['Nom'].astype(str) + ' - ' + adjusted[GROUP_KEY].astype(str)
+
+    result = (
+        adjusted.groupby(GROUP_KEY, as_index=False)
+        .agg({'Total Heures': 'sum', 'Adjusted Hours': 'sum', 'Adjusted Cost': 'sum', 'Heures Retirées': 'sum'})
+        .merge(global_summary[[GROUP_KEY, 'Estimees']], on=GROUP_KEY, how='left')
+    )
+    result['Ecart'] = result['Estimees'] - result['Adjusted Cost']
+    for df in (employee_summary, global_summary, adjusted, result):
+        for col in df.select_dtypes(include='number').columns:
+            df[col] = df[col].round(0)
+    return {'employee_summary': employee_summary, 'global_summary': global_summary, 'adjusted': adjusted, 'result': result}
+
+
+def sample_inputs():
+    """A month covering the edge cases: unknown code, consultant without rate, project
+    without forecast, dash forecast, MAFE customer without hours, names typed differently
+    and a forecast far above the cost (30% rule)."""
+    rows = [
+        ('C1', 'DUPONT Marie', 'FR_STF', 7.5), ('C1', ' dupont marie ', 'FR_STF', 8.0),
+        ('C1', 'MARTIN Paul', 'FR_MGR', 4.0), ('C2', 'MARTIN Paul', 'FR_MGR', 16.0),
+        ('C2', 'DURAND Léa', 'FR_SRS', 30.0), ('C3', 'DURAND Léa', 'FR_SRS', 2.0),
+        ('C3', 'INCONNU Jean', 'FR_JSA', 5.0), ('C4', 'DUPONT Marie', 'FR_STF', 1.0),
+        ('C5', 'MARTIN Paul', 'FR_MGR', 3.0), ('C6', 'DURAND Léa', 'FR_SRS', 10.0),
+        ('XX', 'DUPONT Marie', 'FR_STF', 6.0),
+        ('C1', 'MARTIN Paul', 'FR_MGR', 'bad'),
+    ]
+    base_df = pd.DataFrame(rows, columns=['Code projet', 'Nom', 'Grade', 'Heures'])
+    base_df.insert(3, 'Date', pd.Timestamp('2025-05-02'))
+    codes_df = pd.DataFrame({
+        'Code projet': ['C1', 'C2', 'C3', 'C4', 'C5', 'C6'],
+        GROUP_KEY: ['Alpha', 'Alpha', 'Beta', 'Gamma', 'Delta', 'Zeta'],
+    })
+    consultants_df = pd.DataFrame({
+        'Nom': ['Dupont Marie', 'Martin Paul', 'Durand Léa'],
+        'Rate': [60.0, 120.0, 75.0],
+        'Rate DES': [48.0, 96.0, 60.0],
+        'Grade': ['FR_STF', 'FR_MGR', 'FR_SRS'],
+    })
+    mafe_subset = pd.DataFrame({
+        'Country': ['France'] * 6,
+        'Customer Name': ['Cust A', 'Cust B', 'Cust G', 'Cust D', 'Cust Z', 'Prospect'],
+        GROUP_KEY: ['Alpha', 'Beta', 'Gamma', 'Delta', 'Zeta', 'Prospect'],
+        'Estimees': [2500.0, 150.0, '-', 0.0, 5000.0, 9000.0],
+    })
+    return base_df, codes_df, consultants_df, mafe_subset
+
+
+class EngineParityTests(SimpleTestCase):
+    """compute_slr gives the tables of the calculation it replaced."""
+
+    def setUp(self):
+        self.inputs = sample_inputs()
+        self.tables = slr_engine.compute_slr(*(df.copy() for df in self.inputs))
+        self.legacy = legacy_slr(*(df.copy() for df in self.inputs))
+
+    def assertSameTable(self, name, keys):
+        new = self.tables[name].sort_values(keys, ignore_index=True)
+        old = self.legacy[name].sort_values(keys, ignore_index=True)
+        pd.testing.assert_frame_equal(new[old.columns], old, check_dtype=False, check_like=False)
+
+    def test_employee_summary(self):
+        self.assertSameTable('employee_summary', [GROUP_KEY, 'Nom'])
+
+    def test_global_summary(self):
+        self.assertSameTable('global_summary', [GROUP_KEY])
+
+    def test_adjusted(self):
+        self.assertSameTable('adjusted', ['ID'])
+
+    def test_result(self):
+        self.assertSameTable('result', [GROUP_KEY])
+
+    def test_unmatched_consultants(self):
+        unmatched = self.tables['unmatched']
+        self.assertEqual(unmatched['Nom'].tolist(), ['inconnu jean'])
+        self.assertEqual(unmatched['Total Heures'].tolist(), [5.0])
+
+    def test_thirty_percent_rule(self):
+        # Adjusted all the way down keeps 30% of the hours, rounded
+        adjusted = self.tables['adjusted'].set_index('ID')
+        self.assertEqual(adjusted.loc['durand léa - Zeta', 'Adjusted Hours'], 3.0)
+        hours = slr_engine.compute_adjusted_hours([10.0, 10.0, 0.0], [1.5, 0.25, 1.0])
+        self.assertEqual(hours.tolist(), [3.0, 8.0, 0.0])
+
+    def test_same_forecast_mapped_twice_is_summed(self):
+        # Two MAFE lines on one project: the engine sums them where the old
+        # merge duplicated the project's rows
+        base_df, codes_df, consultants_df, mafe_subset = self.inputs
+        extra = pd.DataFrame({'Country': ['France'], 'Customer Name': ['Cust A2'], GROUP_KEY: ['Alpha'], 'Estimees': [500.0]})
+        tables = slr_engine.compute_slr(base_df, codes_df, consultants_df, pd.concat([mafe_subset, extra], ignore_index=True))
+        result = tables['result'].set_index(GROUP_KEY)
+        self.assertEqual(result.loc['Alpha', 'Estimees'], 3000.0)
+        self.assertEqual(len(tables['adjusted']), len(self.tables['adjusted']))
+
+
+class PeriodTests(SimpleTestCase):
+
+    def test_parse_period(self):
+        self.assertEqual(slr_engine.parse_period('Heures IBM Mai 25.xlsx'), ('May', '25'))
+        self.assertEqual(slr_engine.parse_period('Heures IBM - Décembre 2024.xlsx'), ('Dec', '2024'))
+        self.assertEqual(slr_engine.parse_period('Heures.xlsx'), ('', ''))
+
+    def test_to_number(self):
+        values = slr_engine.to_number(pd.Series(['12', ' - ', None, 'abc', 3.5], dtype=object))
+        self.assertEqual(values.tolist(), [12.0, 0.0, 0.0, 0.0, 3.5])
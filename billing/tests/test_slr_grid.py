@@ -0,0 +1,87 @@
+from unittest import mock
+
+import pandas as pd
+from django.http import QueryDict
+from django.test import SimpleTestCase
+
+from billing import slr_engine, slr_grid
+from billing.run_cache import run_cache
+
+from .test_slr_engine import sample_inputs
+
+
+class QueryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.adjusted = slr_engine.compute_slr(*sample_inputs())['adjusted']
+        self.addCleanup(run_cache.clear)
+
+    def ids(self, **kwargs):
+        return [row[0] for row in slr_grid.query(self.adjusted, **kwargs)['rows']]
+
+    def test_offset_and_limit(self):
+        page = slr_grid.query(self.adjusted, offset=2, limit=3)
+        self.assertEqual((page['total'], page['filtered'], page['offset'], page['limit']), (8, 8, 2, 3))
+        self.assertEqual([row[0] for row in page['rows']], list(self.adjusted['ID'][2:5]))
+        self.assertEqual(self.ids(offset=7, limit=5), [self.adjusted['ID'].iloc[7]])
+        self.assertEqual(self.ids(offset=20), [])
+
+    def test_columns(self):
+        page = slr_grid.query(self.adjusted, columns=['Nom', 'ID', 'Rate'], limit=5)
+        self.assertEqual(page['columns'], ['ID', 'Nom', 'Rate'])
+        # Missing values are sent as null
+        self.assertIsNone(page['rows'][4][2])
+        self.assertNotIn('final_coeff', slr_grid.query(self.adjusted)['columns'])
+
+    def test_multi_key_sort_breaks_ties_by_id(self):
+        expected = self.adjusted.sort_values(['Grade', 'Heures Retirées', 'ID'], ascending=[True, False, True], na_position='last')['ID']
+        self.assertEqual(self.ids(sort=['Grade', '-Heures Retirées']), list(expected))
+        # Ties on the only key follow the ID
+        self.assertEqual(self.ids(sort=['-Heures Retirées'], limit=3), ['durand léa - Zeta', 'durand léa - Alpha', 'martin paul - Alpha'])
+
+    def test_missing_values_sort_last(self):
+        self.assertEqual(self.ids(sort=['Rate'])[-1], 'inconnu jean - Beta')
+        self.assertEqual(self.ids(sort=['-Rate'])[-1], 'inconnu jean - Beta')
+
+    def test_filters(self):
+        self.assertEqual(self.ids(filters={'project': 'Alpha'}), ['dupont marie - Alpha', 'durand léa - Alpha', 'martin paul - Alpha'])
+        # Exact: no partial project or grade matches
+        self.assertEqual(self.ids(filters={'project': 'Alph'}), [])
+        self.assertEqual(self.ids(filters={'grade': 'FR_SRS', 'project': 'Beta'}), ['durand léa - Beta'])
+        # Contains, case-insensitive
+        self.assertEqual(self.ids(filters={'employee': ' DURAND '}), ['durand léa - Alpha', 'durand léa - Beta', 'durand léa - Zeta'])
+        page = slr_grid.query(self.adjusted, filters={'employee': 'martin'}, sort=['-Adjusted Cost'], limit=1)
+        self.assertEqual((page['total'], page['filtered']), (8, 2))
+        self.assertEqual(page['rows'][0][0], 'martin paul - Alpha')
+
+    def test_unknown_columns_are_rejected(self):
+        for kwargs in ({'columns': ['Nom', 'Salaire']}, {'sort': ['-Salaire']}, {'columns': ['final_coeff']}):
+            with self.assertRaises(slr_grid.GridError):
+                slr_grid.query(self.adjusted, **kwargs)
+
+    def test_row_order_is_cached_per_version(self):
+        with mock.patch.object(slr_grid, '_row_order', wraps=slr_grid._row_order) as row_order:
+            first = self.ids(sort=['-Heures Retirées'], limit=2, run_id='run', version=1)
+            second = self.ids(sort=['-Heures Retirées'], offset=2, limit=2, run_id='run', version=1)
+            self.assertEqual(row_order.call_count, 1)
+            self.assertEqual(first + second, self.ids(sort=['-Heures Retirées'], limit=4))
+            # An edit changes the state version and the order is computed again
+            self.adjusted.loc[self.adjusted['ID'] == 'martin paul - Delta', 'Heures Retirées'] = 100.0
+            self.assertEqual(self.ids(sort=['-Heures Retirées'], limit=1, run_id='run', version=2), ['martin paul - Delta'])
+            self.assertEqual(row_order.call_count, 3)
+
+
+class ParseParamsTests(SimpleTestCase):
+
+    def test_params(self):
+        params = slr_grid.parse_params(QueryDict('offset=200&limit=5000&sort=-Nom, ID&columns=Nom&employee=dur&grade='))
+        self.assertEqual(params, {
+            'offset': 200, 'limit': slr_grid.MAX_LIMIT, 'sort': ['-Nom', 'ID'],
+            'columns': ['Nom'], 'filters': {'employee': 'dur'},
+        })
+        self.assertEqual(slr_grid.parse_params(QueryDict())['limit'], slr_grid.DEFAULT_LIMIT)
+
+    def test_invalid_numbers(self):
+        for query in ('offset=-1', 'limit=0', 'limit=ten'):
+            with self.assertRaises(slr_grid.GridError):
+                slr_grid.parse_params(QueryDict(query))
@@ -0,0 +1,62 @@
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase
+
+from billing import slr_jobs
+from billing.models import SlrRun
+
+
+class StaleRunTests(TestCase):
+
+    def setUp(self):
+        base_dir = Path(tempfile.mkdtemp(prefix='slr-runs-'))
+        self.addCleanup(shutil.rmtree, base_dir, ignore_errors=True)
+        patcher = mock.patch.object(slr_jobs, 'TEMP_FILES_BASE_DIR', base_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_run(self, run_id, status, seconds_ago):
+        run_dir = slr_jobs.get_run_dir(run_id)
+        run_dir.mkdir()
+        updated_at = datetime.now() - timedelta(seconds=seconds_ago)
+        with open(run_dir / slr_jobs.STATUS_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump({'run_id': run_id, 'status': status, 'logs': [], 'updated_at': updated_at.isoformat(timespec='seconds')}, f)
+        SlrRun.objects.create(run_id=run_id, status=status)
+
+    def test_runs_without_heartbeat_are_failed(self):
+        stale = slr_jobs.STALE_AFTER_SECONDS + 60
+        self.make_run('stale', slr_jobs.STATUS_RUNNING, stale)
+        self.make_run('fresh', slr_jobs.STATUS_RUNNING, 0)
+        self.make_run('queued', slr_jobs.STATUS_QUEUED, stale)
+        self.make_run('done', slr_jobs.STATUS_DONE, stale)
+
+        self.assertEqual(slr_jobs.fail_stale_runs(), 2)
+        statuses = dict(SlrRun.objects.values_list('run_id', 'status'))
+        self.assertEqual(statuses, {'stale': 'failed', 'fresh': 'running', 'queued': 'failed', 'done': 'done'})
+        status = slr_jobs.read_status('stale')
+        self.assertEqual(status['status'], slr_jobs.STATUS_FAILED)
+        self.assertIn('heartbeat', status['error'])
+        self.assertIsNotNone(SlrRun.objects.get(run_id='stale').finished_at)
+
+    def test_run_without_status_file_is_failed(self):
+        SlrRun.objects.create(run_id='gone', status=slr_jobs.STATUS_RUNNING)
+        self.assertEqual(slr_jobs.fail_stale_runs(), 1)
+        self.assertEqual(SlrRun.objects.get(run_id='gone').status, slr_jobs.STATUS_FAILED)
+
+    def test_limited_to_given_runs(self):
+        stale = slr_jobs.STALE_AFTER_SECONDS + 60
+        self.make_run('a', slr_jobs.STATUS_RUNNING, stale)
+        self.make_run('b', slr_jobs.STATUS_RUNNING, stale)
+        self.assertEqual(slr_jobs.fail_stale_runs(['a']), 1)
+        self.assertEqual(SlrRun.objects.get(run_id='b').status, slr_jobs.STATUS_RUNNING)
+
+    def test_heartbeat_refreshes_updated_at(self):
+        self.make_run('held', slr_jobs.STATUS_RUNNING, slr_jobs.STALE_AFTER_SECONDS + 60)
+        slr_jobs.write_status('held')
+        self.assertEqual(slr_jobs.fail_stale_runs(), 0)
+        self.assertEqual(slr_jobs.read_status('held')['status'], slr_jobs.STATUS_RUNNING)
@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from billing import slr_jobs, slr_readers
+from billing.slr_batch import pair_files
+from billing.slr_engine import BASE_COLUMNS
+from billing.slr_workload import Workload
+
+
+class ReadHeuresTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = Path(tempfile.mkdtemp(prefix='slr-readers-'))
+        cls.workload = Workload(1000, seed=1)
+        cls.path = cls.directory / cls.workload.filename
+        cls.workload.write_heures(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_chunks_make_up_the_sheet(self):
+        whole = slr_readers.read_heures(self.path, chunk_size=10 ** 6)
+        chunked = slr_readers.read_heures(self.path, chunk_size=7)
+        self.assertEqual(list(chunked.columns), BASE_COLUMNS)
+        self.assertEqual(len(chunked), 1000)
+        pd.testing.assert_frame_equal(chunked, whole)
+        self.assertEqual(chunked['Heures'].dtype, 'float64')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(chunked['Date']))
+
+
+class UploadTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('uploader'))
+
+    def post(self, heures_name, mafe_name, **headers):
+        with mock.patch.object(slr_jobs, 'submit_run') as submit_run:
+            response = self.client.post(reverse('facturation_slr'), {
+                'heures_ibm_file': SimpleUploadedFile(heures_name, b'workbook'),
+                'mafe_report_file': SimpleUploadedFile(mafe_name, b'workbook'),
+            }, **headers)
+        return response, submit_run
+
+    def test_legacy_xls_is_rejected(self):
+        response, submit_run = self.post('Heures IBM Mai 25.xls', 'DTT IMT France MAFE Report - Mai 2025.xlsx')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('save the workbook as .xlsx', str(list(response.context['messages'])))
+        submit_run.assert_not_called()
+
+        response, submit_run = self.post('Heures IBM Mai 25.xls', 'MAFE.xls', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+
+    def test_upload_keeps_its_suffix(self):
+        response, submit_run = self.post('Heures IBM Mai 25.xlsm', 'MAFE.XLSX', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 202)
+        run_id, heures_path, mafe_path = submit_run.call_args.args[:3]
+        self.addCleanup(shutil.rmtree, slr_jobs.get_run_dir(run_id), ignore_errors=True)
+        self.assertEqual((heures_path.name, mafe_path.name), ('heures_ibm.xlsm', 'mafe_report.xlsx'))
+
+
+class PairFilesTests(SimpleTestCase):
+
+    def test_legacy_xls_is_reported(self):
+        pairs, problems = pair_files([Path('Heures IBM Mai 25.xls'), Path('DTT IMT France MAFE Report - Mai 2025.xlsx')])
+        self.assertEqual(pairs, {})
+        self.assertIn('Heures IBM Mai 25.xls: legacy .xls workbook, save it as .xlsx', problems)
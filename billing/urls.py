@@ -14,8 +14,14 @@ urlpatterns = [
     path('missions/<int:pk>/delete/', views.mission_delete, name='mission_delete'),
     path('missions/tracking/', views.mission_calculation_tracking_view, name='mission_calculation_tracking'),
     path('facturation/slr/', views.facturation_slr, name='facturation_slr'),
+    path('facturation/runs/', views.slr_run_history, name='slr_run_history'),
     path('missions/bulk-delete/', views.mission_bulk_delete, name='mission_bulk_delete'),
+    path('api/bulk/', views.bulk_operations, name='bulk_operations'),
+    path('facturation/slr/<str:run_id>/', views.facturation_slr_run, name='facturation_slr_run'),
+    path('facturation/slr/<str:run_id>/status/', views.slr_run_status, name='slr_run_status'),
+    path('facturation/slr/<str:run_id>/metrics/', views.slr_run_metrics, name='slr_run_metrics'),
     path('facturation/slr/<str:run_id>/download/<str:filename>/', views.download_slr_report, name='download_slr_report'),
     path('facturation/slr/<str:run_id>/edit/', views.edit_slr_adjustments, name='edit_slr_adjustments'),
+    path('facturation/slr/<str:run_id>/edit/grid/', views.slr_adjustments_grid, name='slr_adjustments_grid'),
     path('facturation/slr/ajax/update-adjusted-hours/', views.ajax_update_adjusted_hours, name='ajax_update_adjusted_hours'),
 ] 
\ No newline at end of file
@@ -2,13 +2,17 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
-from .models import Resource, Mission
+from django.urls import reverse, reverse_lazy
+from .models import Resource, Mission, SlrRun
 from .forms import ResourceForm, MissionForm, SLRFileUploadForm
+from . import bulk_api, instrumentation, slr_adjustments, slr_engine, slr_grid, slr_jobs
+from .downloads import serve_file
+from .pagination import keyset_paginate
+from .search import search_missions, search_resources
+from .run_store import RunStore, locked, read_cached
 import pandas as pd
 import numpy as np
 import re
-from io import BytesIO
 from django.http import HttpResponse, JsonResponse
 from datetime import datetime
 from django.contrib import messages
@@ -16,110 +20,55 @@ import os
 import traceback
 from django.db import models
 import json
+import logging
 from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 from pathlib import Path
+from urllib.parse import urlencode
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
 
-# Define temporary storage path for SLR runs
-TEMP_FILES_BASE_DIR = Path(settings.MEDIA_ROOT) / 'slr_temp_runs'
-TEMP_FILES_BASE_DIR.mkdir(parents=True, exist_ok=True)
+from .slr_jobs import TEMP_FILES_BASE_DIR
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
 @login_required
 def home(request):
-    import json
-    from pathlib import Path
-    from django.conf import settings
-    import pandas as pd
-
-    def get_latest_parquet(run_dir, base):
-        updated = run_dir / f'{base}_updated.parquet'
-        initial = run_dir / f'{base}_initial.parquet'
-        return updated if updated.exists() else initial
-
-    last_slr_run_id = request.session.get('last_slr_run_id')
-    print(f"DEBUG: Retrieved last_slr_run_id from session: {last_slr_run_id}")
-    data_available = False
-    libelle_projets_list = []
-    overall_kpis = {}
-    projects_data_for_js = {}
-
-    if last_slr_run_id:
-        run_dir = Path(settings.MEDIA_ROOT) / 'slr_temp_runs' / last_slr_run_id
-        print(f"DEBUG: Constructed run_dir: {run_dir}")
+    # ?run= picks a finished run from the history; otherwise the user's latest finished run.
+    # The run directory is built from the registry's run_id, never from the query string.
+    finished_runs = SlrRun.objects.filter(status=SlrRun.STATUS_DONE)
+    requested_run_id = request.GET.get('run')
+    if requested_run_id:
+        run = get_object_or_404(finished_runs, run_id=requested_run_id)
+    else:
+        run = (
+            finished_runs.filter(owner=request.user).first()
+            or finished_runs.filter(run_id=request.session.get('last_slr_run_id') or '').first()
+        )
+    logger.debug('Dashboard run: %s', run.run_id if run else None)
+    kpis = None
+
+    if run is not None:
         try:
-            result_path = get_latest_parquet(run_dir, 'result')
-            employee_summary_path = get_latest_parquet(run_dir, 'employee_summary')
-            global_summary_path = get_latest_parquet(run_dir, 'global_summary')
-            print(f"DEBUG: Using result file: {result_path}")
-            print(f"DEBUG: Using employee_summary file: {employee_summary_path}")
-            print(f"DEBUG: Using global_summary file: {global_summary_path}")
-            result_df = pd.read_parquet(result_path)
-            print(f"DEBUG: Loaded result_df, shape: {result_df.shape}")
-            employee_summary_df = pd.read_parquet(employee_summary_path)
-            print(f"DEBUG: Loaded employee_summary_df, shape: {employee_summary_df.shape}")
-            global_summary_df = pd.read_parquet(global_summary_path)
-            print(f"DEBUG: Loaded global_summary_df, shape: {global_summary_df.shape}")
-            data_available = True
-        except Exception as e:
-            print(f"ERROR: Failed to load one or more Parquet files: {e}")
-            data_available = False
-
-    if data_available:
-        # Prepare project list
-        libelle_projets_list = sorted(list(result_df['Libelle projet'].unique()))
-        # 1. Calculate overall KPIs
-        nb_employes_overall = employee_summary_df['Nom'].nunique()
-        total_budget_estime_overall = result_df['Estimees'].sum()
-        total_adjusted_cost_overall = result_df['Adjusted Cost'].sum()
-        total_ecart_overall = result_df['Ecart'].sum()
-        pct_ajustement_overall = (total_ecart_overall / total_budget_estime_overall) * 100 if total_budget_estime_overall else 0
-        overall_kpis = {
-            'nbEmployes': nb_employes_overall,
-            'totalBudgetEstime': total_budget_estime_overall,
-            'totalAdjustedCost': total_adjusted_cost_overall,
-            'totalEcart': total_ecart_overall,
-            'pctAjustement': pct_ajustement_overall
-        }
-        # 2. Prepare per-project KPIs and chart data
-        projects_data = {}
-        for projet_name in libelle_projets_list:
-            project_result_data = result_df[result_df['Libelle projet'] == projet_name].iloc[0]
-            project_employee_data = employee_summary_df[employee_summary_df['Libelle projet'] == projet_name]
-            nb_employes_project = project_employee_data['Nom'].nunique()
-            budget_estime_project = project_result_data['Estimees']
-            adjusted_cost_project = project_result_data['Adjusted Cost']
-            ecart_project = project_result_data['Ecart']
-            pct_ajustement_project = (ecart_project / budget_estime_project) * 100 if budget_estime_project else 0
-            projects_data[projet_name] = {
-                'kpis': {
-                    'nbEmployes': nb_employes_project,
-                    'totalBudgetEstime': budget_estime_project,
-                    'totalAdjustedCost': adjusted_cost_project,
-                    'totalEcart': ecart_project,
-                    'pctAjustement': pct_ajustement_project
-                },
-                'chart1_data': {
-                    'budgetEstime': budget_estime_project,
-                    'adjustedCost': adjusted_cost_project
-                },
-                'chart2_data': {
-                    'budgetEstime': budget_estime_project,
-                    'ecart': ecart_project
-                }
-            }
+            # KPIs are precomputed by the run and refreshed on every saved adjustment
+            kpis = slr_adjustments.load_kpi_snapshot(slr_jobs.get_run_dir(run.run_id))
+            logger.debug('Loaded KPI snapshot of run %s for %d projects', run.run_id, len(kpis['projects']))
+        except Exception:
+            logger.exception('Failed to load the KPI snapshot of run %s', run.run_id)
+            kpis = None
+
+    if kpis is not None:
         context = {
-            'data_available': data_available,
-            'libelle_projets_list': libelle_projets_list,
-            'overall_kpis': to_python_type(overall_kpis),
-            'projects_data_json': json.dumps(to_python_type(projects_data)),
+            'data_available': True,
+            'libelle_projets_list': list(kpis['projects']),
+            'overall_kpis': kpis['overall'],
+            'projects_data_json': json.dumps(kpis['projects']),
+            'run': run,
+            'recent_runs': finished_runs.select_related('owner')[:12],
         }
-        print(f"DEBUG: Context for home.html: data_available={context.get('data_available')}")
-        print(f"DEBUG: Context projects_data_json: {context.get('projects_data_json')[:200]}...")
         return render(request, 'billing/home.html', context)
     
     # Return response when no data is available
@@ -131,6 +80,47 @@ def home(request):
     }
     return render(request, 'billing/home.html', context)
 
+@login_required
+def slr_run_history(request):
+    """All SLR runs, newest first, optionally for one month (?period=YYYY-MM) or only the user's (?mine=1)."""
+    slr_jobs.fail_stale_runs()
+    runs = SlrRun.objects.all()
+    period = request.GET.get('period', '')
+    if period:
+        try:
+            runs = runs.filter(period=datetime.strptime(period, '%Y-%m').date())
+        except ValueError:
+            messages.warning(request, f"Invalid period: {period}")
+            period = ''
+    mine = request.GET.get('mine') == '1'
+    if mine:
+        runs = runs.filter(owner=request.user)
+    page = keyset_paginate(
+        runs.annotate(owner_name=models.F('owner__username')),
+        keys=['-created_at', '-pk'],
+        fields=['run_id', 'period', 'heures_filename', 'status', 'row_counts', 'stage_metrics', 'created_at', 'finished_at', 'owner_name'],
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    status_labels = dict(SlrRun.STATUS_CHOICES)
+    for row in page:
+        row['status_display'] = status_labels.get(row['status'], row['status'])
+        row['total_seconds'] = instrumentation.total_seconds(row['stage_metrics'], exclude=slr_jobs.ON_DEMAND_STAGES)
+    filters = {k: v for k, v in (('period', period), ('mine', '1' if mine else '')) if v}
+    context = {
+        'page': page,
+        'page_query': urlencode(filters),
+        'period': period,
+        'mine': mine,
+        'page_title': 'Historique des Calculs',
+    }
+    return render(request, 'billing/slr_run_history.html', context)
+
+# Choice labels for the list pages
+GRADE_LABELS = dict(Resource.GRADE_CHOICES)
+GRADE_DES_LABELS = dict(Resource.GRADE_DES_CHOICES)
+CODE_TYPE_LABELS = dict(Mission.CODE_TYPE_CHOICES)
+
 @login_required
 def resource_list_view(request):
     search_query = request.GET.get('search', '')
@@ -144,28 +134,26 @@ def resource_list_view(request):
             messages.success(request, f"Successfully deleted {len(selected_ids)} resource(s).")
             return redirect('resource_list')
 
+    keys = ['full_name', 'pk']
     if search_query:
-        resources = resources.filter(
-            models.Q(full_name__icontains=search_query) |
-            models.Q(matricule__icontains=search_query) |
-            models.Q(grade__icontains=search_query) |
-            models.Q(grade_des__icontains=search_query)
-        )
-    # Annotate display values for grade and grade_des
-    resource_list = []
-    for r in resources:
-        resource_list.append({
-            'pk': r.pk,
-            'picture': r.picture,
-            'full_name': r.full_name,
-            'matricule': r.matricule,
-            'grade': r.get_grade_display(),
-            'grade_des': r.get_grade_des_display(),
-            'rate_ibm': r.rate_ibm,
-            'rate_des': r.rate_des,
-        })
+        # Ranked, index-backed search; pages follow the rank
+        resources = search_resources(resources, search_query)
+        keys = ['search_rank', 'pk']
+    page = keyset_paginate(
+        resources,
+        keys=keys,
+        fields=['picture', 'full_name', 'matricule', 'grade', 'grade_des', 'rate_ibm', 'rate_des'],
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    # Display labels from the precomputed choices maps, not per-instance get_*_display()
+    for row in page:
+        row['picture_url'] = default_storage.url(row['picture']) if row['picture'] else None
+        row['grade'] = GRADE_LABELS.get(row['grade'], row['grade'])
+        row['grade_des'] = GRADE_DES_LABELS.get(row['grade_des'], row['grade_des'])
     context = {
-        'resources': resource_list,
+        'resources': page,
+        'page': page,
         'page_title': 'Resources',
         'search_query': search_query
     }
@@ -176,16 +164,24 @@ def mission_list_view(request):
     search_query = request.GET.get('search', '')
     missions = Mission.objects.all()
     
+    keys = ['otp_l2', 'pk']
     if search_query:
-        missions = missions.filter(
-            models.Q(otp_l2__icontains=search_query) |
-            models.Q(belgian_name__icontains=search_query) |
-            models.Q(libelle_de_projet__icontains=search_query) |
-            models.Q(code_type__icontains=search_query)
-        )
-    
+        missions = search_missions(missions, search_query)
+        keys = ['search_rank', 'pk']
+
+    page = keyset_paginate(
+        missions,
+        keys=keys,
+        fields=['otp_l2', 'belgian_name', 'libelle_de_projet', 'code_type'],
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    for row in page:
+        row['code_type_display'] = CODE_TYPE_LABELS.get(row['code_type'], row['code_type'])
+
     context = {
-        'missions': missions,
+        'missions': page,
+        'page': page,
         'page_title': 'Missions',
         'search_query': search_query
     }
@@ -312,6 +308,20 @@ def facturation_slr(request):
             }
             return render(request, 'billing/facturation_slr.html', context)
 
+        if not form.is_valid():
+            errors = [error for field_errors in form.errors.values() for error in field_errors]
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({'success': False, 'errors': errors}, status=400)
+            for error in errors:
+                processing_logs.append(f"ERROR: {error}")
+                messages.error(request, error)
+            context = {
+                'form': form,
+                'processing_logs': processing_logs,
+                'page_title': 'Facturation SLR',
+            }
+            return render(request, 'billing/facturation_slr.html', context)
+
         try:
             # Generate a unique run ID
             run_id = str(uuid.uuid4())
@@ -319,228 +329,32 @@ def facturation_slr(request):
             run_dir.mkdir(parents=True, exist_ok=True)
             processing_logs.append(f"DEBUG: Created temporary directory for run_id {run_id} at {run_dir}")
 
-            # Process Heures IBM file
-            heures_ibm_file_obj.seek(0)
-            base_df = pd.read_excel(heures_ibm_file_obj, sheet_name='base', usecols="E,H,I,M,N")
-            base_df.columns = ['Code projet', 'Nom', 'Grade', 'Date', 'Heures']
-            processing_logs.append(f"INFO: Heures IBM file parsed. base_df shape: {base_df.shape}")
-
-            # Process MAFE report file
-            mafe_file_obj.seek(0)
-            mafe_raw = pd.read_excel(mafe_file_obj, sheet_name='(Tab A) FULLY COMMITTED', header=None)
-            mafe_raw.columns = mafe_raw.iloc[14].astype(str).str.strip().str.replace('\n', ' ').str.replace('\r', ' ')
-            mafe_df = mafe_raw.drop(index=list(range(0, 15))).reset_index(drop=True)
-            processing_logs.append(f"INFO: MAFE report file parsed. mafe_df shape: {mafe_df.shape}")
-
-            # --- MATCH main.py LOGIC ---
-            processing_logs.append("DEBUG: Starting calculations...")
-            
-            # 1. Prepare base_df (Heures IBM) - already loaded
-            # 2. Prepare codes_df from Mission model
-            codes_qs = Mission.objects.all().values('otp_l2', 'libelle_de_projet')
-            codes_df = pd.DataFrame(list(codes_qs))
-            codes_df = codes_df.rename(columns={'otp_l2': 'Code projet', 'libelle_de_projet': 'Libelle projet'})
-            codes_df['Libelle projet'] = codes_df['Libelle projet'].fillna('Code France')
-            base_df = base_df.merge(codes_df[['Code projet', 'Libelle projet']], on='Code projet', how='left')
-            processing_logs.append("DEBUG: Codes merged with base_df")
-
-            # 3. Prepare consultants_df from Resource model
-            consultants_qs = Resource.objects.all().values('full_name', 'rate_ibm', 'rate_des', 'grade')
-            consultants_df = pd.DataFrame(list(consultants_qs))
-            consultants_df = consultants_df.rename(columns={'full_name': 'Nom', 'rate_ibm': 'Rate', 'rate_des': 'Rate DES', 'grade': 'Grade'})
-            base_df['Nom'] = base_df['Nom'].astype(str).str.lower().str.strip()
-            consultants_df['Nom'] = consultants_df['Nom'].astype(str).str.lower().str.strip()
-            base_df['Heures'] = pd.to_numeric(base_df['Heures'], errors='coerce').fillna(0)
-            consultants_df['Rate'] = pd.to_numeric(consultants_df['Rate'], errors='coerce').fillna(0)
-            consultants_df['Rate DES'] = pd.to_numeric(consultants_df['Rate DES'], errors='coerce').fillna(0)
-            processing_logs.append("DEBUG: Consultants data prepared")
-
-            # 4. Prepare MAFE file - match main.py logic
-            mois_mapping = {
-                'Janvier': 'Jan', 'Février': 'Feb', 'Mars': 'Mar', 'Avril': 'Apr', 'Mai': 'May', 'Juin': 'Jun',
-                'Juillet': 'Jul', 'Août': 'Aug', 'Septembre': 'Sep', 'Octobre': 'Oct', 'Novembre': 'Nov', 'Décembre': 'Dec',
-                'Jan': 'Jan', 'Feb': 'Feb', 'Mar': 'Mar', 'Apr': 'Apr', 'May': 'May', 'Jun': 'Jun',
-                'Jul': 'Jul', 'Aug': 'Aug', 'Sep': 'Sep', 'Oct': 'Oct', 'Nov': 'Nov', 'Dec': 'Dec'
-            }
-            match = re.search(r'(Janvier|Février|Mars|Avril|Mai|Juin|Juillet|Août|Septembre|Octobre|Novembre|Décembre|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]*(\d{2,4})', heures_ibm_file_obj.name)
-            mois = mois_mapping.get(match.group(1), match.group(1)) if match else ''
-            annee = match.group(2) if match else ''
-            processing_logs.append(f"DEBUG: Month and year extracted: {mois} {annee}")
-
-            # Find forecast column in MAFE
-            forecast_col_cleaned = next((col for col in mafe_df.columns if mois in col and 'Forecasts' in col and annee[-2:] in col), None)
-            if forecast_col_cleaned:
-                mafe_subset = mafe_df[['Country', 'Customer Name', forecast_col_cleaned]].rename(columns={forecast_col_cleaned: 'Estimees'})
-                # Get Belgian Name mapping from Mission model
-                belgian_names = Mission.objects.values('belgian_name', 'libelle_de_projet')
-                belgian_names_df = pd.DataFrame(list(belgian_names))
-                if not belgian_names_df.empty:
-                    belgian_names_df = belgian_names_df.rename(columns={'belgian_name': 'Customer Name', 'libelle_de_projet': 'Libelle projet'})
-                    mafe_subset = mafe_subset.merge(belgian_names_df, on='Customer Name', how='left')
-                mafe_subset['Libelle projet'] = mafe_subset['Libelle projet'].fillna(mafe_subset['Customer Name'])
-            else:
-                mafe_subset = pd.DataFrame(columns=["Country", "Customer Name", "Libelle projet", "Estimees"])
-            processing_logs.append("DEBUG: MAFE data prepared with forecast column")
-
-            # 6. Employee summary
-            processing_logs.append("DEBUG: Starting employee summary calculations")
-            employee_summary = (
-                base_df.groupby(['Libelle projet', 'Nom', 'Grade'], as_index=False)
-                .agg({'Heures': 'sum'})
-                .rename(columns={'Heures': 'Total Heures'})
-                .merge(consultants_df[['Nom', 'Rate']], on='Nom', how='left')
-                .merge(consultants_df[['Nom', 'Rate DES']], on='Nom', how='left')
-            )
-            employee_summary['Total'] = employee_summary['Rate'] * employee_summary['Total Heures']
-            employee_summary['Total DES'] = employee_summary['Rate DES'] * employee_summary['Total Heures']
-            processing_logs.append("DEBUG: Employee summary calculated")
-
-            summary_by_proj = employee_summary.groupby('Libelle projet', as_index=False).agg({'Total Heures': 'sum', 'Total': 'sum', 'Total DES': 'sum'})
-            global_summary = pd.merge(mafe_subset[['Libelle projet', 'Estimees']].drop_duplicates(), summary_by_proj, on='Libelle projet', how='left')
-            global_summary[['Total Heures', 'Total', 'Total DES']] = global_summary[['Total Heures', 'Total', 'Total DES']].fillna(0)
-            global_summary['Estimees'] = pd.to_numeric(global_summary['Estimees'].astype(str).str.strip().replace(['', '-', 'nan', 'None'], '0'), errors='coerce').fillna(0)
-            processing_logs.append("DEBUG: Global summary calculated")
-
-            adjusted = employee_summary.merge(global_summary[['Libelle projet', 'Estimees']], on='Libelle projet', how='left')
-            adjusted['Total_Projet_Cout'] = adjusted.groupby('Libelle projet')['Total'].transform('sum')
-            
-            # Robust calculation of coeff_total using np.where to handle zero denominators
-            adjusted['coeff_total'] = np.where(
-                adjusted['Total_Projet_Cout'] > 0,
-                adjusted['Estimees'] / adjusted['Total_Projet_Cout'],
-                0
-            )
-            
-            adjusted['total_rate_proj'] = adjusted.groupby('Libelle projet')['Rate'].transform('sum')
-            
-            # Robust calculation of priority_coeff using np.where to handle zero denominators
-            adjusted['priority_coeff'] = np.where(
-                adjusted['total_rate_proj'] > 0,
-                adjusted['Rate'] / adjusted['total_rate_proj'],
-                0
-            )
-            
-            # Calculate final_coeff after ensuring both intermediate coefficients are robust
-            adjusted['final_coeff'] = adjusted['coeff_total'] * adjusted['priority_coeff']
-            
-            # Initial Adjusted Hours calculation
-            adjusted['Adjusted Hours'] = (adjusted['Total Heures'] * (1 - adjusted['final_coeff'])).round()
-            adjusted['Adjusted Hours'] = adjusted['Adjusted Hours'].apply(lambda x: max(x, 0))
-            
-            # Apply 30% rule for cases where Adjusted Hours is 0 but Total Heures > 0
-            condition_for_30_pct_rule = (adjusted['Adjusted Hours'] == 0) & (adjusted['Total Heures'] > 0)
-            adjusted.loc[condition_for_30_pct_rule, 'Adjusted Hours'] = \
-                (adjusted.loc[condition_for_30_pct_rule, 'Total Heures'] * 0.3).round()
-            
-            # Ensure Adjusted Hours remains non-negative (extra safeguard)
-            adjusted['Adjusted Hours'] = adjusted['Adjusted Hours'].apply(lambda x: max(x, 0))
-            
-            # Calculate Heures Retirées and Adjusted Cost using the final Adjusted Hours
-            adjusted['Heures Retirées'] = adjusted['Total Heures'] - adjusted['Adjusted Hours']
-            adjusted['Adjusted Cost'] = adjusted['Adjusted Hours'] * adjusted['Rate']
-            adjusted['ID'] = adjusted['Nom'].astype(str) + ' - ' + adjusted['Libelle projet'].astype(str)
-            processing_logs.append("DEBUG: Adjusted calculations completed with robust coefficient handling and 30% rule applied")
-
-            cols = ['ID'] + [col for col in adjusted.columns if col != 'ID']
-            adjusted = adjusted[cols]
-
-            result = (
-                adjusted
-                .groupby('Libelle projet', as_index=False)
-                .agg({'Total Heures': 'sum', 'Adjusted Hours': 'sum', 'Adjusted Cost': 'sum', 'Heures Retirées': 'sum'})
-                .merge(global_summary[['Libelle projet', 'Estimees']], on='Libelle projet', how='left')
-            )
-            result['Ecart'] = result['Estimees'] - result['Adjusted Cost']
-            processing_logs.append("DEBUG: Final result calculations completed")
-
-            for df in [employee_summary, global_summary, adjusted, result]:
-                for col in df.select_dtypes(include='number').columns:
-                    df[col] = df[col].round(0)
-
-            # Save all key DataFrames to Parquet files
-            try:
-                base_df.to_parquet(run_dir / 'base_df.parquet')
-                consultants_df.to_parquet(run_dir / 'consultants_df.parquet')
-                mafe_df.to_parquet(run_dir / 'mafe_df.parquet')
-                codes_df.to_parquet(run_dir / 'codes_df.parquet')
-                employee_summary.to_parquet(run_dir / 'employee_summary_initial.parquet')
-                global_summary.to_parquet(run_dir / 'global_summary_initial.parquet')
-                adjusted.to_parquet(run_dir / 'adjusted_initial.parquet')
-                result.to_parquet(run_dir / 'result_initial.parquet')
-                processing_logs.append(f"INFO: All DataFrames for run_id {run_id} saved to Parquet files.")
-            except Exception as e:
-                processing_logs.append(f"ERROR: Failed to save DataFrames for run_id {run_id}: {str(e)}")
-                raise
+            # Uploads only live for the request, keep a copy for the worker,
+            # with their own suffix: openpyxl tells .xlsm from .xlsx by it
+            heures_path = run_dir / f'heures_ibm{Path(heures_ibm_file_obj.name).suffix.lower()}'
+            mafe_path = run_dir / f'mafe_report{Path(mafe_file_obj.name).suffix.lower()}'
+            for file_obj, path in ((heures_ibm_file_obj, heures_path), (mafe_file_obj, mafe_path)):
+                with open(path, 'wb') as f:
+                    for chunk in file_obj.chunks():
+                        f.write(chunk)
 
-            # Generate Excel file
-            processing_logs.append("DEBUG: Starting Excel file generation")
-            output = BytesIO()
-            
-            try:
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    workbook = writer.book
-                    header_format = workbook.add_format({'bold': True, 'bg_color': '#D9D2E9'})
-                    int_format = workbook.add_format({'num_format': '0'})
-
-                    def write(df, sheet, selected_cols=None):
-                        if selected_cols:
-                            df = df[selected_cols]
-                        df.to_excel(writer, sheet_name=sheet, index=False, startrow=1, header=False)
-                        ws = writer.sheets[sheet]
-                        for i, col in enumerate(df.columns):
-                            ws.write(0, i, col, header_format)
-                            width = max(15, len(str(col)) + 2)
-                            ws.set_column(i, i, width, int_format if pd.api.types.is_integer_dtype(df[col]) else None)
-                        ws.add_table(0, 0, len(df), len(df.columns) - 1, {
-                            'name': f'Table_{sheet}',
-                            'style': 'TableStyleLight8',
-                            'columns': [{'header': c} for c in df.columns]
-                        })
-
-                    write(base_df[['Date', 'Code projet', 'Nom', 'Grade', 'Heures', 'Libelle projet']], '00_Base')
-                    write(employee_summary, '01_Employee_Summary', ['Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Rate DES', 'Total', 'Total DES'])
-                    write(global_summary, '02_Global_Summary', ['Libelle projet', 'Total Heures', 'Total', 'Total DES', 'Estimees'])
-                    write(adjusted, '03_Adjusted', ['ID', 'Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Total', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost'])
-                    write(result, '04_Result', ['Libelle projet', 'Total Heures', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost', 'Estimees', 'Ecart'])
-
-                output.seek(0)
-                now_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"SLR_Facturation_{now_str}.xlsx"
-                processing_logs.append(f"INFO: Excel file generated successfully: {filename}")
-
-                # Save the initial Excel to the run directory
-                initial_excel_filename = f"Initial_SLR_Report_{run_id[:8]}.xlsx"
-                with open(run_dir / initial_excel_filename, 'wb') as f:
-                    f.write(output.getvalue())
-                processing_logs.append(f"INFO: Initial Excel saved as {initial_excel_filename}")
-
-                # Store run_id and filename in session
-                request.session['last_slr_run_id'] = run_id
-                request.session['last_slr_run_heures_filename'] = heures_ibm_file_obj.name
-
-                # Prepare context for the results page
-                context = {
-                    'form': SLRFileUploadForm(),  # Fresh form for a new upload
-                    'page_title': 'Facturation SLR - Initial Report Generated',
-                    'processing_logs': processing_logs,
-                    'initial_report_generated': True,
-                    'run_id': run_id,
-                    'initial_excel_filename': initial_excel_filename,
-                    'original_filename': filename
-                }
+            slr_jobs.submit_run(run_id, heures_path, mafe_path, heures_ibm_file_obj.name, owner=request.user)
 
-                # Add success message
-                messages.success(request, f"Initial report '{filename}' generated and saved. You can now review and make manual adjustments.")
-                
-                # Return the results page instead of the Excel file
-                return render(request, 'billing/facturation_slr.html', context)
+            # Store run_id and filename in session
+            request.session['last_slr_run_id'] = run_id
+            request.session['last_slr_run_heures_filename'] = heures_ibm_file_obj.name
 
-            except Exception as e:
-                processing_logs.append(f"ERROR: Excel generation failed: {str(e)}")
-                raise
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({
+                    'success': True,
+                    'run_id': run_id,
+                    'status_url': reverse('slr_run_status', kwargs={'run_id': run_id}),
+                    'results_url': reverse('facturation_slr_run', kwargs={'run_id': run_id}),
+                }, status=202)
+            return redirect('facturation_slr_run', run_id=run_id)
 
         except Exception as e:
-            processing_logs.append(f"ERROR: Exception during calculation: {str(e)}<br><pre>{traceback.format_exc()}</pre>")
+            processing_logs.append(f"ERROR: Exception while queuing the run: {str(e)}<br><pre>{traceback.format_exc()}</pre>")
             messages.error(request, f"An error occurred while generating the report: {str(e)}")
             context = {
                 'form': form,
@@ -561,51 +375,135 @@ def facturation_slr(request):
     }
     return render(request, 'billing/facturation_slr.html', context)
 
+@login_required
+def facturation_slr_run(request, run_id):
+    """Results page of a queued SLR run; polls the status endpoint until the run is done."""
+    slr_jobs.fail_stale_runs([run_id])
+    status = slr_jobs.read_status(run_id)
+    if status is None:
+        messages.error(request, f"Run not found for ID: {run_id}")
+        return redirect('facturation_slr')
+
+    done = status.get('status') == slr_jobs.STATUS_DONE
+    unmatched_names = []
+    if done and status.get('unmatched_count'):
+        unmatched_names = read_cached(slr_jobs.get_run_dir(run_id), 'unmatched_names').to_dict('records')
+    context = {
+        'form': SLRFileUploadForm(),  # Fresh form for a new upload
+        'page_title': 'Facturation SLR - Initial Report Generated' if done else 'Facturation SLR',
+        'processing_logs': status.get('logs', []),
+        'initial_report_generated': done,
+        'run_id': run_id,
+        'run_status': status,
+        'initial_excel_filename': status.get('initial_excel_filename'),
+        'original_filename': status.get('original_filename'),
+        'unmatched_names': unmatched_names,
+        'stage_metrics': status.get('stage_metrics', {}),
+    }
+    return render(request, 'billing/facturation_slr.html', context)
+
+@login_required
+def slr_run_status(request, run_id):
+    """JSON status of an SLR run: status, stage and progress."""
+    slr_jobs.fail_stale_runs([run_id])
+    status = slr_jobs.read_status(run_id)
+    if status is None:
+        return JsonResponse({'success': False, 'error': 'Run not found'}, status=404)
+    return JsonResponse({
+        'success': True,
+        'run_id': run_id,
+        'status': status.get('status'),
+        'stage': status.get('stage'),
+        'progress': status.get('progress', 0),
+        'error': status.get('error'),
+        'results_url': reverse('facturation_slr_run', kwargs={'run_id': run_id}),
+    })
+
+@login_required
+def slr_run_metrics(request, run_id):
+    """JSON metrics of each stage of an SLR run: seconds, rows and memory."""
+    status = slr_jobs.read_status(run_id)
+    if status is None:
+        return JsonResponse({'success': False, 'error': 'Run not found'}, status=404)
+    metrics = status.get('stage_metrics', {})
+    return JsonResponse({
+        'success': True,
+        'run_id': run_id,
+        'status': status.get('status'),
+        'total_seconds': instrumentation.total_seconds(metrics, exclude=slr_jobs.ON_DEMAND_STAGES),
+        'stages': [{'stage': stage, **values} for stage, values in metrics.items()],
+    })
+
 @login_required
 def mission_bulk_delete(request):
     if request.method == 'POST':
         try:
             selected_missions = request.POST.getlist('selected_missions')
-            print(f"DEBUG: Received POST request for bulk delete. Selected missions: {selected_missions}")
-            
+            logger.debug('Bulk delete of missions %s', selected_missions)
+
             if not selected_missions:
-                print("DEBUG: No missions selected for deletion")
                 messages.warning(request, 'No missions were selected for deletion.')
                 return redirect('mission_list')
             
-            # Verify the missions exist before deletion
-            existing_missions = Mission.objects.filter(id__in=selected_missions)
-            print(f"DEBUG: Found {existing_missions.count()} existing missions to delete")
-            
-            if existing_missions.exists():
-                existing_missions.delete()
-                print(f"DEBUG: Successfully deleted {existing_missions.count()} missions")
-                messages.success(request, f'Successfully deleted {existing_missions.count()} mission(s).')
+            # One DELETE; its row count replaces separate count() queries
+            _, deleted = Mission.objects.filter(id__in=selected_missions).delete()
+            deleted_count = deleted.get(Mission._meta.label, 0)
+
+            if deleted_count:
+                logger.debug('Deleted %d missions', deleted_count)
+                messages.success(request, f'Successfully deleted {deleted_count} mission(s).')
             else:
-                print("DEBUG: No existing missions found to delete")
                 messages.warning(request, 'No valid missions were found to delete.')
         except Exception as e:
-            print(f"ERROR: Exception during bulk delete: {str(e)}")
+            logger.exception('Bulk delete of missions failed')
             messages.error(request, f'An error occurred while deleting missions: {str(e)}')
     else:
-        print("DEBUG: Non-POST request received for bulk delete")
         messages.warning(request, 'Invalid request method.')
     
     return redirect('mission_list')
 
+@login_required
+@require_POST
+def bulk_operations(request):
+    """Apply a JSON batch of mission/resource create, update and delete operations.
+
+    Body: ``{"atomic": true, "operations": [{"op": "update", "model": "mission",
+    "key": "<otp_l2>", "data": {...}}, ...]}``; updates and deletes target
+    ``pk`` or the natural ``key`` (otp_l2 / matricule). See bulk_api.
+
+    Authenticated by the session like every other view, and CSRF-protected:
+    scripts log in through the login page, keep the session and csrftoken
+    cookies and send the token back in an ``X-CSRFToken`` header.
+    """
+    try:
+        payload = json.loads(request.body)
+        applied, results = bulk_api.run_operations(payload)
+    except ValueError as e:  # malformed JSON or BulkError
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': applied, 'results': results}, status=200 if applied else 400, encoder=DjangoJSONEncoder)
+
 @login_required
 def download_slr_report(request, run_id, filename):
-    """View to download a generated SLR report."""
+    """View to download a generated SLR report.
+
+    The workbook is built on first download and cached under a hash of the
+    run's tables; ``filename`` is only the name the browser saves it as.
+    """
     try:
-        file_path = TEMP_FILES_BASE_DIR / run_id / filename
-        if not file_path.exists():
+        run_dir = TEMP_FILES_BASE_DIR / run_id
+        if not run_dir.exists():
             messages.error(request, f"Report file not found: {filename}")
             return redirect('facturation_slr')
-        
-        with open(file_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+
+        # The initial report keeps the state computed by the run, any other name gets the current state
+        status = slr_jobs.read_status(run_id) or {}
+        initial = filename == status.get('initial_excel_filename')
+        recorder = slr_jobs.new_recorder()
+        path, digest = slr_adjustments.get_report(run_dir, initial=initial, stage=recorder.stage)
+        if recorder.metrics:
+            # The workbook was built by this request
+            slr_jobs.record_stage_metrics(run_id, recorder.metrics)
+        return serve_file(request, path, filename, etag=digest)
     except Exception as e:
         messages.error(request, f"Error downloading report: {str(e)}")
         return redirect('facturation_slr')
@@ -620,21 +518,8 @@ def edit_slr_adjustments(request, run_id):
             return redirect('facturation_slr')
 
         # Load the necessary DataFrames
-        adjusted_df = pd.read_parquet(run_dir / 'adjusted_initial.parquet')
-        base_df = pd.read_parquet(run_dir / 'base_df.parquet')
-        consultants_df = pd.read_parquet(run_dir / 'consultants_df.parquet')
-        mafe_df = pd.read_parquet(run_dir / 'mafe_df.parquet')
-        codes_df = pd.read_parquet(run_dir / 'codes_df.parquet')
-        employee_summary = pd.read_parquet(run_dir / 'employee_summary_initial.parquet')
-        global_summary = pd.read_parquet(run_dir / 'global_summary_initial.parquet')
-        result = pd.read_parquet(run_dir / 'result_initial.parquet')
-
-        # Remove technical columns from display
-        display_columns = [col for col in adjusted_df.columns if col not in [
-            'Total_Projet_Cout', 'coeff_total', 'total_rate_proj', 
-            'priority_coeff', 'final_coeff'
-        ]]
-        display_df = adjusted_df[display_columns]
+        state = slr_adjustments.load_state(run_dir)
+        adjusted_df = state.adjusted
 
         if request.method == 'POST':
             # Handle form submission for adjustments
@@ -646,61 +531,25 @@ def edit_slr_adjustments(request, run_id):
                         index = int(key.split('_')[-1])
                         adjusted_hours[index] = float(value)
 
-                # Update the adjusted DataFrame
-                for index, hours in adjusted_hours.items():
-                    adjusted_df.loc[index, 'Adjusted Hours'] = hours
-                    adjusted_df.loc[index, 'Heures Retirées'] = adjusted_df.loc[index, 'Total Heures'] - hours
-                    adjusted_df.loc[index, 'Adjusted Cost'] = hours * adjusted_df.loc[index, 'Rate']
-
-                # Save the updated adjusted DataFrame
-                adjusted_df.to_parquet(run_dir / 'adjusted_updated.parquet')
-
-                # Recalculate the result DataFrame
-                result = (
-                    adjusted_df
-                    .groupby('Libelle projet', as_index=False)
-                    .agg({'Total Heures': 'sum', 'Adjusted Hours': 'sum', 'Adjusted Cost': 'sum', 'Heures Retirées': 'sum'})
-                    .merge(global_summary[['Libelle projet', 'Estimees']], on='Libelle projet', how='left')
-                )
-                result['Ecart'] = result['Estimees'] - result['Adjusted Cost']
-
-                # Save the updated result DataFrame
-                result.to_parquet(run_dir / 'result_updated.parquet')
-
-                # Generate a new Excel file with the updates
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    workbook = writer.book
-                    header_format = workbook.add_format({'bold': True, 'bg_color': '#D9D2E9'})
-                    int_format = workbook.add_format({'num_format': '0'})
-
-                    def write(df, sheet, selected_cols=None):
-                        if selected_cols:
-                            df = df[selected_cols]
-                        df.to_excel(writer, sheet_name=sheet, index=False, startrow=1, header=False)
-                        ws = writer.sheets[sheet]
-                        for i, col in enumerate(df.columns):
-                            ws.write(0, i, col, header_format)
-                            width = max(15, len(str(col)) + 2)
-                            ws.set_column(i, i, width, int_format if pd.api.types.is_integer_dtype(df[col]) else None)
-                        ws.add_table(0, 0, len(df), len(df.columns) - 1, {
-                            'name': f'Table_{sheet}',
-                            'style': 'TableStyleLight8',
-                            'columns': [{'header': c} for c in df.columns]
-                        })
-
-                    write(base_df[['Date', 'Code projet', 'Nom', 'Grade', 'Heures', 'Libelle projet']], '00_Base')
-                    write(employee_summary, '01_Employee_Summary', ['Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Rate DES', 'Total', 'Total DES'])
-                    write(global_summary, '02_Global_Summary', ['Libelle projet', 'Total Heures', 'Total', 'Total DES', 'Estimees'])
-                    write(adjusted_df, '03_Adjusted', ['ID', 'Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Total', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost'])
-                    write(result, '04_Result', ['Libelle projet', 'Total Heures', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost', 'Estimees', 'Ecart'])
-
-                output.seek(0)
+                # Under the run lock, so no grid edit lands between loading the state and saving it
+                with locked(run_dir):
+                    # Update a copy of the adjusted DataFrame; the cached state stays
+                    # untouched until save_state replaces it
+                    adjusted_df = slr_adjustments.load_state(run_dir).adjusted.copy()
+                    for index, hours in adjusted_hours.items():
+                        adjusted_df.loc[index, 'Adjusted Hours'] = hours
+                        adjusted_df.loc[index, 'Heures Retirées'] = adjusted_df.loc[index, 'Total Heures'] - hours
+                        adjusted_df.loc[index, 'Adjusted Cost'] = hours * adjusted_df.loc[index, 'Rate']
+
+                    # Recalculate the result DataFrame and save both, folding in any pending edits;
+                    # save_state also writes the project totals back to the missions
+                    global_summary = slr_adjustments.read_latest(run_dir, 'global_summary')
+                    result = slr_engine.build_result(adjusted_df, global_summary)
+                    slr_adjustments.save_state(run_dir, adjusted_df, result)
+
+                # The updated report is built on its first download
                 now_str = datetime.now().strftime('%Y%m%d_%H%M%S')
                 updated_filename = f"SLR_Facturation_Updated_{now_str}.xlsx"
-                # Save the updated Excel file
-                with open(run_dir / updated_filename, 'wb') as f:
-                    f.write(output.getvalue())
 
                 messages.success(request, 'Adjustments saved successfully. You can now download the updated report.')
                 request.session['updated_filename'] = updated_filename
@@ -710,14 +559,14 @@ def edit_slr_adjustments(request, run_id):
                 messages.error(request, f"Error saving adjustments: {str(e)}")
                 return redirect('edit_slr_adjustments', run_id=run_id)
 
-        # Prepare context for the edit page
+        # Prepare context for the edit page; the rows themselves are fetched by the grid
         updated_filename = request.session.pop('updated_filename', None)
         context = {
             'page_title': 'Edit SLR Adjustments',
             'run_id': run_id,
-            'adjusted_df': display_df.to_dict('records'),
-            'columns': display_df.columns.tolist(),
-            'total_rows': len(display_df),
+            'columns': slr_grid.display_columns(adjusted_df),
+            'total_rows': len(adjusted_df),
+            'facets': slr_grid.facets(adjusted_df),
             'original_filename': request.session.get('last_slr_run_heures_filename', 'Unknown'),
             'updated_filename': updated_filename,
         }
@@ -727,36 +576,50 @@ def edit_slr_adjustments(request, run_id):
         messages.error(request, f"Error loading adjustments: {str(e)}")
         return redirect('facturation_slr')
 
-@csrf_exempt
+@login_required
+def slr_adjustments_grid(request, run_id):
+    """JSON page of a run's adjusted rows for the edit grid, see slr_grid.parse_params."""
+    run_dir = TEMP_FILES_BASE_DIR / run_id
+    if not RunStore(run_dir).has('adjusted_initial'):
+        return JsonResponse({'success': False, 'error': 'Run not found'}, status=404)
+    try:
+        params = slr_grid.parse_params(request.GET)
+        # Versioned before loading, so a concurrent edit can only make the cached row order miss
+        version = slr_adjustments.state_version(run_dir)
+        adjusted = slr_adjustments.load_state(run_dir).adjusted
+        page = slr_grid.query(adjusted, run_id=run_id, version=version, **params)
+    except slr_grid.GridError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, 'run_id': run_id, **page})
+
+@login_required
 @require_POST
 def ajax_update_adjusted_hours(request):
+    """Apply one grid edit; the grid sends the CSRF token in an ``X-CSRFToken`` header."""
     try:
         data = json.loads(request.body)
         row_id = data.get('row_id')
         new_value = float(data.get('adjusted_hours'))
-        run_id = data.get('run_id')
-        run_dir = TEMP_FILES_BASE_DIR / run_id
-        adjusted_path = run_dir / 'adjusted_initial.parquet'
-        if not adjusted_path.exists():
-            return JsonResponse({'success': False, 'error': 'Adjusted file not found'})
-        import pandas as pd
-        adjusted_df = pd.read_parquet(adjusted_path)
-        # Find the row by ID
-        idx = adjusted_df[adjusted_df['ID'] == row_id].index
-        if len(idx) == 0:
+        # The run directory is built from the registry's run_id, never from the body
+        run = SlrRun.objects.filter(run_id=str(data.get('run_id')), status=SlrRun.STATUS_DONE).first()
+        if run is None:
+            return JsonResponse({'success': False, 'error': 'Run not found'}, status=404)
+        run_dir = slr_jobs.get_run_dir(run.run_id)
+        if not RunStore(run_dir).has('adjusted_initial'):
+            return JsonResponse({'success': False, 'error': 'Adjusted file not found'}, status=404)
+        # Apply the edit as a delta on the row and its project totals; only the edit is
+        # persisted and the journal is folded into the run archive every COMPACT_AFTER edits.
+        # The project's new totals are written back to its missions right away.
+        state, idx = slr_adjustments.apply_edit(run_dir, row_id, new_value)
+        if idx is None:
             return JsonResponse({'success': False, 'error': 'Row not found'})
-        idx = idx[0]
-        adjusted_df.at[idx, 'Adjusted Hours'] = new_value
-        adjusted_df.at[idx, 'Heures Retirées'] = adjusted_df.at[idx, 'Total Heures'] - new_value
-        adjusted_df.at[idx, 'Adjusted Cost'] = new_value * adjusted_df.at[idx, 'Rate']
-        # Save back
-        adjusted_df.to_parquet(adjusted_path)
-        # Return updated values for the row
+        adjusted_df = state.adjusted
+        # Return updated values for the row and its project
         return JsonResponse({'success': True, 'updated_row': {
             'adjusted_hours': float(adjusted_df.at[idx, 'Adjusted Hours']),
             'adjusted_cost': float(adjusted_df.at[idx, 'Adjusted Cost']),
             'heures_retires': float(adjusted_df.at[idx, 'Heures Retirées'])
-        }})
+        }, 'project_totals': to_python_type(state.project_totals(idx))})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
@@ -1,11 +1,15 @@
 import os 
 import re
 import shutil
+import hashlib
+import threading
 import time
 import pandas as pd
 from datetime import datetime
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from billing import name_matching, slr_engine, slr_readers, slr_report
+from billing.parse_cache import ParseCache
 
 # 📁 Chemins
 folder_path = r'C:\Users\samadane\OneDrive - Deloitte (O365D)\SLR_FACTURATION_15052025'
@@ -17,17 +21,64 @@ log_file = os.path.join(logs_folder, 'Projet_Facturation_Log.txt')
 os.makedirs(draft_folder, exist_ok=True)
 os.makedirs(logs_folder, exist_ok=True)
 
-def safe_read_excel(path, **kwargs):
+# ⏱️ Attente après le dernier événement avant de recalculer (OneDrive écrit par rafales)
+DEBOUNCE_SECONDS = 5
+# 🗃️ Cache des classeurs déjà lus, hors du dossier OneDrive pour ne pas être synchronisé
+parse_cache = ParseCache(os.path.join(os.path.expanduser('~'), '.slr_parse_cache'), 512 * 1024 * 1024)
+HASH_CHUNK_SIZE = 1024 * 1024
+# Empreintes des fichiers d'entrée au dernier recalcul réussi
+derniers_hashes = None
+
+def safe_read_excel(path, reader=pd.read_excel, **kwargs):
     for _ in range(5):
         try:
-            return pd.read_excel(path, **kwargs)
+            return reader(path, **kwargs)
         except PermissionError:
             print(f"⏳ Fichier verrouillé : {os.path.basename(path)}... nouvelle tentative dans 2s")
             time.sleep(2)
     raise PermissionError(f"⛔ Fichier toujours verrouillé : {path}")
 
+def est_heures(f):
+    return "IBM" in f and f.endswith(('.xlsx', '.xls')) and ("Heures" in f or f.startswith("IBM"))
+
+def est_mafe(f):
+    return f.startswith('DTT IMT France MAFE Report -') and f.endswith(('.xlsx', '.xls'))
+
+def est_traitement(f):
+    return 'Fichier de traitement' in f and f.endswith(('.xlsx', '.xls'))
+
+def est_entree(f):
+    # Les fichiers de verrouillage Excel (~$...) ne sont pas des entrées
+    return not f.startswith('~$') and (est_heures(f) or est_mafe(f) or est_traitement(f))
+
+def hash_fichier(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
 def recalculer():
+    global derniers_hashes
     try:
+        fichiers = os.listdir(folder_path)
+        heures_file = next((f for f in fichiers if est_heures(f)), None)
+        mafe_file = next((f for f in fichiers if est_mafe(f)), None)
+        traitement_file = next((f for f in fichiers if est_traitement(f)), None)
+
+        if not heures_file or not mafe_file or not traitement_file:
+            raise FileNotFoundError("Un ou plusieurs fichiers requis sont introuvables.")
+
+        heures_path = os.path.join(folder_path, heures_file)
+        mafe_path = os.path.join(folder_path, mafe_file)
+        traitement_path = os.path.join(folder_path, traitement_file)
+
+        # ♻️ Rien à faire si le contenu des entrées n'a pas changé (simple synchro OneDrive, sauvegarde à l'identique)
+        hashes = {p: safe_read_excel(p, reader=hash_fichier) for p in (heures_path, mafe_path, traitement_path)}
+        if hashes == derniers_hashes:
+            print("⏭️ Fichiers d'entrée inchangés, recalcul ignoré")
+            return
+
         print("🔁 Lancement du recalcul...")
 
         # 🕒 Initialisation
@@ -38,147 +89,77 @@ def recalculer():
             backup_path = os.path.join(draft_folder, f"Output__{date_suffix}.xlsx")
             shutil.copy2(output_path, backup_path)
 
-        fichiers = os.listdir(folder_path)
-        heures_file = next((f for f in fichiers if "IBM" in f and f.endswith(('.xlsx', '.xls')) and ("Heures" in f or f.startswith("IBM"))), None)
-        mafe_file = next((f for f in fichiers if f.startswith('DTT IMT France MAFE Report -') and f.endswith(('.xlsx', '.xls'))), None)
-        traitement_file = next((f for f in fichiers if 'Fichier de traitement' in f and f.endswith(('.xlsx', '.xls'))), None)
-
-        if not heures_file or not mafe_file or not traitement_file:
-            raise FileNotFoundError("Un ou plusieurs fichiers requis sont introuvables.")
-
-        heures_path = os.path.join(folder_path, heures_file)
-        mafe_path = os.path.join(folder_path, mafe_file)
-        traitement_path = os.path.join(folder_path, traitement_file)
+        mois, annee = slr_engine.parse_period(heures_file)
 
-        mois_mapping = {
-            'Janvier': 'Jan', 'Février': 'Feb', 'Mars': 'Mar', 'Avril': 'Apr', 'Mai': 'May', 'Juin': 'Jun',
-            'Juillet': 'Jul', 'Août': 'Aug', 'Septembre': 'Sep', 'Octobre': 'Oct', 'Novembre': 'Nov', 'Décembre': 'Dec',
-            'Jan': 'Jan', 'Feb': 'Feb', 'Mar': 'Mar', 'Apr': 'Apr', 'May': 'May', 'Jun': 'Jun',
-            'Jul': 'Jul', 'Aug': 'Aug', 'Sep': 'Sep', 'Oct': 'Oct', 'Nov': 'Nov', 'Dec': 'Dec'
-        }
-        match = re.search(r'(Janvier|Février|Mars|Avril|Mai|Juin|Juillet|Août|Septembre|Octobre|Novembre|Décembre|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[^\d]*(\d{2,4})', heures_file)
-        mois = mois_mapping.get(match.group(1), match.group(1))
-        annee = match.group(2)
-
-        base = safe_read_excel(heures_path, sheet_name='base', usecols="E,H,I,M,N")
-        base.columns = ['Code projet', 'Nom', 'Grade', 'Date', 'Heures']
-        codes = safe_read_excel(traitement_path, sheet_name='codes', usecols="A:C").fillna({'Libelle projet': 'Code France'})
+        base = safe_read_excel(heures_path, reader=parse_cache.cached(slr_readers.read_heures))
+        codes = safe_read_excel(traitement_path, reader=parse_cache.cached(pd.read_excel), sheet_name='codes', usecols="A:C")
         codes.columns = ['Code projet', 'Libelle projet', 'Commentaire']
-        base = base.merge(codes[['Code projet', 'Libelle projet']], on='Code projet', how='left')
+        codes['Libelle projet'] = codes['Libelle projet'].fillna('Code France')
 
-        consultants = safe_read_excel(traitement_path, sheet_name='Consultants', usecols="C,D,E,I")
+        consultants = safe_read_excel(traitement_path, reader=parse_cache.cached(pd.read_excel), sheet_name='Consultants', usecols="C,D,E,I")
         consultants.columns = ['Nom', 'Rate', 'Rate DES', 'Grade']
-        base['Nom'] = base['Nom'].astype(str).str.lower().str.strip()
-        consultants['Nom'] = consultants['Nom'].astype(str).str.lower().str.strip()
-        base['Heures'] = pd.to_numeric(base['Heures'], errors='coerce').fillna(0)
-        consultants['Rate'] = pd.to_numeric(consultants['Rate'], errors='coerce').fillna(0)
-        consultants['Rate DES'] = pd.to_numeric(consultants['Rate DES'], errors='coerce').fillna(0)
-
-        mafe_raw = safe_read_excel(mafe_path, sheet_name='(Tab A) FULLY COMMITTED', header=None)
-        mafe_raw.columns = mafe_raw.iloc[14].astype(str).str.strip().str.replace('\n', ' ').str.replace('\r', ' ')
-        mafe = mafe_raw.drop(index=list(range(0, 15))).reset_index(drop=True)
-        mafe_traitement = safe_read_excel(traitement_path, sheet_name='MAFE')
-
-        forecast_col_cleaned = next((col for col in mafe.columns if mois in col and 'Forecasts' in col and annee[-2:] in col), None)
-        if forecast_col_cleaned:
-            mafe_subset = mafe[['Country', 'Customer Name', forecast_col_cleaned]].rename(columns={forecast_col_cleaned: 'Estimees'})
-            mafe_subset = mafe_subset.merge(mafe_traitement[['Customer Name', 'Belgian Name']], on='Customer Name', how='left')
-            mafe_subset = mafe_subset.rename(columns={'Belgian Name': 'Libelle projet'})
-            mafe_subset['Libelle projet'] = mafe_subset['Libelle projet'].fillna(mafe_subset['Customer Name'])
-        else:
-            mafe_subset = pd.DataFrame(columns=["Country", "Customer Name", "Libelle projet", "Estimees"])
-
-        employee_summary = (
-            base.groupby(['Libelle projet', 'Nom', 'Grade'], as_index=False)
-            .agg({'Heures': 'sum'})
-            .rename(columns={'Heures': 'Total Heures'})
-            .merge(consultants[['Nom', 'Rate']], on='Nom', how='left')
-            .merge(consultants[['Nom', 'Rate DES']], on='Nom', how='left')
-        )
-        employee_summary['Total'] = employee_summary['Rate'] * employee_summary['Total Heures']
-        employee_summary['Total DES'] = employee_summary['Rate DES'] * employee_summary['Total Heures']
-
-        summary_by_proj = employee_summary.groupby('Libelle projet', as_index=False).agg({'Total Heures': 'sum', 'Total': 'sum', 'Total DES': 'sum'})
-        global_summary = pd.merge(mafe_subset[['Libelle projet', 'Estimees']].drop_duplicates(), summary_by_proj, on='Libelle projet', how='left')
-        global_summary[['Total Heures', 'Total', 'Total DES']] = global_summary[['Total Heures', 'Total', 'Total DES']].fillna(0)
-        global_summary['Estimees'] = pd.to_numeric(global_summary['Estimees'].astype(str).str.strip().replace(['', '-', 'nan', 'None'], '0'), errors='coerce').fillna(0)
-
-        adjusted = employee_summary.merge(global_summary[['Libelle projet', 'Estimees']], on='Libelle projet', how='left')
-        adjusted['Total_Projet_Cout'] = adjusted.groupby('Libelle projet')['Total'].transform('sum')
-        adjusted['total_rate_proj'] = adjusted.groupby('Libelle projet')['Rate'].transform('sum')
-        adjusted = adjusted[(adjusted['Total_Projet_Cout'] > 0) & (adjusted['total_rate_proj'] > 0)]
-        adjusted['coeff_total'] = adjusted['Estimees'] / adjusted['Total_Projet_Cout']
-        adjusted['priority_coeff'] = adjusted['Rate'] / adjusted['total_rate_proj']
-        adjusted['final_coeff'] = adjusted['coeff_total'] * adjusted['priority_coeff']
-        adjusted['Adjusted Hours'] = (adjusted['Total Heures'] * (1 - adjusted['final_coeff'])).round()
-        adjusted['Adjusted Hours'] = adjusted['Adjusted Hours'].apply(lambda x: max(x, 0))
-        adjusted['Heures Retirées'] = adjusted['Total Heures'] - adjusted['Adjusted Hours']
-        adjusted['Adjusted Cost'] = adjusted['Adjusted Hours'] * adjusted['Rate']
-        adjusted['ID'] = adjusted['Nom'].astype(str) + ' - ' + adjusted['Libelle projet'].astype(str)
-        cols = ['ID'] + [col for col in adjusted.columns if col != 'ID']
-        adjusted = adjusted[cols]
-
-        result = (
-            adjusted.groupby('Libelle projet', as_index=False)
-            .agg({'Total Heures': 'sum', 'Adjusted Hours': 'sum', 'Adjusted Cost': 'sum'})
-            .merge(global_summary[['Libelle projet', 'Estimees']], on='Libelle projet', how='left')
-        )
-        result['Ecart'] = result['Estimees'] - result['Adjusted Cost']
-
-        for df in [employee_summary, global_summary, adjusted, result]:
-            for col in df.select_dtypes(include='number').columns:
-                df[col] = df[col].round(0)
-
-        with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-            workbook = writer.book
-            header_format = workbook.add_format({'bold': True, 'bg_color': '#D9D2E9'})
-            int_format = workbook.add_format({'num_format': '0'})
-
-            def write(df, sheet, selected_cols=None):
-                if selected_cols:
-                    df = df[selected_cols]
-                df.to_excel(writer, sheet_name=sheet, index=False, startrow=1, header=False)
-                ws = writer.sheets[sheet]
-                for i, col in enumerate(df.columns):
-                    ws.write(0, i, col, header_format)
-                    width = max(15, len(str(col)) + 2)
-                    ws.set_column(i, i, width, int_format if pd.api.types.is_integer_dtype(df[col]) else None)
-                ws.add_table(0, 0, len(df), len(df.columns) - 1, {
-                    'name': f'Table_{sheet}',
-                    'style': 'TableStyleLight8',
-                    'columns': [{'header': c} for c in df.columns]
-                })
-
-            write(base[['Date', 'Code projet', 'Nom', 'Grade', 'Heures', 'Libelle projet']], '00_Base')
-            write(employee_summary, '01_Employee_Summary', ['Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Rate DES', 'Total', 'Total DES'])
-            write(global_summary, '02_Global_Summary', ['Libelle projet', 'Total Heures', 'Total', 'Total DES', 'Estimees'])
-            write(adjusted, '03_Adjusted', ['ID', 'Libelle projet', 'Nom', 'Grade', 'Total Heures', 'Rate', 'Total', 'Adjusted Hours', 'Heures Retirées', 'Adjusted Cost'])
-            write(result, '04_Result')
+
+        mafe, forecast_col_cleaned = safe_read_excel(mafe_path, reader=parse_cache.cached(slr_readers.read_mafe), mois=mois, annee=annee)
+        mafe_traitement = safe_read_excel(traitement_path, reader=parse_cache.cached(pd.read_excel), sheet_name='MAFE')
+        belgian_names = mafe_traitement[['Customer Name', 'Belgian Name']].rename(columns={'Belgian Name': 'Libelle projet'})
+
+        mafe_subset = slr_engine.prepare_mafe_subset(mafe, forecast_col_cleaned, belgian_names)
+
+        tables = slr_engine.compute_slr(base, codes, consultants, mafe_subset)
+        if not tables['unmatched'].empty:
+            index = name_matching.NGramIndex(enumerate(consultants['Nom'].dropna()))
+            tables['unmatched'] = name_matching.suggest_matches(tables['unmatched'], index)
+            print(f"⚠️ {len(tables['unmatched'])} consultant(s) sans taux, voir l'onglet 05_Unmatched_Names")
+
+        slr_report.write_report(output_path, tables)
 
         with open(log_file, 'a', encoding='utf-8') as f:
             f.write(f"\n[{now.strftime('%Y-%m-%d %H:%M:%S')}] ✅ Export vers : {os.path.basename(output_path)}\n")
 
+        derniers_hashes = hashes
         print(f"✅ Script terminé. Fichier généré : {os.path.basename(output_path)}")
 
     except Exception as e:
         print("\n⛔ ERREUR GLOBALE :", str(e))
 
 
-# 👀 Détection de changement sur Output.xlsx
+# 👀 Détection de changement sur les fichiers d'entrée
+# Output.xlsx et draft/ sont écrits par recalculer() : les surveiller relancerait le calcul en boucle.
 class ChangeHandler(FileSystemEventHandler):
-    def on_modified(self, event):
-        if event.src_path.endswith("Output.xlsx"):
-            print(f"\n📌 Modification détectée sur Output.xlsx ({datetime.now().strftime('%H:%M:%S')})")
-            recalculer()
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dernier_evenement = None
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        if any(p and est_entree(os.path.basename(p)) for p in paths):
+            with self.lock:
+                self.dernier_evenement = time.monotonic()
+
+    def pret(self):
+        """True une fois par rafale d'événements, DEBOUNCE_SECONDS après le dernier."""
+        with self.lock:
+            if self.dernier_evenement is None or time.monotonic() - self.dernier_evenement < DEBOUNCE_SECONDS:
+                return False
+            self.dernier_evenement = None
+            return True
 
 if __name__ == "__main__":
-    print("👁️ Surveillance de Output.xlsx... (Ctrl+C pour quitter)")
+    print("👁️ Surveillance des fichiers d'entrée... (Ctrl+C pour quitter)")
+    handler = ChangeHandler()
     observer = Observer()
-    observer.schedule(ChangeHandler(), path=folder_path, recursive=False)
+    observer.schedule(handler, path=folder_path, recursive=False)
     observer.start()
     try:
+        # Les recalculs tournent ici, un seul à la fois ; les événements reçus pendant
+        # un recalcul sont regroupés en un seul passage suivant
         while True:
             time.sleep(1)
+            if handler.pret():
+                print(f"\n📌 Modification détectée sur les fichiers d'entrée ({datetime.now().strftime('%H:%M:%S')})")
+                recalculer()
     except KeyboardInterrupt:
         observer.stop()
-    observer.join()
\ No newline at end of file
+    observer.join()
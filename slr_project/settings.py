@@ -138,3 +138,16 @@ LOGIN_REDIRECT_URL = 'home'
 # Crispy Forms Configuration
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
+
+# SLR runs are executed on a local thread pool, outside the request cycle
+SLR_WORKER_COUNT = int(os.environ.get('SLR_WORKER_COUNT', 2))
+
+# Memory budget of the in-process LRU cache of SLR run DataFrames
+SLR_RUN_CACHE_MAX_BYTES = int(os.environ.get('SLR_RUN_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# On-disk cache of parsed input workbooks, keyed by file content
+SLR_PARSE_CACHE_DIR = os.environ.get('SLR_PARSE_CACHE_DIR', os.path.join(MEDIA_ROOT, 'slr_parse_cache'))
+SLR_PARSE_CACHE_MAX_BYTES = int(os.environ.get('SLR_PARSE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Trace Python allocations of each SLR stage (tracemalloc); slows runs down, for diagnosis only
+SLR_TRACE_MEMORY = os.environ.get('SLR_TRACE_MEMORY', '') == '1'
@@ -0,0 +1,25 @@
+# Settings of the benchmark_slr command: the generated Missions, Resources and
+# runs go to a database and a media directory of their own, never to the real ones.
+#
+#   python manage.py benchmark_slr --settings=slr_project.settings_benchmark
+
+from .settings import *  # noqa: F401,F403
+
+BENCHMARK_DIR = Path(os.environ.get('SLR_BENCHMARK_DIR', BASE_DIR / 'benchmark_data'))
+
+SLR_BENCHMARK = True
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCHMARK_DIR / 'db.sqlite3',
+    }
+}
+
+MEDIA_ROOT = str(BENCHMARK_DIR / 'media')
+SLR_PARSE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'slr_parse_cache')
+
+# Stages are timed one run at a time
+SLR_WORKER_COUNT = 1
+
+ALLOWED_HOSTS = ['testserver', 'localhost']